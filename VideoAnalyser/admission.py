@@ -0,0 +1,201 @@
+# admission.py - Cost estimates and a bounded, shortest-job-first analysis queue
+import os
+import threading
+import time
+
+import cv2
+
+# Forward-pass GFLOPs at 640px, relative to yolov8n; unknown models count as 1
+MODEL_COST = {
+    'yolov8n': 1.0, 'yolov8s': 3.3, 'yolov8m': 9.1, 'yolov8l': 19.0, 'yolov8x': 29.6,
+    'mesonet': 0.2,
+}
+
+
+def model_factor(weights):
+    """Relative cost of one forward pass of ``weights`` (a path or model name)"""
+    name = os.path.splitext(os.path.basename(str(weights)))[0].lower()
+    return MODEL_COST.get(name.split('_')[0], 1.0)
+
+
+def probe_video(path):
+    """Frame count, fps and size from the container header, without decoding"""
+    cap = cv2.VideoCapture(path)
+    try:
+        return {
+            'frames': max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+            'fps': cap.get(cv2.CAP_PROP_FPS) or 0.0,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        cap.release()
+
+
+def estimate_cost(path, weights, max_width=None, frame_size=None, max_frames=None):
+    """Cost units of analysing ``path``: frames x megapixels analysed x model factor.
+
+    ``max_width`` mirrors a pipeline that downscales wider frames,
+    ``frame_size`` one that always resizes to ``(width, height)`` and
+    ``max_frames`` one that samples at most that many frames. An unreadable
+    header counts as one unit; such a video fails fast anyway.
+    """
+    meta = probe_video(path)
+    frames, width, height = meta['frames'], meta['width'], meta['height']
+    if not frames or not width or not height:
+        return 1.0
+    if frame_size:
+        width, height = frame_size
+    elif max_width and width > max_width:
+        height = height * max_width / width
+        width = max_width
+    if max_frames:
+        frames = min(frames, max_frames)
+    return max(1.0, frames * width * height / 1e6 * model_factor(weights))
+
+
+def controller_from_env(default_running=1, on_wait=None):
+    """An ``AdmissionController`` sized by MAX_CONCURRENT_ANALYSES and
+    MAX_QUEUED_ANALYSES, starting from ADMISSION_SECONDS_PER_UNIT"""
+    return AdmissionController(
+        max_running=int(os.environ.get('MAX_CONCURRENT_ANALYSES', default_running)),
+        max_queued=int(os.environ.get('MAX_QUEUED_ANALYSES', 8)),
+        seconds_per_unit=float(os.environ.get('ADMISSION_SECONDS_PER_UNIT', 0.02)),
+        on_wait=on_wait
+    )
+
+
+class QueueFull(Exception):
+    """Raised by ``AdmissionController.admit`` when no more jobs may wait;
+    ``estimated_wait`` is the time until the next running job should
+    finish and make room in the queue"""
+
+    def __init__(self, estimated_wait):
+        super().__init__(f'Analysis queue is full; estimated wait {estimated_wait:.0f}s')
+        self.estimated_wait = estimated_wait
+
+
+class Ticket:
+    """One admitted job. ``with ticket:`` waits for a slot and holds it;
+    a ticket that will never be entered must be ``cancel``led."""
+
+    def __init__(self, controller, cost, estimate, estimated_wait):
+        self.controller = controller
+        self.cost = cost
+        self.estimate = estimate
+        self.estimated_wait = estimated_wait
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+    def __enter__(self):
+        self.controller._acquire(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller._release(self, succeeded=exc_type is None)
+        return False
+
+    def cancel(self):
+        self.controller._cancel(self)
+
+
+class AdmissionController:
+    """Runs at most ``max_running`` analyses at once and lets at most
+    ``max_queued`` more wait; ``admit`` refuses the rest with ``QueueFull``.
+
+    A free slot goes to the waiting job with the smallest estimated run time
+    less ``aging`` times how long it has waited, so short clips overtake long
+    ones without starving them. Run time estimates are cost units times
+    ``seconds_per_unit``: a starting guess that the first finished job
+    replaces with its measured rate and later ones adjust (exponentially
+    weighted), so waits are in this machine's seconds.
+    """
+
+    def __init__(self, max_running=1, max_queued=8, seconds_per_unit=0.02, aging=1.0, on_wait=None):
+        self.max_running = max(1, max_running)
+        self.max_queued = max(0, max_queued)
+        self.seconds_per_unit = seconds_per_unit
+        self.aging = aging
+        self.on_wait = on_wait
+        self.waiting = []
+        self.running = []
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._cond = threading.Condition()
+
+    def _remaining_locked(self, now):
+        return sum(max(0.0, t.estimate - (now - t.started_at)) for t in self.running)
+
+    def _wait_for_locked(self, estimate, now):
+        """Seconds until a new job of ``estimate`` seconds would start"""
+        if len(self.running) < self.max_running and not self.waiting:
+            return 0.0
+        ahead = sum(t.estimate for t in self.waiting if self._priority(t, now) <= estimate)
+        return (self._remaining_locked(now) + ahead) / self.max_running
+
+    def _priority(self, ticket, now):
+        return ticket.estimate - self.aging * (now - ticket.submitted_at)
+
+    def admit(self, cost):
+        """A ``Ticket`` for a job of ``cost`` units, or ``QueueFull``"""
+        with self._cond:
+            now = time.monotonic()
+            estimate = cost * self.seconds_per_unit
+            free_slots = max(0, self.max_running - len(self.running))
+            if len(self.waiting) >= self.max_queued + free_slots:
+                self.rejected += 1
+                raise QueueFull(min((max(0.0, t.estimate - (now - t.started_at)) for t in self.running),
+                                    default=0.0))
+            ticket = Ticket(self, cost, estimate, self._wait_for_locked(estimate, now))
+            self.waiting.append(ticket)
+            self.admitted += 1
+            return ticket
+
+    def _acquire(self, ticket):
+        with self._cond:
+            while not (len(self.running) < self.max_running and self._next_locked() is ticket):
+                self._cond.wait()
+            self.waiting.remove(ticket)
+            ticket.started_at = time.monotonic()
+            self.running.append(ticket)
+            # Another slot may still be free for the next job in line
+            self._cond.notify_all()
+        if self.on_wait:
+            self.on_wait(ticket.started_at - ticket.submitted_at)
+
+    def _next_locked(self):
+        now = time.monotonic()
+        return min(self.waiting, key=lambda t: self._priority(t, now))
+
+    def _release(self, ticket, succeeded=True):
+        with self._cond:
+            self.running.remove(ticket)
+            elapsed = time.monotonic() - ticket.started_at
+            if succeeded and ticket.cost > 0:
+                rate = elapsed / ticket.cost
+                self.seconds_per_unit = 0.8 * self.seconds_per_unit + 0.2 * rate if self.completed else rate
+                self.completed += 1
+            self._cond.notify_all()
+
+    def _cancel(self, ticket):
+        with self._cond:
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def estimated_wait(self):
+        """Seconds until every admitted job has started"""
+        with self._cond:
+            now = time.monotonic()
+            if len(self.running) < self.max_running and not self.waiting:
+                return 0.0
+            return (self._remaining_locked(now) + sum(t.estimate for t in self.waiting)) / self.max_running
+
+    def stats(self):
+        wait = self.estimated_wait()
+        with self._cond:
+            return {'running': len(self.running), 'queued': len(self.waiting), 'max_running': self.max_running,
+                    'max_queued': self.max_queued, 'admitted': self.admitted, 'rejected': self.rejected,
+                    'completed': self.completed,
+                    'estimated_wait_seconds': round(wait, 2), 'seconds_per_unit': round(self.seconds_per_unit, 5)}
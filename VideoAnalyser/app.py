@@ -1,12 +1,20 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
+import math
 import os
 import cv2
-import numpy as np
-from ultralytics import YOLO
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from pipeline import FramePipeline
+from frame_source import FrameSource, EveryNth, AdaptiveRate
+from frame_pool import FramePool
+from proximity import find_close_pairs
+from metrics import REGISTRY, StageTimer, WAIT_BUCKETS
+from admission import QueueFull, controller_from_env, estimate_cost
+from cpu_budget import CpuBudget
+from result_cache import ResultCache, save_upload_hashed
+from inference_backend import load_model, DEFAULT_BACKEND
 
 app = Flask(__name__)
 CORS(app)
@@ -14,22 +22,91 @@ CORS(app)
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Load model once at startup
-model = YOLO("yolov8n.pt")
+# Cached results for re-submitted videos, keyed by content hash
+result_cache = ResultCache(
+    os.environ.get('RESULT_CACHE_DIR', os.path.join('cache', 'results')),
+    max_bytes=int(os.environ.get('RESULT_CACHE_MAX_MB', 512)) * 1024 * 1024
+)
 
-def compute_distance(p1, p2):
-    return np.linalg.norm(np.array(p1) - np.array(p2))
+# Load model once at startup (INFERENCE_BACKEND picks torch, onnx or openvino)
+MODEL_WEIGHTS = "yolov8n.pt"
+model = load_model(MODEL_WEIGHTS)
 
-def process_frame_batch(frames_data):
-    """Process multiple frames in parallel"""
+# Process every 3rd frame for speed (adjust as needed)
+FRAME_SKIP = 3
+HARASSMENT_THRESHOLD = 100  # pixels
+
+# ADAPTIVE_SAMPLING=1 replaces FRAME_SKIP: SAMPLING_MIN_FPS while people are
+# far apart, rising to SAMPLING_MAX_FPS (0 = video frame rate) as they close
+# in. Off by default here: decoding then waits for each batch to be scored,
+# which gives up the pipeline overlap
+ADAPTIVE_SAMPLING = os.environ.get('ADAPTIVE_SAMPLING', '0') != '0'
+SAMPLING_MIN_FPS = float(os.environ.get('SAMPLING_MIN_FPS', 2))
+SAMPLING_MAX_FPS = float(os.environ.get('SAMPLING_MAX_FPS', 0)) or None
+
+# Number of sampled frames sent through YOLO in a single forward pass
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 10))
+
+# CPU_BUDGET cores (default: all) shared by the requests running at once;
+# each request's inference workers split its share
+cpu_budget = CpuBudget()
+
+# Every request already spreads over INFERENCE_WORKERS threads, so by default
+# one video is analysed at a time and MAX_QUEUED_ANALYSES more wait (cheapest
+# first); the rest are turned away with 429
+REGISTRY.register_histogram('queue_wait_seconds', WAIT_BUCKETS, 'Seconds analyses waited for a slot')
+admission = controller_from_env(on_wait=lambda seconds: REGISTRY.observe('queue_wait_seconds', seconds))
+REGISTRY.register_gauge('admission', admission.stats,
+                        'Analysis admission: running and queued jobs, limits, rejections, estimated wait')
+
+# Decode into and resize into recycled buffers instead of fresh arrays per frame
+FRAME_POOL = os.environ.get('FRAME_POOL', '1') != '0'
+
+# Inference stage threads; each batch checks out its own model instance since
+# a YOLO predictor must not be shared between threads
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 2))
+model_pool = queue.Queue()
+model_pool.put(model)
+for _ in range(INFERENCE_WORKERS - 1):
+    model_pool.put(load_model(MODEL_WEIGHTS))
+
+def run_batch_inference(frames_data, timer=None):
+    """Run one batched YOLO forward pass and return the person boxes of each frame"""
+    if not frames_data:
+        return []
+
+    timer = timer or StageTimer(enabled=False)
+    # torch's thread count is per thread; take the budget's current share
+    cpu_budget.apply_to_thread()
+    batch_model = model_pool.get()
+    try:
+        # YOLO detection: one call over the stacked frames, split back per frame
+        with timer.stage('inference'):
+            batch_detections = batch_model([frame for frame, _, _ in frames_data], verbose=False)
+        timer.count('frames_inferred', len(frames_data))
+        return [
+            [b for b in detections.boxes.data.cpu().numpy() if int(b[5]) == 0]
+            for detections in batch_detections
+        ]
+    finally:
+        model_pool.put(batch_model)
+
+def make_sampling_policy():
+    if ADAPTIVE_SAMPLING:
+        return AdaptiveRate(SAMPLING_MIN_FPS, SAMPLING_MAX_FPS)
+    return EveryNth(FRAME_SKIP)
+
+def score_frame_batch(frames_data, batch_person_boxes, policy=None):
+    """Check the person boxes of each frame in a batch for close proximity.
+
+    With an adaptive ``policy``, each frame's activity (1 within
+    HARASSMENT_THRESHOLD, falling to 0 at twice that) is fed back to it.
+    """
     results = []
-    for frame_info in frames_data:
+    for frame_info, person_boxes in zip(frames_data, batch_person_boxes):
         frame, frame_number, fps = frame_info
         timestamp = frame_number / fps
-        
-        # YOLO detection
-        detections = model(frame)[0]
-        person_boxes = [b for b in detections.boxes.data.cpu().numpy() if int(b[5]) == 0]
+        activity = 0.0
         
         if len(person_boxes) >= 2:
             centers = []
@@ -46,18 +123,12 @@ def process_frame_batch(frames_data):
                     'confidence': float(conf)
                 })
             
-            # Check for harassment (close proximity)
-            harassment_detected = False
-            HARASSMENT_THRESHOLD = 100  # pixels
-            
-            for i in range(len(centers)):
-                for j in range(i + 1, len(centers)):
-                    dist = compute_distance(centers[i], centers[j])
-                    if dist < HARASSMENT_THRESHOLD:
-                        harassment_detected = True
-                        break
-                if harassment_detected:
-                    break
+            # Check for harassment (close proximity); pairs out to twice the
+            # threshold only count towards the activity
+            _, _, distances = find_close_pairs(centers, 2 * HARASSMENT_THRESHOLD)
+            harassment_detected = bool((distances < HARASSMENT_THRESHOLD).any())
+            if len(distances) > 0:
+                activity = min(1.0, 2.0 - distances.min() / HARASSMENT_THRESHOLD)
             
             if harassment_detected:
                 results.append({
@@ -67,48 +138,96 @@ def process_frame_batch(frames_data):
                     'video_width': frame.shape[1],
                     'video_height': frame.shape[0]
                 })
+        
+        if isinstance(policy, AdaptiveRate):
+            policy.update(activity)
     
     return results
 
-def detect_harassment_optimized(video_path):
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    # Process every 3rd frame for speed (adjust as needed)
-    FRAME_SKIP = 3
-    BATCH_SIZE = 10
+def process_frame_batch(frames_data):
+    """Process a batch of frames with a single batched YOLO forward pass"""
+    return score_frame_batch(frames_data, run_batch_inference(frames_data))
+
+def detect_harassment_optimized(video_path, batch_size=BATCH_SIZE, num_workers=INFERENCE_WORKERS, policy=None,
+                                timer=None, pool=None):
+    """Batched, overlapped proximity analysis of a video.
+
+    Stage latencies go to ``timer`` (a ``metrics.StageTimer``) when given;
+    inference and scoring are timed per batch. With a ``pool`` (a fresh
+    ``FramePool`` by default when FRAME_POOL is on), full-size frames are
+    decoded into one recycled buffer after another and the 640x480 copies
+    live in pooled buffers until their batch is scored.
+
+    An ``AdaptiveRate`` policy needs the activity of the frames already
+    sampled, so with one the decoder waits for each batch to be scored
+    before it picks the next frames; the samples then don't depend on
+    thread timing.
+    """
+    if policy is None:
+        policy = make_sampling_policy()
+    timer = timer or StageTimer(enabled=False)
+    if pool is None and FRAME_POOL:
+        pool = FramePool()
+    feedback = threading.Semaphore(0) if isinstance(policy, AdaptiveRate) else None
+    finished = threading.Event()
     
-    all_detections = []
-    frames_batch = []
-    frame_number = 0
+    def wait_for_feedback():
+        while not feedback.acquire(timeout=0.1):
+            if finished.is_set():
+                return False
+        return True
     
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+    def decode_batches():
+        # Runs on the decode thread, which owns the capture. Skipped frames
+        # are only grabbed, never converted to BGR arrays
+        source = FrameSource(video_path, policy, timer=timer, pool=pool)
+        fps = source.fps
+        frames_batch = []
+        for frame_number, frame in source:
+            # Resize frame for faster processing; the full-size frame is done with
+            with timer.stage('resize'):
+                dst = pool.acquire((480, 640, 3)) if pool is not None else None
+                frame_resized = cv2.resize(frame, (640, 480), dst=dst)
+            if pool is not None:
+                pool.release(frame)
+            frames_batch.append((frame_resized, frame_number, fps))
             
-            if frame_number % FRAME_SKIP == 0:
-                # Resize frame for faster processing
-                frame_resized = cv2.resize(frame, (640, 480))
-                frames_batch.append((frame_resized, frame_number, fps))
-                
-                if len(frames_batch) >= BATCH_SIZE:
-                    # Process batch
-                    future = executor.submit(process_frame_batch, frames_batch)
-                    batch_results = future.result()
-                    all_detections.extend(batch_results)
-                    frames_batch = []
-            
-            frame_number += 1
+            if len(frames_batch) >= batch_size:
+                yield frames_batch
+                frames_batch = []
+                if feedback is not None and not wait_for_feedback():
+                    return
         
-        # Process remaining frames
+        # Remaining frames
         if frames_batch:
-            batch_results = process_frame_batch(frames_batch)
-            all_detections.extend(batch_results)
+            yield frames_batch
     
-    cap.release()
+    def score_batch(frames_data, boxes):
+        with timer.stage('scoring'):
+            results = score_frame_batch(frames_data, boxes, policy)
+        # Inference and scoring are done with the batch's frames
+        if pool is not None:
+            for frame, _, _ in frames_data:
+                pool.release(frame)
+        if feedback is not None:
+            feedback.release()
+        return results
+    
+    # Decoding, inference and proximity scoring overlap; batches come out in frame order
+    pipeline = FramePipeline(
+        decode=decode_batches,
+        infer=lambda frames_data: run_batch_inference(frames_data, timer),
+        score=score_batch,
+        num_workers=num_workers,
+        queue_size=num_workers * 2
+    )
+    
+    all_detections = []
+    try:
+        for batch_results in pipeline.run():
+            all_detections.extend(batch_results)
+    finally:
+        finished.set()
     return all_detections
 
 @app.route('/predict', methods=['POST'])
@@ -121,19 +240,47 @@ def predict():
         return jsonify({'error': 'No file selected'}), 400
 
     path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(path)
+    content_hash = save_upload_hashed(file, path)
+    cache_key = ResultCache.make_key(content_hash, f'{MODEL_WEIGHTS}:{DEFAULT_BACKEND}', {
+        'frame_skip': FRAME_SKIP,
+        'adaptive_sampling': [ADAPTIVE_SAMPLING, SAMPLING_MIN_FPS, SAMPLING_MAX_FPS],
+        'harassment_threshold': HARASSMENT_THRESHOLD,
+        'resize': [640, 480]
+    })
 
     try:
-        detections = detect_harassment_optimized(path)
+        response_data = result_cache.get(cache_key)
+        if response_data is not None:
+            response_data['cached'] = True
+        else:
+            ticket = admission.admit(estimate_cost(path, MODEL_WEIGHTS, frame_size=(640, 480)))
+            policy = make_sampling_policy()
+            timer = StageTimer()
+            with ticket, cpu_budget.job(streams=INFERENCE_WORKERS):
+                detections = detect_harassment_optimized(path, policy=policy, timer=timer)
+            REGISTRY.record(timer)
+            response_data = {
+                'detections': detections,
+                'total_incidents': len(detections),
+                'sampling_segments': policy.segment_rates() if ADAPTIVE_SAMPLING else [],
+                'cached': False,
+                'message': f'Analysis complete. Found {len(detections)} potential harassment incidents.'
+            }
+            result_cache.put(cache_key, response_data)
+            # Only this request's own work, never a cached copy
+            response_data = dict(response_data, timings=timer.breakdown() if timer.enabled else None)
         
         # Clean up uploaded file
         os.remove(path)
         
-        return jsonify({
-            'detections': detections,
-            'total_incidents': len(detections),
-            'message': f'Analysis complete. Found {len(detections)} potential harassment incidents.'
-        })
+        return jsonify(response_data)
+    
+    except QueueFull as e:
+        os.remove(path)
+        response = jsonify({'error': 'Too many videos queued for analysis; try again later',
+                            'estimated_wait_seconds': round(e.estimated_wait, 1)})
+        response.headers['Retry-After'] = str(max(1, math.ceil(e.estimated_wait)))
+        return response, 429
     
     except Exception as e:
         # Clean up on error
@@ -141,5 +288,9 @@ def predict():
             os.remove(path)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True, threaded=True, port=5001)
\ No newline at end of file
@@ -1,16 +1,23 @@
 # app.py - Advanced Harassment Detection System
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, send_file, stream_with_context
 from flask_cors import CORS
+import json
+import math
 import os
-import cv2
-import numpy as np
-from ultralytics import YOLO
+import queue
 import torch
-from scipy.spatial.distance import euclidean
-from collections import defaultdict, deque
 import time
 import threading
-import json
+from admission import QueueFull, controller_from_env, estimate_cost
+from harassment_detector import AdvancedHarassmentDetector, AnalysisCancelled
+from cpu_budget import CpuBudget
+from jobs import JobManager
+from live import LiveManager
+from metrics import REGISTRY, WAIT_BUCKETS
+from result_cache import ResultCache, json_default, save_upload_hashed
+from detection_cache import DetectionStore
+from worker_pool import ModelPool, ProcessWorkerPool
+from inference_backend import load_model, prepare_backend, DEFAULT_BACKEND
 
 app = Flask(__name__)
 CORS(app)
@@ -18,275 +25,331 @@ CORS(app)
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Annotated videos of jobs submitted with render=1, kept until the job expires
+EVIDENCE_FOLDER = os.environ.get('EVIDENCE_DIR', 'outputs')
+os.makedirs(EVIDENCE_FOLDER, exist_ok=True)
+
+# Cached results for re-submitted videos, keyed by content hash
+result_cache = ResultCache(
+    os.environ.get('RESULT_CACHE_DIR', os.path.join('cache', 'results')),
+    max_bytes=int(os.environ.get('RESULT_CACHE_MAX_MB', 512)) * 1024 * 1024
+)
+
+# Per-frame tracks of analysed videos, replayed by /rescore with other
+# scoring parameters without running YOLO again
+detection_store = DetectionStore(
+    os.environ.get('DETECTION_CACHE_DIR', os.path.join('cache', 'detections')),
+    max_bytes=int(os.environ.get('DETECTION_CACHE_MAX_MB', 1024)) * 1024 * 1024
+)
+# Scoring parameters /rescore accepts, as named by AdvancedHarassmentDetector.rescore
+RESCORE_PARAMS = ('proximity_threshold', 'sustained_interaction_frames', 'harassment_score_threshold', 'weights')
+# Most parameter sets one /rescore sweep may replay
+RESCORE_MAX_SWEEP = int(os.environ.get('RESCORE_MAX_SWEEP', 20))
+
+# Serving mode: "thread" runs every job in this process against a pool of
+# preloaded models; "process" runs each job on a worker process that holds
+# its own preloaded model, so concurrent jobs scale across cores; "segments"
+# also splits each video into time segments spread over those workers, so a
+# single long video scales across cores too
+SERVING_MODE = os.environ.get('SERVING_MODE', 'thread')
+USES_PROCESS_POOL = SERVING_MODE in ('process', 'segments')
+WORKERS = int(os.environ.get('WORKERS', 2))
+MODEL_POOL_SIZE = int(os.environ.get('MODEL_POOL_SIZE', 1))
+SEGMENT_OVERLAP_SECONDS = float(os.environ.get('SEGMENT_OVERLAP_SECONDS', 3))
+SEGMENT_MIN_SECONDS = float(os.environ.get('SEGMENT_MIN_SECONDS', 20))
+
+# CPU_BUDGET cores (default: all) are shared by the jobs running at once
+# instead of torch and OpenCV each using every core in every job; the
+# process pool gives each worker an equal share, pinned to its own cores
+# when CPU_PINNING=1
+cpu_budget = CpuBudget()
+CPU_PINNING = os.environ.get('CPU_PINNING', '0') == '1'
+# Lines a streaming /predict buffers for a slow client before the analysis waits
+STREAM_QUEUE_LINES = int(os.environ.get('STREAM_QUEUE_LINES', 64))
+
 # Load the most accurate YOLO model
-print("Loading YOLOv8x model (most accurate)...")
-model = YOLO("yolov8x.pt")  # Using the extra-large model for better accuracy
-print("Model loaded successfully!")
-
-class AdvancedHarassmentDetector:
-    def __init__(self):
-        self.model = model
-        self.person_tracks = defaultdict(lambda: deque(maxlen=30))  # Track person positions
-        self.harassment_incidents = []
-        self.frame_cache = {}
-        
-        # Harassment detection parameters
-        self.PROXIMITY_THRESHOLD = 80  # pixels
-        self.AGGRESSIVE_MOVEMENT_THRESHOLD = 50  # pixels per frame
-        self.SUSTAINED_INTERACTION_FRAMES = 8  # frames
-        self.CONFIDENCE_THRESHOLD = 0.6
-        
-        # Pose analysis for aggressive behavior
-        self.AGGRESSIVE_POSES = ['raised_arms', 'pointing', 'close_approach']
-        
-    def calculate_interaction_score(self, person1_box, person2_box, person1_history, person2_history):
-        """Calculate harassment probability based on multiple factors"""
-        x1, y1, x2, y2 = person1_box[:4]
-        x3, y3, x4, y4 = person2_box[:4]
-        
-        # Calculate centers
-        center1 = ((x1 + x2) / 2, (y1 + y2) / 2)
-        center2 = ((x3 + x4) / 2, (y3 + y4) / 2)
-        
-        # Factor 1: Proximity (closer = higher score)
-        distance = euclidean(center1, center2)
-        proximity_score = max(0, 1 - (distance / self.PROXIMITY_THRESHOLD))
-        
-        # Factor 2: Size difference (larger person approaching smaller = higher score)
-        area1 = (x2 - x1) * (y2 - y1)
-        area2 = (x4 - x3) * (y4 - y3)
-        size_ratio = max(area1, area2) / (min(area1, area2) + 1e-6)
-        size_score = min(1.0, (size_ratio - 1) / 2)  # Score increases with size difference
-        
-        # Factor 3: Movement patterns (rapid approach = higher score)
-        movement_score = 0
-        if len(person1_history) >= 3 and len(person2_history) >= 3:
-            # Calculate movement towards each other
-            prev_dist = euclidean(person1_history[-3], person2_history[-3])
-            curr_dist = distance
-            if prev_dist > curr_dist:  # Moving closer
-                approach_speed = (prev_dist - curr_dist) / 3  # per frame
-                movement_score = min(1.0, approach_speed / 20)
-        
-        # Factor 4: Sustained interaction (staying close = higher score)
-        sustained_score = 0
-        if len(person1_history) >= self.SUSTAINED_INTERACTION_FRAMES:
-            close_frames = sum(1 for i in range(-self.SUSTAINED_INTERACTION_FRAMES, 0)
-                             if len(person2_history) > abs(i) and 
-                             euclidean(person1_history[i], person2_history[i]) < self.PROXIMITY_THRESHOLD)
-            sustained_score = close_frames / self.SUSTAINED_INTERACTION_FRAMES
-        
-        # Factor 5: Body language analysis (placeholder for future pose estimation)
-        posture_score = self.analyze_body_language(person1_box, person2_box)
-        
-        # Weighted combination of all factors
-        weights = {
-            'proximity': 0.3,
-            'size': 0.15,
-            'movement': 0.25,
-            'sustained': 0.2,
-            'posture': 0.1
-        }
-        
-        total_score = (
-            proximity_score * weights['proximity'] +
-            size_score * weights['size'] +
-            movement_score * weights['movement'] +
-            sustained_score * weights['sustained'] +
-            posture_score * weights['posture']
-        )
-        
-        return min(1.0, total_score), {
-            'proximity': proximity_score,
-            'size_difference': size_score,
-            'movement': movement_score,
-            'sustained': sustained_score,
-            'posture': posture_score,
-            'distance': distance
-        }
-    
-    def analyze_body_language(self, person1_box, person2_box):
-        """Analyze body language for aggressive behavior"""
-        # Placeholder for pose estimation analysis
-        # In a real implementation, you'd use pose estimation models
-        
-        x1, y1, x2, y2 = person1_box[:4]
-        x3, y3, x4, y4 = person2_box[:4]
-        
-        # Simple heuristic: if one person is significantly taller and close, increase score
-        height1 = y2 - y1
-        height2 = y4 - y3
-        height_ratio = max(height1, height2) / (min(height1, height2) + 1e-6)
-        
-        if height_ratio > 1.3:  # Significant height difference
-            return 0.3
-        
-        return 0.1
-    
-    def detect_harassment_in_frame(self, frame, frame_number, fps):
-        """Detect harassment in a single frame with advanced analysis"""
-        results = self.model.track(frame, persist=True, verbose=False, conf=self.CONFIDENCE_THRESHOLD)
-        
-        if not results or not results[0].boxes:
-            return []
-        
-        detections = []
-        current_persons = {}
-        
-        # Extract person detections
-        for box in results[0].boxes:
-            if box.cls == 0:  # Person class
-                track_id = int(box.id) if box.id is not None else None
-                if track_id is not None:
-                    bbox = box.xyxy[0].cpu().numpy()
-                    confidence = float(box.conf)
-                    center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
-                    
-                    current_persons[track_id] = {
-                        'bbox': bbox,
-                        'confidence': confidence,
-                        'center': center
-                    }
-                    
-                    # Update tracking history
-                    self.person_tracks[track_id].append(center)
-        
-        # Analyze interactions between all pairs of people
-        person_ids = list(current_persons.keys())
-        for i in range(len(person_ids)):
-            for j in range(i + 1, len(person_ids)):
-                id1, id2 = person_ids[i], person_ids[j]
-                person1 = current_persons[id1]
-                person2 = current_persons[id2]
-                
-                # Calculate harassment score
-                harassment_score, details = self.calculate_interaction_score(
-                    person1['bbox'], person2['bbox'],
-                    self.person_tracks[id1], self.person_tracks[id2]
-                )
-                
-                # If harassment is detected (score > threshold)
-                if harassment_score > 0.4:  # Adjustable threshold
-                    detection = {
-                        'timestamp': frame_number / fps,
-                        'frame_number': frame_number,
-                        'harassment_score': harassment_score,
-                        'persons': [
-                            {
-                                'track_id': id1,
-                                'bbox': person1['bbox'].tolist(),
-                                'confidence': person1['confidence']
-                            },
-                            {
-                                'track_id': id2,
-                                'bbox': person2['bbox'].tolist(),
-                                'confidence': person2['confidence']
-                            }
-                        ],
-                        'details': details,
-                        'video_width': frame.shape[1],
-                        'video_height': frame.shape[0]
-                    }
-                    detections.append(detection)
-        
-        return detections
-    
-    def process_video(self, video_path):
-        """Process entire video for harassment detection"""
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        print(f"Processing video: {total_frames} frames at {fps} FPS")
-        
-        all_detections = []
-        frame_number = 0
-        
-        # Process every 2nd frame for balance between speed and accuracy
-        frame_skip = 2
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if frame_number % frame_skip == 0:
-                # Resize for faster processing but maintain quality
-                height, width = frame.shape[:2]
-                if width > 1280:  # Only resize if very large
-                    scale = 1280 / width
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    frame_resized = cv2.resize(frame, (new_width, new_height))
-                else:
-                    frame_resized = frame
-                
-                # Detect harassment in this frame
-                frame_detections = self.detect_harassment_in_frame(frame_resized, frame_number, fps)
-                
-                # Scale coordinates back if we resized
-                if width > 1280:
-                    scale_back = width / frame_resized.shape[1]
-                    for detection in frame_detections:
-                        for person in detection['persons']:
-                            bbox = person['bbox']
-                            person['bbox'] = [coord * scale_back for coord in bbox]
-                        detection['video_width'] = width
-                        detection['video_height'] = height
-                
-                all_detections.extend(frame_detections)
-                
-                # Progress update
-                if frame_number % (frame_skip * 30) == 0:  # Every 30 processed frames
-                    progress = (frame_number / total_frames) * 100
-                    print(f"Progress: {progress:.1f}%")
-            
-            frame_number += 1
-        
-        cap.release()
-        
-        # Post-process detections to remove duplicates and merge nearby incidents
-        processed_detections = self.post_process_detections(all_detections)
-        
-        print(f"Detection complete: {len(processed_detections)} harassment incidents found")
-        return processed_detections
-    
-    def post_process_detections(self, detections):
-        """Clean up and consolidate detections"""
-        if not detections:
-            return []
-        
-        # Sort by timestamp
-        detections.sort(key=lambda x: x['timestamp'])
-        
-        # Merge nearby detections (within 1 second)
-        merged = []
-        current_group = [detections[0]]
-        
-        for i in range(1, len(detections)):
-            if detections[i]['timestamp'] - current_group[-1]['timestamp'] <= 1.0:
-                current_group.append(detections[i])
-            else:
-                # Process current group
-                if len(current_group) >= 3:  # Only keep sustained incidents
-                    # Take the detection with highest harassment score
-                    best_detection = max(current_group, key=lambda x: x['harassment_score'])
-                    merged.append(best_detection)
-                
-                current_group = [detections[i]]
-        
-        # Don't forget the last group
-        if len(current_group) >= 3:
-            best_detection = max(current_group, key=lambda x: x['harassment_score'])
-            merged.append(best_detection)
-        
-        return merged
+MODEL_WEIGHTS = "yolov8x.pt"
+if USES_PROCESS_POOL:
+    # Models are loaded by the worker processes
+    model = None
+else:
+    print("Loading YOLOv8x model (most accurate)...")
+    # Using the extra-large model for better accuracy, on the INFERENCE_BACKEND runtime
+    # Each call first takes the CPU budget's current share on its own thread
+    model = ModelPool(lambda: load_model(MODEL_WEIGHTS), size=MODEL_POOL_SIZE,
+                      before_predict=cpu_budget.apply_to_thread)
+    print("Model loaded successfully!")
+
+# Global detector instance; tracking state is per video, so concurrent
+# requests can share it
+detector = AdvancedHarassmentDetector(model)
+
+# Created on first use so spawned worker processes, which re-import this
+# module, don't start pools of their own
+_process_pool = None
+_process_pool_lock = threading.Lock()
 
-# Global detector instance
-detector = AdvancedHarassmentDetector()
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Export once here rather than racing in every worker
+            prepare_backend(MODEL_WEIGHTS)
+            print(f"Starting {WORKERS} detector worker processes...")
+            _process_pool = ProcessWorkerPool(MODEL_WEIGHTS, workers=WORKERS, backend=DEFAULT_BACKEND,
+                                              threads=cpu_budget.worker_threads(WORKERS), pin=CPU_PINNING)
+        return _process_pool
+
+def analyze_video(path, progress_callback=None, render_path=None, trace_path=None, on_incident=None):
+    """Run the detector on a saved video in the configured serving mode.
+
+    With ``render_path`` the annotated evidence video is written there in the
+    same pass; segments mode then analyses the video on a single worker.
+    With ``on_incident`` each incident is passed to it as soon as it closes
+    instead of being returned (segments mode again uses a single worker, as
+    stitched incidents are only known at the end).
+    With ``trace_path`` the tracks of every analysed frame are saved there for
+    /rescore, except in segments mode, whose track IDs are only stitched
+    together afterwards.
+    Returns ``(detections, inference_stats)``.
+    """
+    if SERVING_MODE == 'segments' and not render_path and not on_incident:
+        return get_process_pool().process_video_segmented(path, progress_callback=progress_callback,
+                                                          overlap_seconds=SEGMENT_OVERLAP_SECONDS,
+                                                          min_segment_seconds=SEGMENT_MIN_SECONDS)
+    if USES_PROCESS_POOL:
+        return get_process_pool().process_video(path, progress_callback=progress_callback, render_path=render_path,
+                                                trace_path=trace_path, on_incident=on_incident)
+    context = detector.new_context()
+    with cpu_budget.job():
+        detections = detector.process_video(path, progress_callback=progress_callback, context=context,
+                                            on_incident=on_incident, render_path=render_path,
+                                            trace_path=trace_path, keep_incidents=on_incident is None)
+    REGISTRY.record(context.timer)
+    return detections, context.inference_stats()
+
+# Admission control for /predict and /jobs: MAX_CONCURRENT_ANALYSES run at
+# once (default: one per worker, or one whole-pool video in segments mode),
+# MAX_QUEUED_ANALYSES more wait, cheapest estimated first, and the rest get 429
+REGISTRY.register_histogram('queue_wait_seconds', WAIT_BUCKETS, 'Seconds analyses waited for a slot')
+admission = controller_from_env(default_running=1 if SERVING_MODE == 'segments' else WORKERS,
+                                on_wait=lambda seconds: REGISTRY.observe('queue_wait_seconds', seconds))
+
+def estimate_job_cost(path):
+    """Admission cost of a saved upload; frames wider than 1280px are analysed downscaled"""
+    return estimate_cost(path, MODEL_WEIGHTS, max_width=1280)
+
+def queue_full_response(error):
+    response = jsonify({'error': 'Too many videos queued for analysis; try again later',
+                        'estimated_wait_seconds': round(error.estimated_wait, 1)})
+    response.headers['Retry-After'] = str(max(1, math.ceil(error.estimated_wait)))
+    return response, 429
+
+# Background jobs for /jobs; queued jobs wait for their admission slot on a
+# job thread, so there is one for every job admission lets in
+jobs = JobManager(
+    max_workers=max(int(os.environ.get('JOB_WORKERS', WORKERS)), admission.max_running + admission.max_queued),
+    ttl=int(os.environ.get('JOB_TTL_SECONDS', 3600)),
+    max_jobs=int(os.environ.get('MAX_JOBS', 100))
+)
+
+REGISTRY.register_gauge('jobs', jobs.state_counts, 'Background jobs by state')
+REGISTRY.register_gauge('admission', admission.stats,
+                        'Analysis admission: running and queued jobs, limits, rejections, estimated wait')
+REGISTRY.register_gauge('cpu_budget', lambda: {key: value or 0 for key, value in cpu_budget.stats().items()},
+                        'CPU budget: cores, running jobs and streams, threads per stream')
+
+# Live sources analysed as they are captured, for /live
+live_sessions = LiveManager(
+    max_sessions=int(os.environ.get('MAX_LIVE_SESSIONS', 2)),
+    max_queue=int(os.environ.get('LIVE_QUEUE_FRAMES', 4)),
+    ttl=int(os.environ.get('JOB_TTL_SECONDS', 3600))
+)
+# Sources /live may open: comma-separated device indices, paths or URLs,
+# or "*" for any. Empty disables live mode.
+LIVE_SOURCES = [s.strip() for s in os.environ.get('LIVE_SOURCES', '0').split(',') if s.strip()]
+REGISTRY.register_gauge('live_sessions', live_sessions.gauges, 'Running live sessions and their frame queues')
+
+def format_detection(detection):
+    """Format a detection for the frontend"""
+    return {
+        'timestamp': detection['timestamp'],
+        'frame_number': detection['frame_number'],
+        'harassment_score': detection['harassment_score'],
+        'boxes': [
+            {
+                'x1': int(person['bbox'][0]),
+                'y1': int(person['bbox'][1]),
+                'x2': int(person['bbox'][2]),
+                'y2': int(person['bbox'][3]),
+                'confidence': person['confidence'],
+                'track_id': person['track_id']
+            }
+            for person in detection['persons']
+        ],
+        'video_width': detection['video_width'],
+        'video_height': detection['video_height'],
+        'details': detection['details']
+    }
+
+def build_response(detections, processing_time, inference_stats=None):
+    """Build the /predict response body from processed detections"""
+    formatted_detections = [format_detection(detection) for detection in detections]
+    response_data = build_summary(len(formatted_detections), processing_time, inference_stats)
+    response_data['detections'] = formatted_detections
+    return response_data
+
+def build_summary(total_incidents, processing_time, inference_stats=None):
+    """Everything in a /predict response but the detections themselves"""
+    inference_stats = dict(inference_stats or {})
+    timings = inference_stats.pop('timings', None)
+    return {
+        'total_incidents': total_incidents,
+        'processing_time': round(processing_time, 2),
+        'cached': False,
+        'message': f'Advanced analysis complete. Found {total_incidents} harassment incidents.',
+        'analysis_details': {
+            'model_used': 'YOLOv8x',
+            'inference_backend': DEFAULT_BACKEND,
+            'detection_method': 'Advanced multi-factor analysis',
+            'factors_analyzed': ['proximity', 'size_difference', 'movement_patterns', 'sustained_interaction', 'body_language'],
+            'inference': inference_stats
+        },
+        # Per-stage seconds and frame counters of this request (METRICS=0 disables)
+        'timings': timings
+    }
+
+def cacheable(response_data):
+    """The response without this request's timings, which a cache hit didn't spend"""
+    return {key: value for key, value in response_data.items() if key != 'timings'}
+
+def is_truthy(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def save_upload(file):
+    """Save an uploaded video under a timestamped name, hashing it on the way"""
+    timestamp = str(int(time.time()))
+    filename = f"{timestamp}_{file.filename}"
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    content_hash = save_upload_hashed(file, path)
+    return filename, path, content_hash
+
+def result_cache_key(content_hash):
+    params = detector.cache_params()
+    if SERVING_MODE == 'segments':
+        # Stitched results can differ slightly from a sequential run
+        params.update(segment_overlap_seconds=SEGMENT_OVERLAP_SECONDS, segment_min_seconds=SEGMENT_MIN_SECONDS,
+                      segment_workers=WORKERS)
+    return ResultCache.make_key(content_hash, f'{MODEL_WEIGHTS}:{DEFAULT_BACKEND}', params)
+
+def detection_cache_key(content_hash):
+    return ResultCache.make_key(content_hash, f'{MODEL_WEIGHTS}:{DEFAULT_BACKEND}', detector.detection_params())
+
+def analyze_and_record(path, content_hash, progress_callback=None, render_path=None, on_incident=None):
+    """``analyze_video``, keeping the detections for /rescore; the response
+    carries the video's hash, which /rescore takes to find them"""
+    detections, inference_stats = analyze_video(path, progress_callback=progress_callback, render_path=render_path,
+                                                trace_path=detection_store.path(detection_cache_key(content_hash)),
+                                                on_incident=on_incident)
+    detection_store.evict()
+    return detections, inference_stats
+
+def ndjson_line(item):
+    return json.dumps(item, default=json_default) + '\n'
+
+def stream_analysis(path, content_hash, ticket, filename):
+    """Start a streaming /predict analysis and return its NDJSON lines:
+    ``{"type": "incident", ...}`` for each incident as soon as it closes,
+    ``{"type": "progress", ...}`` every 30 analysed frames, then one
+    ``{"type": "summary", ...}`` (or ``{"type": "error", ...}``) line.
+
+    The analysis runs on its own thread and lines are formatted one at a
+    time, so neither the time to the first incident nor the memory held
+    grows with the video's length. Streamed results are therefore not
+    written to the result cache; the detections are still kept for /rescore.
+
+    At most ``STREAM_QUEUE_LINES`` lines wait for a slow client: progress
+    lines are dropped beyond that and the analysis waits to hand over the
+    others. Once the client disconnects the analysis is abandoned.
+    """
+    lines = queue.Queue(maxsize=STREAM_QUEUE_LINES)
+    cancelled = threading.Event()
+    incidents = [0]
+
+    def emit(line):
+        while not cancelled.is_set():
+            try:
+                lines.put(line, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise AnalysisCancelled('Streaming client disconnected')
+
+    def on_incident(incident):
+        incidents[0] += 1
+        emit(ndjson_line(dict(format_detection(incident), type='incident')))
+
+    def on_progress(frame_number, total_frames, partial_detections):
+        if cancelled.is_set():
+            raise AnalysisCancelled('Streaming client disconnected')
+        try:
+            lines.put_nowait(ndjson_line({'type': 'progress', 'frame_number': frame_number,
+                                          'total_frames': total_frames}))
+        except queue.Full:
+            pass
+
+    def run():
+        try:
+            with ticket:
+                print(f"Starting streaming harassment analysis: {filename}")
+                start_time = time.time()
+                _, inference_stats = analyze_and_record(path, content_hash, progress_callback=on_progress,
+                                                        on_incident=on_incident)
+            summary = build_summary(incidents[0], time.time() - start_time, inference_stats)
+            summary.update(type='summary', video_hash=content_hash)
+            emit(ndjson_line(summary))
+        except AnalysisCancelled:
+            print(f"Streaming analysis abandoned, client disconnected: {filename}")
+        except Exception as e:
+            print(f"Error processing video: {str(e)}")
+            try:
+                emit(ndjson_line({'type': 'error', 'error': f'Error processing video: {str(e)}'}))
+            except AnalysisCancelled:
+                pass
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            try:
+                emit(None)
+            except AnalysisCancelled:
+                pass
+
+    def read():
+        try:
+            yield from iter(lines.get, None)
+        finally:
+            # Runs when the response is closed early, too
+            cancelled.set()
+
+    # Started now rather than on the first read, so the admission ticket is
+    # used even if the client goes away before the response starts
+    threading.Thread(target=run, name='stream', daemon=True).start()
+    return read()
+
+def stream_cached(cached):
+    """A cached /predict result as the lines of a streaming one"""
+    for detection in cached.pop('detections'):
+        yield ndjson_line(dict(detection, type='incident'))
+    yield ndjson_line(dict(cached, type='summary'))
+
+def ndjson_response(lines):
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    """Analyse an uploaded video. With ``?stream=1`` or ``Accept:
+    application/x-ndjson`` the response is streamed (see ``stream_analysis``)"""
     if 'video' not in request.files:
         return jsonify({'error': 'No video uploaded'}), 400
 
@@ -294,62 +357,46 @@ def predict():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
+    stream = is_truthy(request.args.get('stream', '0')) or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+    
     # Save uploaded file
-    timestamp = str(int(time.time()))
-    filename = f"{timestamp}_{file.filename}"
-    path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(path)
+    filename, path, content_hash = save_upload(file)
 
     try:
-        print(f"Starting advanced harassment analysis: {filename}")
         start_time = time.time()
-        
-        # Process video with advanced detection
-        detections = detector.process_video(path)
+        cache_key = result_cache_key(content_hash)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            print(f"Returning cached analysis for {filename}")
+            os.remove(path)
+            cached.update(processing_time=round(time.time() - start_time, 2), cached=True)
+            return ndjson_response(stream_cached(cached)) if stream else jsonify(cached)
+        
+        ticket = admission.admit(estimate_job_cost(path))
+        if stream:
+            return ndjson_response(stream_analysis(path, content_hash, ticket, filename))
+        with ticket:
+            print(f"Starting advanced harassment analysis: {filename}")
+            start_time = time.time()
+            
+            # Process video with advanced detection
+            detections, inference_stats = analyze_and_record(path, content_hash)
         
         processing_time = time.time() - start_time
         
         # Clean up uploaded file
         os.remove(path)
         
-        # Format detections for frontend
-        formatted_detections = []
-        for detection in detections:
-            formatted_detection = {
-                'timestamp': detection['timestamp'],
-                'frame_number': detection['frame_number'],
-                'harassment_score': detection['harassment_score'],
-                'boxes': [
-                    {
-                        'x1': int(person['bbox'][0]),
-                        'y1': int(person['bbox'][1]),
-                        'x2': int(person['bbox'][2]),
-                        'y2': int(person['bbox'][3]),
-                        'confidence': person['confidence'],
-                        'track_id': person['track_id']
-                    }
-                    for person in detection['persons']
-                ],
-                'video_width': detection['video_width'],
-                'video_height': detection['video_height'],
-                'details': detection['details']
-            }
-            formatted_detections.append(formatted_detection)
-        
-        response_data = {
-            'detections': formatted_detections,
-            'total_incidents': len(formatted_detections),
-            'processing_time': round(processing_time, 2),
-            'message': f'Advanced analysis complete. Found {len(formatted_detections)} harassment incidents.',
-            'analysis_details': {
-                'model_used': 'YOLOv8x',
-                'detection_method': 'Advanced multi-factor analysis',
-                'factors_analyzed': ['proximity', 'size_difference', 'movement_patterns', 'sustained_interaction', 'body_language']
-            }
-        }
-        
+        response_data = build_response(detections, processing_time, inference_stats)
+        response_data['video_hash'] = content_hash
+        result_cache.put(cache_key, cacheable(response_data))
         return jsonify(response_data)
     
+    except QueueFull as e:
+        os.remove(path)
+        return queue_full_response(e)
+    
     except Exception as e:
         # Clean up on error
         if os.path.exists(path):
@@ -360,12 +407,231 @@ def predict():
         traceback.print_exc()
         return jsonify({'error': f'Error processing video: {str(e)}'}), 500
 
+def run_analysis_job(job, path, content_hash, render=False):
+    """Job body: analyse the saved upload, reporting progress on the job
+
+    With ``render`` the annotated evidence video is written during the
+    analysis (a cached result has no video, so the cache is only written).
+    """
+    try:
+        start_time = time.time()
+        cache_key = result_cache_key(content_hash)
+        cached = None if render else result_cache.get(cache_key)
+        if cached is not None:
+            print(f"Returning cached analysis for job {job.id}: {job.filename}")
+            cached.update(processing_time=round(time.time() - start_time, 2), cached=True)
+            return cached
+        
+        print(f"Starting advanced harassment analysis job {job.id}: {job.filename}")
+        
+        def on_progress(frame_number, total_frames, partial_detections):
+            job.update_progress(frame_number, total_frames,
+                                [format_detection(d) for d in partial_detections])
+        
+        render_path = None
+        if render:
+            render_path = os.path.join(EVIDENCE_FOLDER, f'processed_{job.id}.mp4')
+            job.files.append(render_path)
+        
+        detections, inference_stats = analyze_and_record(path, content_hash, progress_callback=on_progress,
+                                                         render_path=render_path)
+        response_data = build_response(detections, time.time() - start_time, inference_stats)
+        response_data['video_hash'] = content_hash
+        result_cache.put(cache_key, cacheable(response_data))
+        if render:
+            response_data['evidence_video_url'] = f'/jobs/{job.id}/video'
+        return response_data
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    if 'video' not in request.files:
+        return jsonify({'error': 'No video uploaded'}), 400
+
+    file = request.files['video']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+
+    render = is_truthy(request.form.get('render', '0'))
+    filename, path, content_hash = save_upload(file)
+    ticket = None
+    # A cached result is returned without analysing, so it needs no slot
+    if render or result_cache.get(result_cache_key(content_hash)) is None:
+        try:
+            ticket = admission.admit(estimate_job_cost(path))
+        except QueueFull as e:
+            os.remove(path)
+            return queue_full_response(e)
+    job = jobs.submit(run_analysis_job, filename, path, content_hash, render=render, ticket=ticket)
+    body = {
+        'job_id': job.id,
+        'state': job.state,
+        'status_url': f'/jobs/{job.id}',
+        'events_url': f'/jobs/{job.id}/events'
+    }
+    if ticket is not None:
+        body['estimated_wait_seconds'] = round(ticket.estimated_wait, 1)
+    if render:
+        body['evidence_video_url'] = f'/jobs/{job.id}/video'
+    return jsonify(body), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return Response(stream_with_context(jobs.events(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/video', methods=['GET'])
+def job_video(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if not job.finished:
+        return jsonify({'error': 'Job is still running', 'state': job.state}), 409
+    if not job.files or not os.path.exists(job.files[0]):
+        return jsonify({'error': 'No evidence video; submit the job with render=1'}), 404
+    name = os.path.splitext(job.filename)[0]
+    return send_file(os.path.abspath(job.files[0]), mimetype='video/mp4', as_attachment=True,
+                     download_name=f'evidence_{name}.mp4')
+
+def run_live_session(session):
+    """Live session body: analyse the source until it ends or is stopped"""
+    print(f"Starting live harassment analysis {session.id}: {session.source}")
+    context = detector.new_context()
+    try:
+        with cpu_budget.job():
+            detector.process_live(session.frame_source, context=context,
+                                  on_incident=lambda incident: session.add_incident(format_detection(incident)),
+                                  on_frame=session.frame_done)
+    finally:
+        REGISTRY.record(context.timer)
+
+@app.route('/live', methods=['POST'])
+def start_live():
+    if USES_PROCESS_POOL:
+        return jsonify({'error': 'Live mode needs SERVING_MODE=thread'}), 503
+
+    data = request.get_json(silent=True) or {}
+    source = str(data.get('source', '')).strip()
+    if not source:
+        return jsonify({'error': 'No live source given'}), 400
+    if '*' not in LIVE_SOURCES and source not in LIVE_SOURCES:
+        return jsonify({'error': 'Live source not allowed'}), 403
+
+    try:
+        fps = float(data['fps']) if data.get('fps') else None
+        session = live_sessions.start(source, run_live_session, follow=bool(data.get('follow', False)), fps=fps)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'fps must be a number'}), 400
+    except IOError as e:
+        return jsonify({'error': str(e)}), 400
+    if session is None:
+        return jsonify({'error': 'Too many live sessions running'}), 429
+    return jsonify({
+        'session_id': session.id,
+        'state': session.state,
+        'status_url': f'/live/{session.id}',
+        'events_url': f'/live/{session.id}/events'
+    }), 202
+
+@app.route('/live/<session_id>', methods=['GET'])
+def get_live(session_id):
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired live session'}), 404
+    return jsonify(session.to_dict())
+
+@app.route('/live/<session_id>', methods=['DELETE'])
+def stop_live(session_id):
+    session = live_sessions.stop(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired live session'}), 404
+    return jsonify(session.to_dict(include_incidents=False))
+
+@app.route('/live/<session_id>/events', methods=['GET'])
+def live_events(session_id):
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired live session'}), 404
+    # Browsers resend the last event id when an EventSource reconnects
+    after = request.headers.get('Last-Event-ID', request.args.get('after', '0'))
+    after = int(after) if str(after).isdigit() else 0
+    return Response(stream_with_context(live_sessions.events(session, after=after)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/rescore', methods=['POST'])
+def rescore():
+    """Re-run scoring and incident merging on an analysed video's stored
+    detections. Takes ``video_hash`` (from an analysis response) plus any of
+    RESCORE_PARAMS, or ``sweep``: a list of up to RESCORE_MAX_SWEEP such
+    parameter sets."""
+    data = request.get_json(silent=True) or {}
+    content_hash = str(data.get('video_hash', '')).strip()
+    if not content_hash:
+        return jsonify({'error': 'No video_hash given'}), 400
+    sweep = data.get('sweep')
+    if sweep is not None and (not isinstance(sweep, list) or not all(isinstance(p, dict) for p in sweep)):
+        return jsonify({'error': 'sweep must be a list of parameter objects'}), 400
+    if sweep is not None and len(sweep) > RESCORE_MAX_SWEEP:
+        return jsonify({'error': f'sweep has {len(sweep)} parameter sets; at most {RESCORE_MAX_SWEEP} are allowed'}), 400
+
+    trace = detection_store.get(detection_cache_key(content_hash))
+    if trace is None:
+        return jsonify({'error': 'No stored detections for this video; analyse it with /predict or /jobs first'}), 404
+
+    start_time = time.perf_counter()
+    results = []
+    for params in (sweep if sweep is not None else [data]):
+        overrides = {name: params[name] for name in RESCORE_PARAMS if params.get(name) is not None}
+        if 'weights' in overrides and not isinstance(overrides['weights'], dict):
+            return jsonify({'error': 'weights must be an object of factor weights'}), 400
+        try:
+            detections = detector.rescore(trace, **overrides)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        effective = detector.scoring_params()
+        effective['weights'].update({name: float(value) for name, value in overrides.pop('weights', {}).items()})
+        effective.update(overrides)
+        formatted = [format_detection(detection) for detection in detections]
+        results.append({'params': effective, 'detections': formatted, 'total_incidents': len(formatted)})
+
+    body = {
+        'video_hash': content_hash,
+        'frames_replayed': len(trace),
+        'rescore_time_ms': round((time.perf_counter() - start_time) * 1000, 2)
+    }
+    if sweep is not None:
+        body['results'] = results
+    else:
+        body.update(results[0])
+    return jsonify(body)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy', 
         'model_loaded': True,
         'model_type': 'YOLOv8x',
+        'inference_backend': DEFAULT_BACKEND,
+        'serving_mode': SERVING_MODE,
+        'workers': WORKERS if USES_PROCESS_POOL else MODEL_POOL_SIZE,
+        'cpu_budget': cpu_budget.stats(),
+        'admission': admission.stats(),
         'gpu_available': torch.cuda.is_available()
     })
 
@@ -374,4 +640,7 @@ if __name__ == '__main__':
     print("Using YOLOv8x model for maximum accuracy")
     print(f"GPU Available: {torch.cuda.is_available()}")
     print("Server will be available at: http://localhost:5000")
+    # Only in the reloader's serving child; the watching parent never serves
+    if USES_PROCESS_POOL and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_process_pool()
     app.run(debug=True, threaded=True, port=5000)
\ No newline at end of file
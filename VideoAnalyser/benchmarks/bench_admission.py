@@ -0,0 +1,143 @@
+# bench_admission.py - A burst of uploads to app2's /predict with and without admission control
+#
+# Fires ``--clients`` simultaneous /predict uploads (through Flask's test
+# client, in a fresh subprocess per case) of a mix of short and long
+# synthetic clips. "off" admits everything at once (MAX_CONCURRENT_ANALYSES
+# = clients), "on" runs --running analyses at a time with --queued waiting,
+# cheapest first, and turns the rest away with 429. Reports accepted and
+# rejected uploads, p50/p99 latency of the accepted ones and of the short
+# clips alone, and the Retry-After each rejected upload was given.
+# The result cache is disabled so every upload is analysed.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_admission.py
+#   python benchmarks/bench_admission.py --clients 12 --running 2 --queued 4 --detector yolo-arch
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def run_case(case):
+    import inference_backend
+    from synthetic import FakeDetector
+
+    if case['detector'] == 'fake':
+        inference_backend.register_backend('bench', lambda weights: FakeDetector())
+    else:
+        from bench_cpu_budget import ComputeBoundDetector
+        inference_backend.register_backend('bench', lambda weights: ComputeBoundDetector(case['arch']))
+    inference_backend.DEFAULT_BACKEND = 'bench'
+    import app2
+
+    client = app2.app.test_client()
+    # Warm up once and seed the admission controller's seconds per unit
+    with open(case['videos'][0], 'rb') as f:
+        client.post('/predict', data={'video': (f, 'warmup.mp4')})
+
+    results = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(case['clients'])
+
+    def upload(i):
+        video = case['videos'][i % len(case['videos'])]
+        with open(video, 'rb') as f:
+            data = {'video': (f, f'client{i}.mp4')}
+            barrier.wait()
+            start = time.perf_counter()
+            response = client.post('/predict', data=data)
+        with lock:
+            results.append({'video': video, 'status': response.status_code,
+                            'seconds': time.perf_counter() - start,
+                            'estimated_wait': (response.get_json() or {}).get('estimated_wait_seconds')})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=case['clients']) as executor:
+        list(executor.map(upload, range(case['clients'])))
+    wall = time.perf_counter() - start
+
+    accepted = [r['seconds'] for r in results if r['status'] == 200]
+    short = [r['seconds'] for r in results if r['status'] == 200 and r['video'] == case['videos'][0]]
+    retry = [r['estimated_wait'] for r in results if r['status'] == 429]
+    return dict(case, **{
+        'wall_seconds': round(wall, 2),
+        'accepted': len(accepted),
+        'rejected': len(retry),
+        'failed': len(results) - len(accepted) - len(retry),
+        'p50_seconds': round(float(np.percentile(accepted, 50)), 2) if accepted else None,
+        'p99_seconds': round(float(np.percentile(accepted, 99)), 2) if accepted else None,
+        'short_p50_seconds': round(float(np.percentile(short, 50)), 2) if short else None,
+        'retry_after_seconds': retry,
+        'admission': app2.admission.stats()
+    })
+
+
+def fmt(value):
+    return f'{value:.2f}' if value is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Burst of /predict uploads with and without admission control')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--running', type=int, default=1, help='MAX_CONCURRENT_ANALYSES with admission on')
+    parser.add_argument('--queued', type=int, default=4, help='MAX_QUEUED_ANALYSES with admission on')
+    parser.add_argument('--resolution', default='640x360')
+    parser.add_argument('--seconds', type=float, nargs='+', default=[2, 8], help='Clip lengths, shortest first')
+    parser.add_argument('--people', type=int, default=4)
+    parser.add_argument('--detector', choices=['yolo-arch', 'fake'], default='fake')
+    parser.add_argument('--arch', default='yolov8n.yaml')
+    parser.add_argument('--video-dir', default=os.path.join(ROOT, 'cache', 'synthetic'))
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return
+
+    from synthetic import make_video
+
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    videos = []
+    for seconds in sorted(args.seconds):
+        video = os.path.join(args.video_dir, f'synthetic_{width}x{height}_{seconds:g}s_{args.people}p.mp4')
+        make_video(video, width, height, seconds, 30, args.people)
+        videos.append(video)
+
+    print(f"{args.clients} simultaneous uploads of {args.resolution} clips "
+          f"({', '.join(f'{s:g}s' for s in sorted(args.seconds))}), {args.detector} detector")
+    print(f"{'admission':>16} {'ok':>4} {'429':>4} {'p50 s':>7} {'p99 s':>7} {'short p50':>10} {'wall s':>7}"
+          f"  retry-after s")
+    cases = (('off', args.clients, 0), (f'on {args.running}+{args.queued}', args.running, args.queued))
+    for label, running, queued in cases:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, SERVING_MODE='thread', MODEL_POOL_SIZE=str(min(running, args.clients)),
+                       MAX_CONCURRENT_ANALYSES=str(running), MAX_QUEUED_ANALYSES=str(queued),
+                       RESULT_CACHE_DIR=os.path.join(tmp, 'results'), RESULT_CACHE_MAX_MB='0',
+                       DETECTION_CACHE_DIR=os.path.join(tmp, 'detections'))
+            case = {'clients': args.clients, 'videos': videos, 'detector': args.detector, 'arch': args.arch}
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case)],
+                                       cwd=ROOT, env=env, capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+        if not lines:
+            print(f"{label:>16}  failed: {(completed.stderr.strip().splitlines() or ['?'])[-1]}")
+            continue
+        r = json.loads(lines[-1])
+        print(f"{label:>16} {r['accepted']:>4} {r['rejected']:>4} {fmt(r['p50_seconds']):>7} "
+              f"{fmt(r['p99_seconds']):>7} {fmt(r['short_p50_seconds']):>10} {r['wall_seconds']:>7.2f}  "
+              f"{', '.join(f'{s:g}' for s in sorted(r['retry_after_seconds'])) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
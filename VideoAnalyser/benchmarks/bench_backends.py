@@ -0,0 +1,120 @@
+# bench_backends.py - Latency and person-box agreement of the ONNX/OpenVINO backends vs PyTorch
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_backends.py --weights yolov8n.pt --backends torch onnx openvino
+#   python benchmarks/bench_backends.py --weights yolov8x.pt --frames 20
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import FrameSource, FixedCount
+from inference_backend import load_model, prepare_backend
+
+DEFAULT_VIDEO_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads', '*.mp4')
+
+
+def load_frames(video_path, num_frames, size=(640, 480)):
+    """Sample frames spread over the whole clip"""
+    with FrameSource(video_path, FixedCount(num_frames)) as source:
+        return [cv2.resize(frame, size) for _, frame in source]
+
+
+def person_boxes(result, conf):
+    boxes = result.boxes.data.cpu().numpy()
+    return boxes[(boxes[:, 5] == 0) & (boxes[:, 4] >= conf), :4]
+
+
+def box_iou(a, b):
+    """IoU matrix between two (N, 4) and (M, 4) xyxy arrays"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_boxes(reference, candidate, iou_threshold):
+    """Greedy highest-IoU matching; returns the IoUs of the matched pairs"""
+    if len(reference) == 0 or len(candidate) == 0:
+        return []
+    iou = box_iou(reference, candidate)
+    matched = []
+    while True:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < iou_threshold:
+            return matched
+        matched.append(float(iou[i, j]))
+        iou[i, :] = -1
+        iou[:, j] = -1
+
+
+def run_backend(model, frames, conf, warmup):
+    for _ in range(warmup):
+        model.predict(frames[0], verbose=False, conf=conf)
+    latencies = []
+    boxes = []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model.predict(frame, verbose=False, conf=conf)[0]
+        latencies.append(time.perf_counter() - start)
+        boxes.append(person_boxes(result, conf))
+    return np.array(latencies) * 1000, boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare inference backends against PyTorch on CPU')
+    parser.add_argument('--video', default=None, help='Video to sample frames from (defaults to the first readable clip in uploads/)')
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx', 'openvino'])
+    parser.add_argument('--frames', type=int, default=30, help='Number of frames sampled across the clip')
+    parser.add_argument('--conf', type=float, default=0.6, help='Person confidence threshold (the detector default)')
+    parser.add_argument('--iou', type=float, default=0.5, help='IoU needed for two boxes to count as the same person')
+    parser.add_argument('--warmup', type=int, default=3)
+    args = parser.parse_args()
+
+    videos = [args.video] if args.video else sorted(glob.glob(DEFAULT_VIDEO_GLOB))
+    frames = []
+    for video_path in videos:
+        frames = load_frames(video_path, args.frames)
+        if frames:
+            break
+    if not frames:
+        raise SystemExit("Could not decode frames from any video")
+    print(f"Video: {video_path} ({len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}, CPU)")
+
+    reference = None
+    print(f"{'backend':<10} {'mean ms':>9} {'p95 ms':>9} {'people':>7} {'recall':>7} {'precision':>9} {'mean IoU':>9}")
+    for backend in ['torch'] + [b for b in args.backends if b != 'torch']:
+        try:
+            prepare_backend(args.weights, backend)
+            model = load_model(args.weights, backend)
+        except Exception as e:
+            print(f"{backend:<10} unavailable: {e}")
+            continue
+
+        latencies, boxes = run_backend(model, frames, args.conf, args.warmup)
+        total = sum(len(b) for b in boxes)
+        if reference is None:
+            reference = boxes
+            recall = precision = mean_iou = 1.0
+        else:
+            ious = [iou for ref, cand in zip(reference, boxes) for iou in match_boxes(ref, cand, args.iou)]
+            ref_total = sum(len(b) for b in reference)
+            recall = len(ious) / ref_total if ref_total else 1.0
+            precision = len(ious) / total if total else 1.0
+            mean_iou = float(np.mean(ious)) if ious else 0.0
+        print(f"{backend:<10} {latencies.mean():9.1f} {np.percentile(latencies, 95):9.1f} {total:7d} "
+              f"{recall:7.3f} {precision:9.3f} {mean_iou:9.3f}")
+
+
+if __name__ == '__main__':
+    main()
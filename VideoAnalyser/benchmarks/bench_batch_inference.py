@@ -0,0 +1,81 @@
+# bench_batch_inference.py - Per-frame vs batched YOLO inference throughput on CPU
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_batch_inference.py --video "uploads/1754392212_Video.mp4" --batch-sizes 1 4 10 16
+import argparse
+import glob
+import os
+import time
+
+import cv2
+from ultralytics import YOLO
+
+DEFAULT_VIDEO_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads', '*.mp4')
+
+
+def load_frames(video_path, num_frames, frame_skip=3, size=(640, 480)):
+    """Decode and resize frames the same way detect_harassment_optimized does"""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    frame_number = 0
+    while len(frames) < num_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_number % frame_skip == 0:
+            frames.append(cv2.resize(frame, size))
+        frame_number += 1
+    cap.release()
+    return frames
+
+
+def run_per_frame(model, frames):
+    """The old process_frame_batch loop: one model call per frame"""
+    start = time.perf_counter()
+    for frame in frames:
+        model(frame, verbose=False)[0].boxes.data.cpu().numpy()
+    return time.perf_counter() - start
+
+
+def run_batched(model, frames, batch_size):
+    """One model call per batch of frames"""
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        for detections in model(frames[i:i + batch_size], verbose=False):
+            detections.boxes.data.cpu().numpy()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-frame vs batched YOLO inference throughput')
+    parser.add_argument('--video', default=None, help='Video to sample frames from (defaults to the first clip in uploads/)')
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--frames', type=int, default=60, help='Number of sampled frames to run')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 10, 16])
+    parser.add_argument('--warmup', type=int, default=3)
+    args = parser.parse_args()
+
+    video_path = args.video or sorted(glob.glob(DEFAULT_VIDEO_GLOB))[0]
+    frames = load_frames(video_path, args.frames)
+    if not frames:
+        raise SystemExit(f"Could not decode frames from {video_path}")
+
+    model = YOLO(args.weights)
+    model.to('cpu')
+    for _ in range(args.warmup):
+        model(frames[0], verbose=False)
+
+    print(f"Video: {video_path} ({len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}, CPU)")
+
+    elapsed = run_per_frame(model, frames)
+    baseline_fps = len(frames) / elapsed
+    print(f"{'per-frame loop':<20} {baseline_fps:8.2f} frames/sec")
+
+    for batch_size in args.batch_sizes:
+        elapsed = run_batched(model, frames, batch_size)
+        fps = len(frames) / elapsed
+        print(f"{f'batched (bs={batch_size})':<20} {fps:8.2f} frames/sec  ({fps / baseline_fps:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
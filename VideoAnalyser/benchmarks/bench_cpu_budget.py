@@ -0,0 +1,188 @@
+# bench_cpu_budget.py - Concurrent-upload load test of app2 with and without the CPU budget
+#
+# Runs a burst of concurrent analyses through app2.analyze_video (thread
+# serving mode) in a fresh subprocess per case, once with CPU_BUDGET=0
+# (torch and OpenCV each default to every core in every job) and once with
+# the budget, and reports jobs/min, analysed video frames/sec and the p50
+# and p99 job latency. The detector is compute-bound like YOLO: an untrained
+# yolov8n built from its yaml (no weights download) runs a real forward pass
+# on every frame, and the synthetic people are found by FakeDetector. The
+# budget only matters with several cores; on a single core both modes match.
+# "peak thr" is the most torch threads that concurrent forward passes asked
+# for at once. With the budget on it stays within the budget, apart from a
+# pass already running when another job starts, which finishes on its old
+# share (checkable on one core by passing a larger --budget). The table is
+# also written as a Markdown report (--output) headed by the core count, so
+# results from the serving machine can be kept alongside the default budget.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_cpu_budget.py
+#   python benchmarks/bench_cpu_budget.py --concurrency 1 4 8 --jobs-per-client 3 --budget 8
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+class ThreadTally:
+    """Torch threads of the forward passes running right now, and the peak"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def add(self, threads):
+        with self._lock:
+            self.current += threads
+            self.peak = max(self.peak, self.current)
+
+
+TORCH_THREADS = ThreadTally()
+
+
+class ComputeBoundDetector:
+    """FakeDetector's boxes, after a real (untrained) YOLO forward pass per call"""
+
+    def __init__(self, arch):
+        from ultralytics import YOLO
+        from synthetic import FakeDetector
+        self.net = YOLO(arch)
+        self.boxes = FakeDetector()
+        self._lock = threading.Lock()
+
+    def predict(self, source, **kwargs):
+        import torch
+        kwargs.pop('imgsz', None)
+        with self._lock:  # one ultralytics predictor per detector
+            threads = torch.get_num_threads()
+            TORCH_THREADS.add(threads)
+            try:
+                self.net.predict(source, verbose=False)
+            finally:
+                TORCH_THREADS.add(-threads)
+        return self.boxes.predict(source)
+
+    __call__ = predict
+
+
+def run_case(case):
+    import inference_backend
+    from synthetic import FakeDetector
+
+    if case['detector'] == 'fake':
+        inference_backend.register_backend('bench', lambda weights: FakeDetector())
+    else:
+        inference_backend.register_backend('bench', lambda weights: ComputeBoundDetector(case['arch']))
+    inference_backend.DEFAULT_BACKEND = 'bench'
+    import app2
+
+    # Warm up one model so the first job doesn't pay for lazy setup
+    app2.analyze_video(case['video'])
+
+    latencies = []
+    lock = threading.Lock()
+
+    def one_job(_):
+        start = time.perf_counter()
+        app2.analyze_video(case['video'])
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    jobs = case['concurrency'] * case['jobs_per_client']
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=case['concurrency']) as executor:
+        list(executor.map(one_job, range(jobs)))
+    wall = time.perf_counter() - start
+
+    import torch
+    return dict(case, **{
+        'wall_seconds': round(wall, 2),
+        'jobs_per_minute': round(jobs / wall * 60, 2),
+        'video_fps': round(jobs * case['frames'] / wall, 1),
+        'p50_seconds': round(float(np.percentile(latencies, 50)), 2),
+        'p99_seconds': round(float(np.percentile(latencies, 99)), 2),
+        'torch_threads_after': torch.get_num_threads(),
+        'peak_torch_threads': TORCH_THREADS.peak,
+        'cpu_budget': app2.cpu_budget.stats()
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput and tail latency with and without CPU_BUDGET')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--jobs-per-client', type=int, default=2)
+    parser.add_argument('--budget', type=int, default=None, help='CPU_BUDGET cores (default: all available)')
+    parser.add_argument('--resolution', default='640x360')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--people', type=int, default=4)
+    parser.add_argument('--detector', choices=['yolo-arch', 'fake'], default='yolo-arch')
+    parser.add_argument('--arch', default='yolov8n.yaml')
+    parser.add_argument('--video-dir', default=os.path.join(ROOT, 'cache', 'synthetic'))
+    parser.add_argument('--output', default=os.path.join(ROOT, 'cache', 'cpu_budget_report.md'))
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return
+
+    from cpu_budget import available_cores
+    from synthetic import make_video
+
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    video = os.path.join(args.video_dir, f'synthetic_{width}x{height}_{args.seconds:g}s_{args.people}p.mp4')
+    make_video(video, width, height, args.seconds, 30, args.people)
+    budget = args.budget or available_cores()
+
+    header = (f"{available_cores()} cores available, budget {budget}; {args.resolution} {args.seconds:g}s clip, "
+              f"{args.detector} detector, {args.jobs_per_client} jobs per client")
+    lines = ['# CPU budget load test', '', header, '',
+             '| clients | budget | jobs/min | video fps | p50 s | p99 s | wall s | peak thr |',
+             '|---|---|---|---|---|---|---|---|']
+    if available_cores() < 2:
+        lines[3:3] = ['', 'With a single core the budget cannot change anything; run this on the serving machine.']
+    print(header)
+    print(f"{'clients':>7} {'budget':>7} {'jobs/min':>9} {'video fps':>10} {'p50 s':>7} {'p99 s':>7} {'wall s':>7} "
+          f"{'peak thr':>8}")
+    for concurrency in args.concurrency:
+        for label, cores in (('off', 0), ('on', budget)):
+            env = dict(os.environ, CPU_BUDGET=str(cores), SERVING_MODE='thread', MODEL_POOL_SIZE=str(concurrency),
+                       METRICS='0')
+            case = {'concurrency': concurrency, 'jobs_per_client': args.jobs_per_client, 'video': video,
+                    'frames': int(round(args.seconds * 30)), 'detector': args.detector, 'arch': args.arch}
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case)],
+                                       cwd=ROOT, env=env, capture_output=True, text=True)
+            results = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+            if not results:
+                error = (completed.stderr.strip().splitlines() or ['?'])[-1]
+                print(f"{concurrency:>7} {label:>7}  failed: {error}")
+                lines.append(f"| {concurrency} | {label} | failed: {error} | | | | | |")
+                continue
+            r = json.loads(results[-1])
+            print(f"{concurrency:>7} {label:>7} {r['jobs_per_minute']:>9.1f} {r['video_fps']:>10.1f} "
+                  f"{r['p50_seconds']:>7.2f} {r['p99_seconds']:>7.2f} {r['wall_seconds']:>7.2f} "
+                  f"{r['peak_torch_threads']:>8}")
+            lines.append(f"| {concurrency} | {label} | {r['jobs_per_minute']:.1f} | {r['video_fps']:.1f} | "
+                         f"{r['p50_seconds']:.2f} | {r['p99_seconds']:.2f} | {r['wall_seconds']:.2f} | "
+                         f"{r['peak_torch_threads']} |")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"Written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
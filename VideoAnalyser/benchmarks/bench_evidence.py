@@ -0,0 +1,97 @@
+# bench_evidence.py - Cost of writing the annotated evidence video during analysis
+#
+# Runs AdvancedHarassmentDetector.process_video on synthetic clips twice per
+# repeat, once analysis-only and once with render_path, and reports the
+# wall-clock overhead of rendering together with the time spent drawing,
+# encoding (on the background thread) and blocked on a full encoder queue.
+# Skipped frames have to be converted to BGR for the copy, so the decode
+# stage grows too. The rendered file is checked to hold every frame.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_evidence.py
+#   python benchmarks/bench_evidence.py --resolutions 1920x1080 --seconds 30 --detector yolo
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic import FakeDetector, make_video
+from harassment_detector import AdvancedHarassmentDetector
+from inference_backend import load_model
+
+
+def run(detector, video, render_path):
+    context = detector.new_context()
+    start = time.perf_counter()
+    incidents = detector.process_video(video, context=context, render_path=render_path)
+    wall = time.perf_counter() - start
+    return wall, len(incidents), context.timer.breakdown()
+
+
+def stage_seconds(breakdown, name):
+    return breakdown['stages'].get(name, {}).get('seconds', 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overhead of single-pass evidence video rendering')
+    parser.add_argument('--resolutions', nargs='+', default=['640x360', '1280x720'])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--people', type=int, default=8)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--detector', choices=['fake', 'yolo'], default='fake')
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--video-dir', default=os.path.join(ROOT, 'cache', 'synthetic'))
+    args = parser.parse_args()
+
+    model = FakeDetector() if args.detector == 'fake' else load_model(args.weights)
+    detector = AdvancedHarassmentDetector(model)
+
+    print(f"{'clip':>22} {'mode':>9} {'wall s':>8} {'fps':>8} {'decode':>7} {'annot':>7} "
+          f"{'encode':>7} {'wait':>7} {'overhead':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.lower().split('x'))
+            video = os.path.join(args.video_dir, f'synthetic_{width}x{height}_{args.seconds:g}s_{args.people}p.mp4')
+            make_video(video, width, height, args.seconds, args.fps, args.people)
+            frames = int(round(args.seconds * args.fps))
+            clip = f'{resolution} {args.seconds:g}s {args.people}p'
+            render_path = os.path.join(tmp, 'evidence.mp4')
+
+            # Warm up imports and the detector before timing
+            run(detector, video, None)
+            best = {}
+            for _ in range(args.repeat):
+                for mode, path in (('analysis', None), ('render', render_path)):
+                    result = run(detector, video, path)
+                    if mode not in best or result[0] < best[mode][0]:
+                        best[mode] = result
+
+            cap = cv2.VideoCapture(render_path)
+            written = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            assert best['analysis'][1] == best['render'][1], 'rendering changed the incidents'
+            assert written == frames, f'evidence video has {written} of {frames} frames'
+
+            baseline = best['analysis'][0]
+            for mode in ('analysis', 'render'):
+                wall, _, breakdown = best[mode]
+                overhead = f'{(wall / baseline - 1) * 100:+8.1f}%' if mode == 'render' else ''
+                print(f"{clip:>22} {mode:>9} {wall:8.3f} {frames / wall:8.1f} "
+                      f"{stage_seconds(breakdown, 'decode'):7.3f} {stage_seconds(breakdown, 'annotate'):7.3f} "
+                      f"{stage_seconds(breakdown, 'encode'):7.3f} {stage_seconds(breakdown, 'encode_wait'):7.3f} "
+                      f"{overhead:>9}")
+            print(f"{'':>22} {best['render'][2]['counters'].get('frames_annotated', 0)} of {written} "
+                  f"frames annotated")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# bench_frame_pool.py - Frame allocations and peak memory with and without the frame buffer pool
+#
+# Runs the app.py and app2 pipelines on a synthetic 1080p clip with
+# FRAME_POOL=0 and FRAME_POOL=1, each in a fresh subprocess with the fake
+# detector, and reports:
+#   - frame allocations: cap.retrieve/read and cv2.resize calls that returned
+#     a new array instead of filling the buffer they were given (with the
+#     pool on, what is left is the small greyscale thumbnails of MOTION_GATE=1;
+#     the pool's own buffers are listed on the line below)
+#   - peak traced MB: the tracemalloc peak, which includes every numpy array
+#   - peak RSS MB of the whole process
+#   - wall-clock time and the pool's own buffer counts
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_frame_pool.py
+#   python benchmarks/bench_frame_pool.py --resolution 1920x1080 --seconds 30 --adaptive
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+class AllocationCounter:
+    """Counts full frames allocated by decoding and resizing"""
+
+    def __init__(self):
+        self.allocations = 0
+        self.allocated_mb = 0.0
+        self.reused = 0
+
+    def record(self, given, result):
+        if result is None:
+            return
+        if given is not None and result is given:
+            self.reused += 1
+        else:
+            self.allocations += 1
+            self.allocated_mb += result.nbytes / (1024 * 1024)
+
+
+class CountingCapture:
+    def __init__(self, cap, counter):
+        self._cap = cap
+        self._counter = counter
+
+    def _counted(self, method, image=None):
+        ret, frame = getattr(self._cap, method)(image) if image is not None else getattr(self._cap, method)()
+        self._counter.record(image, frame if ret else None)
+        return ret, frame
+
+    def read(self, image=None):
+        return self._counted('read', image)
+
+    def retrieve(self, image=None, *args):
+        return self._counted('retrieve', image)
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+def run_case(case):
+    import cv2
+    import inference_backend
+    from synthetic import FakeDetector
+
+    counter = AllocationCounter()
+    real_capture = cv2.VideoCapture
+    real_resize = cv2.resize
+    cv2.VideoCapture = lambda *args, **kwargs: CountingCapture(real_capture(*args, **kwargs), counter)
+
+    def resize(src, dsize, dst=None, *args, **kwargs):
+        result = real_resize(src, dsize, dst, *args, **kwargs)
+        counter.record(dst, result)
+        return result
+
+    cv2.resize = resize
+    inference_backend.register_backend('fake', lambda weights: FakeDetector())
+    inference_backend.DEFAULT_BACKEND = 'fake'
+
+    if case['pipeline'] == 'app':
+        import app
+        from frame_pool import FramePool
+        pool = FramePool() if app.FRAME_POOL else None
+
+        def analyse():
+            detections = app.detect_harassment_optimized(case['video'], pool=pool)
+            return detections, {'frame_pool': pool.stats()} if pool is not None else None
+    else:
+        import app2
+        analyse = lambda: app2.analyze_video(case['video'])
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    detections, stats = analyse()
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return dict(case, **{
+        'incidents': len(detections),
+        'wall_seconds': round(wall, 3),
+        'frame_allocations': counter.allocations,
+        'allocated_mb': round(counter.allocated_mb, 1),
+        'frames_into_buffers': counter.reused,
+        'peak_traced_mb': round(peak / (1024 * 1024), 1),
+        'peak_rss_mb': round(peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+        'frame_pool': (stats or {}).get('frame_pool')
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Allocations and peak memory with and without FRAME_POOL')
+    parser.add_argument('--resolution', default='1920x1080')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--people', type=int, default=8)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--pipelines', nargs='+', choices=['app', 'app2'], default=['app', 'app2'])
+    parser.add_argument('--adaptive', action='store_true', help='Adaptive sampling (fewer frames decoded)')
+    parser.add_argument('--video-dir', default=os.path.join(ROOT, 'cache', 'synthetic'))
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return
+
+    from synthetic import make_video
+
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    video = os.path.join(args.video_dir, f'synthetic_{width}x{height}_{args.seconds:g}s_{args.people}p.mp4')
+    make_video(video, width, height, args.seconds, args.fps, args.people)
+
+    print(f"{args.resolution} {args.seconds:g}s {args.people} people, "
+          f"{'adaptive' if args.adaptive else 'fixed-rate'} sampling")
+    print(f"{'pipeline':<9} {'pool':>5} {'allocs':>7} {'alloc MB':>9} {'reused':>7} {'traced MB':>10} "
+          f"{'RSS MB':>7} {'wall s':>7} {'incidents':>9}")
+    for pipeline in args.pipelines:
+        for pool in ('0', '1'):
+            env = dict(os.environ, FRAME_POOL=pool, SERVING_MODE='thread', METRICS='0')
+            if args.adaptive:
+                env['ADAPTIVE_SAMPLING'] = '1'
+            case = {'pipeline': pipeline, 'video': video}
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case)],
+                                       cwd=ROOT, env=env, capture_output=True, text=True)
+            lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+            if not lines:
+                print(f"{pipeline:<9} {pool:>5}  failed: {(completed.stderr.strip().splitlines() or ['?'])[-1]}")
+                continue
+            r = json.loads(lines[-1])
+            print(f"{pipeline:<9} {pool:>5} {r['frame_allocations']:>7} {r['allocated_mb']:>9.1f} "
+                  f"{r['frames_into_buffers']:>7} {r['peak_traced_mb']:>10.1f} {r['peak_rss_mb']:>7.0f} "
+                  f"{r['wall_seconds']:>7.2f} {r['incidents']:>9}")
+            if r['frame_pool']:
+                print(f"{'':<15} pool: {r['frame_pool']}")
+
+
+if __name__ == '__main__':
+    main()
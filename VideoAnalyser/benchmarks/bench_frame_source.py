@@ -0,0 +1,85 @@
+# bench_frame_source.py - read()-and-drop vs FrameSource grab()/retrieve() sampling
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_frame_source.py                 # every clip in uploads/
+#   python benchmarks/bench_frame_source.py --video clip.mp4 --skips 2 3 --target-fps 5
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import FrameSource, EveryNth, TargetFps, FixedCount
+
+DEFAULT_VIDEO_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads', '*.mp4')
+
+
+def read_and_drop(video_path, frame_skip):
+    """The old loop: cap.read() every frame, keep frame_number % frame_skip == 0"""
+    cap = cv2.VideoCapture(video_path)
+    kept = 0
+    frame_number = 0
+    start = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_number % frame_skip == 0:
+            kept += 1
+        frame_number += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return elapsed, kept
+
+
+def sample(video_path, policy, seek_min_gap=None):
+    source = FrameSource(video_path, policy, seek_min_gap=seek_min_gap)
+    kept = 0
+    start = time.perf_counter()
+    for _ in source:
+        kept += 1
+    return time.perf_counter() - start, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure decode savings of the FrameSource sampler')
+    parser.add_argument('--video', nargs='*', default=None, help='Clips to measure (defaults to every clip in uploads/)')
+    parser.add_argument('--skips', type=int, nargs='+', default=[2, 3])
+    parser.add_argument('--target-fps', type=float, default=5.0)
+    parser.add_argument('--count', type=int, default=30, help='Frames for the fixed-count policy')
+    parser.add_argument('--seek-min-gap', type=int, default=60, help='Seek instead of grabbing for longer gaps (fixed count)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    videos = args.video or sorted(glob.glob(DEFAULT_VIDEO_GLOB))
+    for video_path in videos:
+        probe = FrameSource(video_path)
+        if not probe.isOpened() or probe.total_frames <= 0 or not probe.cap.grab():
+            print(f"Skipping {video_path}: cannot be decoded here")
+            probe.release()
+            continue
+        print(f"\n{os.path.basename(video_path)}: {probe.width}x{probe.height}, "
+              f"{probe.total_frames} frames at {probe.fps:.1f} FPS")
+        probe.release()
+
+        for frame_skip in args.skips:
+            baseline, kept = min(read_and_drop(video_path, frame_skip) for _ in range(args.repeat))
+            sampled, kept_new = min(sample(video_path, EveryNth(frame_skip)) for _ in range(args.repeat))
+            assert kept == kept_new, (kept, kept_new)
+            print(f"  every {frame_skip}:  read+drop {baseline:6.3f}s  grab/retrieve {sampled:6.3f}s  "
+                  f"({baseline / sampled:.2f}x, {kept} frames)")
+
+        elapsed, kept = min(sample(video_path, TargetFps(args.target_fps)) for _ in range(args.repeat))
+        print(f"  target {args.target_fps:g} fps: {elapsed:6.3f}s ({kept} frames)")
+
+        elapsed, kept = min(sample(video_path, FixedCount(args.count)) for _ in range(args.repeat))
+        seek_elapsed, _ = min(sample(video_path, FixedCount(args.count), args.seek_min_gap)
+                              for _ in range(args.repeat))
+        print(f"  fixed {args.count}:  grab {elapsed:6.3f}s  seek {seek_elapsed:6.3f}s ({kept} frames)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# bench_interaction.py - Per-pair calculate_interaction_score loop vs score_all_pairs by crowd size
+#
+# Every frame is first checked for parity: each factor and the total score
+# of every ordered pair must match the scalar version. Track histories are
+# sampled 1 to 15 frames apart, as adaptive sampling spaces them.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_interaction.py --sizes 2 10 30 80 200
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harassment_detector import AdvancedHarassmentDetector
+from track_history import TrackHistoryStore
+
+
+def make_scene(rng, n, history_len=30, width=1280, height=720):
+    """Boxes of ``n`` people plus track histories of random lengths and
+    spacing that end at their centers on frame 1000"""
+    x1 = rng.uniform(0, width - 200, n)
+    y1 = rng.uniform(0, height - 300, n)
+    boxes = np.stack((x1, y1, x1 + rng.uniform(30, 200, n), y1 + rng.uniform(60, 300, n)),
+                     axis=1).astype(np.float32)
+    centers = np.stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2), axis=1)
+
+    store = TrackHistoryStore(history_len)
+    track_ids = list(range(n))
+    for track_id, center, length in zip(track_ids, centers, rng.integers(1, history_len + 5, n)):
+        # A walk towards the current center so movement and sustained both fire
+        steps = rng.normal(0, 15, (length, 2)).cumsum(axis=0)[::-1]
+        frame_numbers = 1000 - rng.integers(1, 16, length).cumsum()[::-1] + 1
+        for frame_number, position in zip(frame_numbers, center + steps - steps[-1]):
+            store.append(track_id, position, frame_number)
+    return boxes, track_ids, store
+
+
+def loop_scores(detector, boxes, track_ids, store):
+    return [[detector.calculate_interaction_score(boxes[i], boxes[j], store[track_ids[i]], store[track_ids[j]],
+                                                  store.frames_of(track_ids[i]), store.frames_of(track_ids[j]))
+             for j in range(len(track_ids))] for i in range(len(track_ids))]
+
+
+def check_parity(detector, boxes, track_ids, store):
+    scores, factors = detector.score_all_pairs(boxes, track_ids, store)
+    for i, row in enumerate(loop_scores(detector, boxes, track_ids, store)):
+        for j, (score, details) in enumerate(row):
+            if i == j:
+                continue
+            # scipy's euclidean may stay in float32, so allow float32 rounding
+            assert abs(scores[i, j] - score) < 1e-5, (i, j, scores[i, j], score)
+            for name, value in details.items():
+                tolerance = 1e-5 * max(1.0, abs(value))
+                assert abs(factors[name][i, j] - value) < tolerance, (name, i, j, factors[name][i, j], value)
+
+
+def time_per_call(fn, scenes, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for scene in scenes:
+            fn(*scene)
+    return (time.perf_counter() - start) / (repeat * len(scenes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crowd-size benchmark for the batched interaction scorer')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2, 5, 10, 20, 40, 80])
+    parser.add_argument('--frames', type=int, default=20, help='Random scenes per crowd size')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    detector = AdvancedHarassmentDetector(None)
+    rng = np.random.default_rng(0)
+    print(f"{'people':>7} {'loop (ms)':>10} {'vectorised (ms)':>16} {'speedup':>8}")
+    for n in args.sizes:
+        scenes = [make_scene(rng, n) for _ in range(args.frames)]
+        for scene in scenes:
+            check_parity(detector, *scene)
+
+        # The detector only scores i < j pairs
+        def loop_upper(boxes, track_ids, store):
+            for i in range(len(track_ids)):
+                for j in range(i + 1, len(track_ids)):
+                    detector.calculate_interaction_score(boxes[i], boxes[j], store[track_ids[i]], store[track_ids[j]],
+                                                         store.frames_of(track_ids[i]), store.frames_of(track_ids[j]))
+
+        loop_ms = time_per_call(loop_upper, scenes, args.repeat) * 1000
+        fast_ms = time_per_call(detector.score_all_pairs, scenes, args.repeat) * 1000
+        print(f"{n:>7} {loop_ms:>10.3f} {fast_ms:>16.3f} {loop_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
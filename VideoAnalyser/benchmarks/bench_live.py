@@ -0,0 +1,79 @@
+# bench_live.py - Latency and frame drops of LiveFrameSource fed through a FIFO
+#
+# An ffmpeg test pattern is written in real time into a named pipe (or into a
+# growing MPEG-TS file with --mode file) while a consumer that sleeps
+# --infer-ms per frame stands in for the detector. Slower consumers should
+# see more drops but the same bounded latency.
+#
+# Usage (from VideoAnalyser/, needs ffmpeg on PATH):
+#   python benchmarks/bench_live.py --seconds 10 --infer-ms 10 50 150
+#   python benchmarks/bench_live.py --mode file --queue 2
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from live import LiveFrameSource, LiveSession
+
+
+def start_writer(path, seconds, fps, size):
+    """ffmpeg writing a live-paced test pattern to ``path`` as MPEG-TS"""
+    return subprocess.Popen(
+        ['ffmpeg', '-loglevel', 'error', '-y', '-re',
+         '-f', 'lavfi', '-i', f'testsrc=size={size}:rate={fps}', '-t', str(seconds),
+         '-c:v', 'mpeg1video', '-q:v', '4', '-f', 'mpegts', path],
+        stdin=subprocess.DEVNULL
+    )
+
+
+def run(mode, seconds, fps, size, infer_ms, max_queue):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'live.ts')
+        if mode == 'fifo':
+            os.mkfifo(path)
+        writer = start_writer(path, seconds, fps, size)
+        if mode == 'file':
+            # Give the recorder a head start so the file has a header to open
+            while not os.path.exists(path) or os.path.getsize(path) < 64 * 1024:
+                time.sleep(0.05)
+
+        # Opening a FIFO blocks until the writer has it open too
+        source = LiveFrameSource(path, max_queue=max_queue, fps=fps, follow=mode == 'file', idle_timeout=2.0)
+        session = LiveSession(path, source)
+        for frame_number, captured_at, frame in source:
+            time.sleep(infer_ms / 1000)
+            session.frame_done(frame_number, captured_at)
+        session.finish()
+        writer.wait()
+        return session.to_dict(include_incidents=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure live ingestion latency and drops')
+    parser.add_argument('--mode', choices=['fifo', 'file'], default='fifo')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--size', default='640x360')
+    parser.add_argument('--infer-ms', type=float, nargs='+', default=[10, 50, 150],
+                        help='Simulated detector time per frame')
+    parser.add_argument('--queue', type=int, default=4, help='Frames kept waiting for analysis')
+    args = parser.parse_args()
+
+    if shutil.which('ffmpeg') is None:
+        sys.exit('ffmpeg is needed to feed the live source')
+
+    print(f"{args.mode}: {args.seconds:g}s of {args.size} at {args.fps} FPS, queue {args.queue}")
+    for infer_ms in args.infer_ms:
+        stats = run(args.mode, args.seconds, args.fps, args.size, infer_ms, args.queue)
+        latency = stats['latency']
+        print(f"  infer {infer_ms:5.0f} ms: captured {stats['frames_captured']:4d}  "
+              f"dropped {stats['frames_dropped']:4d}  processed {stats['frames_processed']:4d}  "
+              f"latency mean {latency['mean_ms']} ms  p95 {latency['p95_ms']} ms  max {latency['max_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
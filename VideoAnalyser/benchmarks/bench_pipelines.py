@@ -0,0 +1,298 @@
+# bench_pipelines.py - Throughput, stage times and peak memory of the four harassment pipelines
+#
+# Generates scripted synthetic clips (see synthetic.py), then runs every
+# pipeline on every clip in a fresh subprocess, once with the deterministic
+# FakeDetector and once with real YOLO weights. Each run reports video
+# frames/sec, seconds spent decoding and in the detector, the rest (resizing,
+# tracking, scoring), model/import setup time and peak RSS. Stage times are
+# summed over threads, so for the overlapped app.py pipeline they can add up
+# to more than the wall-clock time.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_pipelines.py                          # default matrix, fake + YOLO
+#   python benchmarks/bench_pipelines.py --preset quick --detectors fake
+#   python benchmarks/bench_pipelines.py --pipelines app app2 --people 4 32 --output before.json
+#   python benchmarks/bench_pipelines.py --compare before.json    # fps ratio against an earlier run
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+PIPELINES = ['detect_logic', 'app', 'enhanced_model', 'app2']
+DETECTORS = ['fake', 'yolo']
+
+PRESETS = {
+    'quick': {'resolutions': ['640x360'], 'seconds': [5], 'people': [4]},
+    'default': {'resolutions': ['640x360', '1280x720'], 'seconds': [10], 'people': [4, 16]},
+    'full': {'resolutions': ['640x360', '1280x720', '1920x1080'], 'seconds': [10, 30], 'people': [2, 8, 32]},
+}
+
+
+class StageClock:
+    """Seconds and call counts per stage, safe to update from pipeline threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = {}
+        self.frames = {}
+
+    def add(self, stage, seconds, frames=1):
+        with self.lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.frames[stage] = self.frames.get(stage, 0) + frames
+
+
+class TimedCapture:
+    """cv2.VideoCapture that books read/grab/retrieve time to the decode stage"""
+
+    def __init__(self, cap, clock):
+        self._cap = cap
+        self._clock = clock
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        result = getattr(self._cap, method)(*args)
+        self._clock.add('decode', time.perf_counter() - start, frames=int(method != 'retrieve'))
+        return result
+
+    def read(self, *args):
+        return self._timed('read', *args)
+
+    def grab(self, *args):
+        return self._timed('grab', *args)
+
+    def retrieve(self, *args):
+        return self._timed('retrieve', *args)
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+class TimedModel:
+    """Model wrapper that books every detector call to the inference stage"""
+
+    def __init__(self, model, clock):
+        self._model = model
+        self._clock = clock
+
+    def _timed(self, method, source, *args, **kwargs):
+        start = time.perf_counter()
+        result = method(source, *args, **kwargs)
+        frames = len(source) if isinstance(source, (list, tuple)) else 1
+        self._clock.add('inference', time.perf_counter() - start, frames=frames)
+        return result
+
+    def __call__(self, source, *args, **kwargs):
+        return self._timed(self._model, source, *args, **kwargs)
+
+    def predict(self, source, *args, **kwargs):
+        return self._timed(self._model.predict, source, *args, **kwargs)
+
+    def track(self, source, *args, **kwargs):
+        return self._timed(self._model.track, source, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def _run_detect_logic(video_path):
+    sys.path.insert(0, os.path.join(ROOT, 'model'))
+    import detect_logic
+    return lambda: {'verdict': detect_logic.detect_harassment(video_path)}
+
+
+def _run_app(video_path):
+    import app
+    return lambda: {'incidents': len(app.detect_harassment_optimized(video_path))}
+
+
+def _run_enhanced_model(video_path):
+    import enhanced_model
+    detector = enhanced_model.HarassmentDetector()
+    return lambda: {'incidents': len(detector.detect_harassment_realtime(video_path))}
+
+
+def _run_app2(video_path):
+    import app2
+    return lambda: {'incidents': len(app2.analyze_video(video_path)[0])}
+
+
+RUNNERS = {
+    'detect_logic': _run_detect_logic,
+    'app': _run_app,
+    'enhanced_model': _run_enhanced_model,
+    'app2': _run_app2,
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_case(case):
+    """Run one pipeline on one clip in this process and return its measurements"""
+    import cv2
+    import inference_backend
+    from synthetic import FakeDetector
+
+    clock = StageClock()
+    real_capture = cv2.VideoCapture
+    cv2.VideoCapture = lambda *args, **kwargs: TimedCapture(real_capture(*args, **kwargs), clock)
+
+    # Every pipeline loads its models through load_model; route them all
+    # through a timing wrapper around the fake or real detector
+    real_loader = inference_backend.BACKENDS[inference_backend.DEFAULT_BACKEND]
+
+    def load(weights):
+        if case['detector'] == 'fake':
+            return TimedModel(FakeDetector(), clock)
+        return TimedModel(real_loader(case.get('weights') or weights), clock)
+
+    inference_backend.register_backend('bench', load)
+    inference_backend.DEFAULT_BACKEND = 'bench'
+
+    start = time.perf_counter()
+    run = RUNNERS[case['pipeline']](case['video'])
+    setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = run()
+    wall = time.perf_counter() - start
+
+    frames = case['frames']
+    decode = clock.seconds.get('decode', 0.0)
+    inference = clock.seconds.get('inference', 0.0)
+    return dict(case, **{
+        'wall_seconds': round(wall, 3),
+        'frames_per_second': round(frames / wall, 2) if wall > 0 else None,
+        'frames_inferred': clock.frames.get('inference', 0),
+        'frames_decoded': clock.frames.get('decode', 0),
+        'stages': {
+            'setup': round(setup, 3),
+            'decode': round(decode, 3),
+            'inference': round(inference, 3),
+            'other': round(max(0.0, wall - decode - inference), 3)
+        },
+        'peak_rss_mb': peak_rss_mb(),
+        'result': summary
+    })
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_in_subprocess(case, timeout):
+    """Fresh interpreter per case so imports, models and peak RSS don't carry over"""
+    env = dict(os.environ, SERVING_MODE='thread')
+    try:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case)],
+                                   cwd=ROOT, env=env, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return dict(case, error=f'timed out after {timeout}s')
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    return dict(case, error=(completed.stderr.strip().splitlines() or ['no output'])[-1])
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    key = lambda r: (r['pipeline'], r['detector'], r['resolution'], r['seconds'], r['people'])
+    before = {key(r): r for r in baseline['results'] if r.get('frames_per_second')}
+    print(f"\nCompared with {baseline_path} ({(baseline.get('commit') or '?')[:10]}):")
+    for result in results:
+        old = before.get(key(result))
+        if old and result.get('frames_per_second'):
+            ratio = result['frames_per_second'] / old['frames_per_second']
+            print(f"  {result['pipeline']:<15} {result['detector']:<5} {result['resolution']:>9} "
+                  f"{result['seconds']:>4}s {result['people']:>3}p  {old['frames_per_second']:8.1f} -> "
+                  f"{result['frames_per_second']:8.1f} fps ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the four harassment pipelines on synthetic clips')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='default')
+    parser.add_argument('--resolutions', nargs='+', help='WIDTHxHEIGHT (overrides the preset)')
+    parser.add_argument('--seconds', type=float, nargs='+', help='Clip lengths (overrides the preset)')
+    parser.add_argument('--people', type=int, nargs='+', help='Crowd sizes (overrides the preset)')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--pipelines', nargs='+', choices=PIPELINES, default=PIPELINES)
+    parser.add_argument('--detectors', nargs='+', choices=DETECTORS, default=DETECTORS)
+    parser.add_argument('--weights', default=None,
+                        help="Weights for the YOLO runs (default: each pipeline's own)")
+    parser.add_argument('--video-dir', default=os.path.join(ROOT, 'cache', 'synthetic'))
+    parser.add_argument('--output', default=None, help='Write the JSON report here')
+    parser.add_argument('--compare', default=None, help='Earlier JSON report to compare frames/sec against')
+    parser.add_argument('--timeout', type=int, default=1800, help='Seconds per case')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return
+
+    from synthetic import make_video
+
+    preset = PRESETS[args.preset]
+    results = []
+    print(f"{'pipeline':<15} {'det':<5} {'clip':>20} {'fps':>8} {'decode':>7} {'infer':>7} {'other':>7} {'RSS MB':>7}")
+    for resolution in args.resolutions or preset['resolutions']:
+        width, height = (int(v) for v in resolution.lower().split('x'))
+        for seconds in args.seconds or preset['seconds']:
+            for people in args.people or preset['people']:
+                video = os.path.join(args.video_dir, f'synthetic_{width}x{height}_{seconds:g}s_{people}p.mp4')
+                make_video(video, width, height, seconds, args.fps, people)
+                for detector in args.detectors:
+                    for pipeline in args.pipelines:
+                        case = {
+                            'pipeline': pipeline, 'detector': detector, 'weights': args.weights,
+                            'resolution': f'{width}x{height}', 'seconds': seconds, 'people': people,
+                            'fps': args.fps, 'frames': int(round(seconds * args.fps)), 'video': video
+                        }
+                        result = run_in_subprocess(case, args.timeout)
+                        results.append(result)
+                        clip = f"{resolution} {seconds:g}s {people}p"
+                        if 'error' in result:
+                            print(f"{pipeline:<15} {detector:<5} {clip:>20}  failed: {result['error']}")
+                            continue
+                        stages = result['stages']
+                        print(f"{pipeline:<15} {detector:<5} {clip:>20} {result['frames_per_second']:8.1f} "
+                              f"{stages['decode']:7.2f} {stages['inference']:7.2f} {stages['other']:7.2f} "
+                              f"{result['peak_rss_mb']:7.0f}")
+
+    report = {
+        'commit': git_commit(),
+        'created_at': time.time(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# bench_proximity.py - Pairwise compute_distance loop vs find_close_pairs by crowd size
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_proximity.py --sizes 2 10 30 80 200 --threshold 80
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import proximity
+from proximity import find_close_pairs
+
+
+def compute_distance(p1, p2):
+    return np.linalg.norm(np.array(p1) - np.array(p2))
+
+
+def loop_pairs(centers, threshold):
+    """The nested loop used by the detectors before find_close_pairs"""
+    pairs = []
+    for i in range(len(centers)):
+        for j in range(i + 1, len(centers)):
+            if compute_distance(centers[i], centers[j]) < threshold:
+                pairs.append((i, j))
+    return pairs
+
+
+def make_crowd(rng, n, width=1280, height=720):
+    return [(int(x), int(y)) for x, y in zip(rng.uniform(0, width, n), rng.uniform(0, height, n))]
+
+
+def time_per_call(fn, frames, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for centers in frames:
+            fn(centers)
+    return (time.perf_counter() - start) / (repeat * len(frames))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crowd-size benchmark for the proximity neighbour search')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2, 5, 10, 20, 40, 80, 160, 320])
+    parser.add_argument('--threshold', type=float, default=80)
+    parser.add_argument('--frames', type=int, default=50, help='Random frames per crowd size')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"threshold={args.threshold:g}px, dense matrix up to {proximity.DENSE_MAX_POINTS} people, grid above")
+    print(f"{'people':>7} {'loop (ms)':>10} {'vectorised (ms)':>16} {'speedup':>8}")
+    for n in args.sizes:
+        frames = [make_crowd(rng, n) for _ in range(args.frames)]
+        for centers in frames:
+            first, second, _ = find_close_pairs(centers, args.threshold)
+            assert list(zip(first.tolist(), second.tolist())) == loop_pairs(centers, args.threshold)
+
+        loop_ms = time_per_call(lambda c: loop_pairs(c, args.threshold), frames, args.repeat) * 1000
+        fast_ms = time_per_call(lambda c: find_close_pairs(c, args.threshold), frames, args.repeat) * 1000
+        print(f"{n:>7} {loop_ms:>10.3f} {fast_ms:>16.3f} {loop_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
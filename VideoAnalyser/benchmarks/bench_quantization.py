@@ -0,0 +1,217 @@
+# bench_quantization.py - Speed, memory and agreement report of the INT8 models vs float
+#
+# Runs the YOLO detector as float PyTorch, float ONNX and INT8 ONNX
+# (INFERENCE_BACKEND=onnx-int8) and MesoNet as float Keras and INT8 TFLite
+# (MESONET_PRECISION=int8) on frames sampled from local clips, each variant
+# in a fresh subprocess (after the exports are built in another) so its
+# memory is its own. Reports median and p90 latency, the process's resident
+# memory after the timed run, and agreement with the float
+# model: person-box IoU of matched boxes and the share of float boxes found
+# (IoU >= 0.5) for the detector, score delta and verdict agreement for
+# MesoNet. The report is printed and written as Markdown.
+#
+# Calibration and evaluation frames come from QUANT_CALIBRATION_VIDEOS unless
+# --videos names held-out clips. MesoNet is skipped without TensorFlow.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_quantization.py --weights yolov8n.pt
+#   python benchmarks/bench_quantization.py --weights yolov8x.pt --videos "eval/*.mp4" --frames 100
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+DETECTOR_VARIANTS = ('torch', 'onnx', 'onnx-int8')
+MESONET_VARIANTS = ('float32', 'int8')
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+
+def run_detector(case, frames):
+    from inference_backend import load_model
+
+    model = load_model(case['weights'], case['variant'])
+    model.predict(frames[0], imgsz=640, verbose=False)  # warm-up
+    latencies, boxes = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model.predict(frame, imgsz=640, conf=case['conf'], classes=[0], verbose=False)[0]
+        latencies.append(time.perf_counter() - start)
+        boxes.append(result.boxes.xyxy.cpu().numpy().tolist() if result.boxes is not None else [])
+    return latencies, boxes
+
+
+def run_mesonet(case, frames):
+    import fake
+    from quantization import calibration_videos, sample_frames
+
+    mesonet = fake.MesoNet()
+    mesonet.load_model(model_type='meso4')
+    if case['variant'] == 'int8':
+        mesonet.quantize(sample_frames(calibration_videos(case['calibration'])))
+    mesonet.predict(frames[0])  # warm-up
+    latencies, scores = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        scores.append(float(mesonet.predict(frame)[0]))
+        latencies.append(time.perf_counter() - start)
+    return latencies, scores
+
+
+def run_case(case):
+    from quantization import calibration_videos, sample_frames
+
+    if case['model'] == 'prepare':
+        from inference_backend import prepare_backend
+        for variant in DETECTOR_VARIANTS:
+            prepare_backend(case['weights'], variant)
+        return {}
+    if case['model'] == 'mesonet':
+        # The float and INT8 runs must share random weights when none are on disk
+        import tensorflow as tf
+        tf.keras.utils.set_random_seed(0)
+    frames = sample_frames(calibration_videos(case['videos']), case['frames'])
+    runner = run_mesonet if case['model'] == 'mesonet' else run_detector
+    latencies, outputs = runner(case, frames)
+    return {'latencies': latencies, 'outputs': outputs, 'memory_mb': rss_mb()}
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_agreement(reference, candidate):
+    """Mean IoU of greedily matched boxes, share of reference boxes matched at IoU >= 0.5, box counts"""
+    ious, found, total_ref, total_cand = [], 0, 0, 0
+    for ref_boxes, cand_boxes in zip(reference, candidate):
+        total_ref += len(ref_boxes)
+        total_cand += len(cand_boxes)
+        pairs = sorted(((iou(r, c), i, j) for i, r in enumerate(ref_boxes) for j, c in enumerate(cand_boxes)),
+                       reverse=True)
+        used_ref, used_cand = set(), set()
+        for value, i, j in pairs:
+            if value <= 0 or i in used_ref or j in used_cand:
+                continue
+            used_ref.add(i)
+            used_cand.add(j)
+            ious.append(value)
+            found += value >= 0.5
+    return {'mean_iou': float(np.mean(ious)) if ious else None,
+            'recall_iou50': found / total_ref if total_ref else None,
+            'boxes': total_cand, 'reference_boxes': total_ref}
+
+
+def score_agreement(reference, candidate):
+    delta = np.abs(np.asarray(candidate) - np.asarray(reference))
+    verdicts = np.mean((np.asarray(candidate) > 0.5) == (np.asarray(reference) > 0.5))
+    return {'mean_score_delta': float(delta.mean()), 'max_score_delta': float(delta.max()),
+            'verdict_agreement': float(verdicts)}
+
+
+def launch(case):
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case)],
+                               cwd=ROOT, capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+    if not lines:
+        raise RuntimeError((completed.stderr.strip().splitlines() or ['?'])[-1])
+    return json.loads(lines[-1])
+
+
+def fmt(value, spec='.3f'):
+    return '-' if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INT8 vs float latency, memory and agreement report')
+    parser.add_argument('--weights', nargs='+', default=['yolov8n.pt'])
+    parser.add_argument('--videos', default=None, help='Evaluation clip glob (default QUANT_CALIBRATION_VIDEOS)')
+    parser.add_argument('--calibration', default=None, help='Calibration clip glob for MesoNet')
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--skip-mesonet', action='store_true')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'cache', 'quantization_report.md'))
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return
+
+    lines = ['# INT8 quantisation report', '',
+             f"{args.frames} frames from `{args.videos or os.environ.get('QUANT_CALIBRATION_VIDEOS')}`, "
+             f"{os.cpu_count()} CPUs, person confidence >= {args.conf:g}", '',
+             '| model | variant | median ms | p90 ms | speedup | RSS MB | agreement with float |',
+             '|---|---|---|---|---|---|---|']
+
+    def row(model, variant, result, reference, agreement):
+        latencies = np.asarray(result['latencies']) * 1000
+        speedup = (f"{np.median(reference['latencies']) / np.median(result['latencies']):.2f}x"
+                   if reference else '-')
+        lines.append(f"| {model} | {variant} | {np.median(latencies):.1f} | {np.percentile(latencies, 90):.1f} | "
+                     f"{speedup} | {result['memory_mb']:.0f} | {agreement} |")
+
+    for weights in args.weights:
+        results = {}
+        try:
+            launch({'model': 'prepare', 'weights': weights})
+        except RuntimeError as e:
+            lines.append(f"| {weights} | - | failed: {e} | | | | |")
+            continue
+        for variant in DETECTOR_VARIANTS:
+            try:
+                results[variant] = launch({'model': 'detector', 'variant': variant, 'weights': weights,
+                                           'videos': args.videos, 'frames': args.frames, 'conf': args.conf})
+            except RuntimeError as e:
+                lines.append(f"| {weights} | {variant} | failed: {e} | | | | |")
+        reference = results.get('torch')
+        for variant, result in results.items():
+            if variant == 'torch':
+                agreement = f"reference ({sum(map(len, result['outputs']))} person boxes)"
+            elif reference is None:
+                agreement = '-'
+            else:
+                a = box_agreement(reference['outputs'], result['outputs'])
+                agreement = (f"IoU {fmt(a['mean_iou'])}, {fmt(a['recall_iou50'], '.1%')} of boxes found, "
+                             f"{a['boxes']} boxes")
+            row(weights, variant, result, reference, agreement)
+
+    if not args.skip_mesonet:
+        try:
+            float_run, int8_run = (launch({'model': 'mesonet', 'variant': variant, 'videos': args.videos,
+                                           'calibration': args.calibration, 'frames': args.frames})
+                                   for variant in MESONET_VARIANTS)
+        except RuntimeError as e:
+            lines.append(f"| MesoNet | - | failed: {e} | | | | |")
+        else:
+            row('MesoNet', 'float32 Keras', float_run, float_run, 'reference')
+            a = score_agreement(float_run['outputs'], int8_run['outputs'])
+            row('MesoNet', 'INT8 TFLite', int8_run, float_run,
+                f"score delta mean {a['mean_score_delta']:.4f} max {a['max_score_delta']:.4f}, "
+                f"verdicts {a['verdict_agreement']:.1%} equal")
+
+    report = '\n'.join(lines) + '\n'
+    print(report)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        f.write(report)
+    print(f"Written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# bench_rescore.py - Re-scoring a stored detection trace vs analysing the video again
+#
+# Analyses a synthetic clip once with the fake detector while recording its
+# DetectionTrace, checks that replaying the trace with unchanged parameters
+# gives exactly the same incidents, then times a threshold sweep. Times are
+# also given per minute of video. The check needs incidents to compare, so
+# the clip (or --threshold) must be one where the analysis finds some.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_rescore.py
+#   python benchmarks/bench_rescore.py --resolution 1280x720 --threshold 0.3
+#   python benchmarks/bench_rescore.py --seconds 60 --people 16 --adaptive
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detection trace re-scoring speed')
+    parser.add_argument('--resolution', default='640x360')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--people', type=int, default=8)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='Harassment score threshold of the analysis (default: the detector\'s)')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.2, 0.3, 0.4, 0.5, 0.6])
+    parser.add_argument('--adaptive', action='store_true', help='Adaptive sampling (fewer frames analysed)')
+    parser.add_argument('--video-dir', default=os.path.join(ROOT, 'cache', 'synthetic'))
+    args = parser.parse_args()
+    if args.adaptive:
+        os.environ['ADAPTIVE_SAMPLING'] = '1'
+
+    from synthetic import FakeDetector, make_video
+    from detection_cache import DetectionTrace
+    from harassment_detector import AdvancedHarassmentDetector
+
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    video = os.path.join(args.video_dir, f'synthetic_{width}x{height}_{args.seconds:g}s_{args.people}p.mp4')
+    make_video(video, width, height, args.seconds, args.fps, args.people)
+    minutes = args.seconds / 60
+
+    detector = AdvancedHarassmentDetector(FakeDetector())
+    if args.threshold is not None:
+        detector.HARASSMENT_SCORE_THRESHOLD = args.threshold
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_path = os.path.join(tmp, 'trace.npz')
+        start = time.perf_counter()
+        incidents = detector.process_video(video, trace_path=trace_path)
+        analyse = time.perf_counter() - start
+        trace_kb = os.path.getsize(trace_path) / 1024
+
+        start = time.perf_counter()
+        trace = DetectionTrace.load(trace_path)
+        load = time.perf_counter() - start
+
+    if not incidents:
+        sys.exit(f'The analysis found no incidents in {video}, so there is nothing to check the replay '
+                 'against; pick another clip or a lower --threshold')
+    replayed = detector.rescore(trace)
+    assert replayed == incidents, 'replay with unchanged parameters differs from the analysis'
+
+    start = time.perf_counter()
+    counts = [len(detector.rescore(trace, harassment_score_threshold=t)) for t in args.thresholds]
+    sweep = time.perf_counter() - start
+    per_run = sweep / len(args.thresholds)
+
+    print(f"{args.resolution} {args.seconds:g}s {args.people} people: {len(trace)} analysed frames, "
+          f"trace {trace_kb:.1f} KB, replay matches all {len(incidents)} incidents")
+    print(f"  full analysis (fake detector) {analyse * 1000:9.1f} ms  ({analyse / minutes * 1000:9.1f} ms/min of video)")
+    print(f"  load trace                    {load * 1000:9.1f} ms")
+    print(f"  rescore, per parameter set    {per_run * 1000:9.1f} ms  ({per_run / minutes * 1000:9.1f} ms/min of video, "
+          f"{per_run / max(1, len(trace)) * 1e6:.0f} us/frame)")
+    print(f"  speedup over re-analysis      {analyse / per_run:9.1f}x")
+    print('  incidents by threshold: ' + ', '.join(f'{t:g}: {n}' for t, n in zip(args.thresholds, counts)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# bench_segments.py - Sequential process_video vs segment-parallel processing
+#
+# Runs each clip once sequentially and once split across 1..N worker
+# processes, then reports wall-clock time, speedup and how many incidents
+# agree (same time within 1 s).
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_segments.py --weights yolov8n.pt --workers 2 4
+#   python benchmarks/bench_segments.py --video long.mp4 --min-segment-seconds 10
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harassment_detector import AdvancedHarassmentDetector
+from inference_backend import load_model, prepare_backend, DEFAULT_BACKEND
+from worker_pool import ProcessWorkerPool
+
+DEFAULT_VIDEO_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads', '*.mp4')
+
+
+def agreement(reference, candidate, tolerance=1.0):
+    """Incidents of ``reference`` with a ``candidate`` incident within ``tolerance`` seconds"""
+    return sum(1 for r in reference
+               if any(abs(r['timestamp'] - c['timestamp']) <= tolerance for c in candidate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure segment-parallel speedup and result agreement')
+    parser.add_argument('--video', nargs='*', default=None, help='Clips to measure (defaults to every clip in uploads/)')
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--overlap-seconds', type=float, default=3.0)
+    parser.add_argument('--min-segment-seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    prepare_backend(args.weights)
+    detector = AdvancedHarassmentDetector(load_model(args.weights))
+    pools = {workers: ProcessWorkerPool(args.weights, workers=workers, backend=DEFAULT_BACKEND)
+             for workers in args.workers}
+
+    for video_path in args.video or sorted(glob.glob(DEFAULT_VIDEO_GLOB)):
+        start = time.perf_counter()
+        reference = detector.process_video(video_path)
+        sequential = time.perf_counter() - start
+        print(f"\n{os.path.basename(video_path)}: sequential {sequential:6.2f}s, {len(reference)} incidents")
+
+        for workers, pool in pools.items():
+            # Warm the workers' models up before timing
+            pool.process_video_segmented(video_path, overlap_seconds=args.overlap_seconds,
+                                         min_segment_seconds=args.min_segment_seconds)
+            start = time.perf_counter()
+            detections, stats = pool.process_video_segmented(video_path, overlap_seconds=args.overlap_seconds,
+                                                             min_segment_seconds=args.min_segment_seconds)
+            elapsed = time.perf_counter() - start
+            print(f"  {workers} workers ({stats['segments']} segments): {elapsed:6.2f}s "
+                  f"({sequential / elapsed:.2f}x), {len(detections)} incidents, "
+                  f"{agreement(reference, detections)}/{len(reference)} match sequential")
+
+    for pool in pools.values():
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
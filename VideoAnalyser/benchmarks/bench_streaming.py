@@ -0,0 +1,84 @@
+# bench_streaming.py - Buffered vs NDJSON-streamed /predict on clips of growing length
+#
+# Posts each synthetic clip to app2's /predict (Flask test client, fake
+# detector, thread serving mode) once as a normal JSON request and once with
+# ?stream=1, and reports the time until the first incident reaches the
+# client, the total time, and the peak Python heap growth (tracemalloc) of
+# the request. The result cache is disabled so both requests analyse.
+#
+# Usage (from VideoAnalyser/):
+#   python benchmarks/bench_streaming.py
+#   python benchmarks/bench_streaming.py --seconds 30 120 600 --people 12
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def post(client, video, stream):
+    """(seconds to the first incident, total seconds, incidents)"""
+    with open(video, 'rb') as f:
+        start = time.perf_counter()
+        response = client.post('/predict?stream=1' if stream else '/predict',
+                               data={'video': (f, os.path.basename(video))}, buffered=not stream)
+        if not stream:
+            total = time.perf_counter() - start
+            incidents = response.get_json()['total_incidents']
+            return (total if incidents else None), total, incidents
+        first = None
+        for line in response.response:
+            item = json.loads(line)
+            if item['type'] == 'incident' and first is None:
+                first = time.perf_counter() - start
+            elif item['type'] == 'summary':
+                incidents = item['total_incidents']
+            elif item['type'] == 'error':
+                raise RuntimeError(item['error'])
+        return first, time.perf_counter() - start, incidents
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to first incident and memory, buffered vs streamed')
+    parser.add_argument('--seconds', type=float, nargs='+', default=[15, 60, 240])
+    parser.add_argument('--resolution', default='640x360')
+    parser.add_argument('--people', type=int, default=8)
+    parser.add_argument('--video-dir', default=os.path.join(ROOT, 'cache', 'synthetic'))
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(SERVING_MODE='thread', RESULT_CACHE_DIR=os.path.join(tmp, 'results'), RESULT_CACHE_MAX_MB='0',
+                      DETECTION_CACHE_DIR=os.path.join(tmp, 'detections'))
+    import inference_backend
+    from synthetic import FakeDetector, make_video
+    inference_backend.register_backend('bench', lambda weights: FakeDetector())
+    inference_backend.DEFAULT_BACKEND = 'bench'
+    import app2
+
+    client = app2.app.test_client()
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    print(f"{args.resolution} clips, {args.people} people, fake detector")
+    print(f"{'video s':>8} {'mode':>9} {'incidents':>9} {'first s':>8} {'total s':>8} {'peak MB':>8}")
+    for seconds in args.seconds:
+        video = os.path.join(args.video_dir, f'synthetic_{width}x{height}_{seconds:g}s_{args.people}p.mp4')
+        make_video(video, width, height, seconds, 30, args.people)
+        for stream in (False, True):
+            first, total, incidents = post(client, video, stream)
+            tracemalloc.start()
+            post(client, video, stream)
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            first = f'{first:.2f}' if first is not None else '-'
+            print(f"{seconds:>8g} {'stream' if stream else 'buffered':>9} {incidents:>9} {first:>8} "
+                  f"{total:>8.2f} {peak:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# synthetic.py - Scripted test videos and a deterministic stand-in for YOLO
+#
+# People are solid, saturated rectangles walking over a flat grey background.
+# Every fourth person is shadowed by a partner who closes in half-way through
+# the clip, lingers and walks off again, so every pipeline has interactions
+# to score. FakeDetector finds the rectangles again by colour, which keeps it
+# deterministic and independent of how a pipeline resizes or crops frames.
+import os
+
+import cv2
+import numpy as np
+
+BACKGROUND = (96, 96, 96)
+
+
+def person_size(width, height):
+    """Box size of a person: narrow enough that an interacting pair doesn't touch"""
+    return max(6, int(width * 0.03)), max(12, int(height * 0.15))
+
+
+def script_positions(width, height, seconds, fps, people, seed=0):
+    """Top-left corner of every person on every frame, shape ``(frames, people, 2)``"""
+    rng = np.random.default_rng(seed)
+    frames = int(round(seconds * fps))
+    box_w, box_h = person_size(width, height)
+    span = np.array([width - box_w, height - box_h], dtype=np.float64)
+
+    start = rng.uniform(0, 1, (people, 2)) * span
+    velocity = rng.uniform(-1, 1, (people, 2)) * span / (seconds * 2)
+    t = np.arange(frames)[:, None, None] / fps
+    # Bounce off the edges: fold the straight-line path back into the frame
+    travel = (start[None] + velocity[None] * t) % (2 * span)
+    positions = np.where(travel > span, 2 * span - travel, travel)
+
+    # Partners: close in, stay side by side for the middle quarter of the
+    # clip, then separate
+    progress = np.arange(frames) / max(1, frames - 1)
+    closeness = np.clip((0.2 - np.abs(progress - 0.5)) / 0.075, 0, 1)[:, None]
+    for leader in range(0, people - 1, 4):
+        beside = positions[:, leader] + np.array([2 * box_w, 0])
+        positions[:, leader + 1] = (1 - closeness) * positions[:, leader + 1] + closeness * beside
+    return np.clip(positions, 0, span).astype(np.int32)
+
+
+def person_colours(people):
+    """Distinct saturated BGR colours, one per person"""
+    hues = (np.arange(people) * 37) % 180
+    hsv = np.stack([hues, np.full(people, 255), np.full(people, 230)], axis=1).astype(np.uint8)
+    return cv2.cvtColor(hsv[None], cv2.COLOR_HSV2BGR)[0].tolist()
+
+
+def make_video(path, width=1280, height=720, seconds=10, fps=30, people=8, seed=0):
+    """Write the scripted clip to ``path`` (mp4v) unless it already exists"""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    positions = script_positions(width, height, seconds, fps, people, seed)
+    box_w, box_h = person_size(width, height)
+    colours = person_colours(people)
+
+    tmp_path = path + '.part.mp4'
+    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"Cannot write {tmp_path}")
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    for frame_positions in positions:
+        frame[:] = BACKGROUND
+        for (x, y), colour in zip(frame_positions, colours):
+            cv2.rectangle(frame, (int(x), int(y)), (int(x) + box_w, int(y) + box_h), colour, -1)
+        writer.write(frame)
+    writer.release()
+    os.replace(tmp_path, path)
+    return path
+
+
+class _Array:
+    """Numpy array behind the ``.cpu().numpy()`` calls made on torch tensors"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeBoxes:
+    def __init__(self, data):
+        self.data = _Array(data)
+
+
+class FakeResult:
+    def __init__(self, data, orig_img):
+        self.boxes = FakeBoxes(data)
+        self.orig_img = orig_img
+
+
+class FakeDetector:
+    """Deterministic drop-in for an ultralytics model on synthetic clips.
+
+    Supports the ``model(frames)``, ``predict`` and ``track(persist=True)``
+    calls the pipelines make, for single frames or lists of them. Any
+    saturated blob of at least ``min_area`` pixels is a person with
+    confidence 0.9; ``track`` numbers blobs by greedy nearest-centre
+    matching against the previous frame.
+    """
+
+    def __init__(self, min_saturation=100, min_area=20, confidence=0.9):
+        self.min_saturation = min_saturation
+        self.min_area = min_area
+        self.confidence = confidence
+        self._tracks = {}
+        self._next_id = 1
+
+    def detect(self, frame):
+        """``(N, 6)`` float32 rows of ``x1, y1, x2, y2, confidence, class``"""
+        saturation = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)[:, :, 1]
+        mask = (saturation >= self.min_saturation).astype(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=4)
+        rows = [(x, y, x + w, y + h, self.confidence, 0)
+                for x, y, w, h, area in stats[1:count] if area >= self.min_area]
+        return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+    def _results(self, source, rows_for):
+        frames = source if isinstance(source, (list, tuple)) else [source]
+        return [FakeResult(rows_for(frame), frame) for frame in frames]
+
+    def predict(self, source, **kwargs):
+        return self._results(source, self.detect)
+
+    __call__ = predict
+
+    def track(self, source, persist=True, **kwargs):
+        if not persist:
+            self._tracks = {}
+        return self._results(source, self._track)
+
+    def _track(self, frame):
+        boxes = self.detect(frame)
+        centres = (boxes[:, :2] + boxes[:, 2:4]) / 2
+        ids = np.zeros(len(boxes), dtype=np.float32)
+        unmatched = dict(self._tracks)
+        for i in np.argsort(-((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))):
+            if unmatched:
+                track_id, previous = min(unmatched.items(), key=lambda item: np.hypot(*(item[1] - centres[i])))
+                if np.hypot(*(previous - centres[i])) < (boxes[i, 2] - boxes[i, 0]) * 2:
+                    ids[i] = track_id
+                    del unmatched[track_id]
+                    continue
+            ids[i] = self._next_id
+            self._next_id += 1
+        self._tracks = {int(track_id): centre for track_id, centre in zip(ids, centres)}
+        return np.column_stack((boxes[:, :4], ids, boxes[:, 4:])).astype(np.float32)
@@ -0,0 +1,146 @@
+# cpu_budget.py - One CPU core budget shared by torch, OpenCV, TensorFlow and the worker pools
+import contextlib
+import os
+import threading
+
+import cv2
+
+
+def available_cores():
+    """Cores this process may run on (respects taskset/cgroup CPU sets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        return os.cpu_count() or 1
+
+
+def budget_from_env():
+    """CPU_BUDGET cores (default: all available); 0 leaves every library at its own default"""
+    return int(os.environ.get('CPU_BUDGET', available_cores()))
+
+
+def set_library_threads(threads):
+    """Set OpenCV's intra-op thread count (process-wide) and torch's for the
+    calling thread and threads that haven't used torch yet"""
+    cv2.setNumThreads(threads)
+    set_torch_threads(threads)
+
+
+def set_torch_threads(threads):
+    """Set torch's intra-op thread count for the calling thread. With OpenMP
+    builds the setting is per thread, so a thread that has already run torch
+    keeps its count until it sets a new one itself."""
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
+
+
+def configure_tensorflow(threads):
+    """Cap TensorFlow's thread pools; only works before TensorFlow runs anything"""
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(min(2, threads))
+    except RuntimeError:
+        pass  # already initialised; keep its defaults
+
+
+def cpu_sets(workers, cores=None):
+    """Split the available cores into ``workers`` disjoint sets, for pinning
+    one worker process to each (sets repeat when there are more workers
+    than cores)"""
+    if cores is None:
+        try:
+            cores = sorted(os.sched_getaffinity(0))
+        except AttributeError:
+            cores = list(range(os.cpu_count() or 1))
+    if workers >= len(cores):
+        return [{cores[i % len(cores)]} for i in range(workers)]
+    size, extra = divmod(len(cores), workers)
+    sets, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(set(cores[start:end]))
+        start = end
+    return sets
+
+
+def pin_current_process(cpus):
+    """Restrict this process to ``cpus``; a no-op where affinity isn't supported"""
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (AttributeError, OSError):
+        pass
+
+
+class CpuBudget:
+    """Divides ``cores`` between the jobs running in this process.
+
+    Every analysis runs inside ``with budget.job(streams=n):``, where
+    ``streams`` is how many of its threads call into torch/OpenCV at the
+    same time (the inference workers of app.py's pipeline, say). Each time
+    a job starts or ends the per-stream share is recomputed as
+    ``cores // total streams`` (at least 1). OpenCV's setting is
+    process-wide, but torch's only reaches the thread that sets it, so every
+    thread that runs inference calls ``apply_to_thread()`` before each
+    call; running jobs move to a new share at their next inference call
+    (one already running finishes on the old share) and the process as a
+    whole stays within ``cores`` threads instead of every job using every
+    core. ``cores=0`` disables the budget and leaves
+    the libraries' defaults alone.
+    """
+
+    def __init__(self, cores=None):
+        self.cores = budget_from_env() if cores is None else cores
+        self.jobs = 0
+        self.streams = 0
+        self.threads = None
+        self._lock = threading.Lock()
+        if self.cores:
+            self._apply_locked()
+
+    @property
+    def enabled(self):
+        return self.cores > 0
+
+    def _apply_locked(self):
+        threads = max(1, self.cores // max(1, self.streams))
+        if threads != self.threads:
+            set_library_threads(threads)
+            self.threads = threads
+
+    def apply_to_thread(self):
+        """Give the calling thread the current per-stream torch share"""
+        threads = self.threads
+        if threads is not None:
+            set_torch_threads(threads)
+
+    @contextlib.contextmanager
+    def job(self, streams=1):
+        """Hold a share of the budget for the duration of one analysis"""
+        if not self.enabled:
+            yield None
+            return
+        with self._lock:
+            self.jobs += 1
+            self.streams += streams
+            self._apply_locked()
+        try:
+            yield self.threads
+        finally:
+            with self._lock:
+                self.jobs -= 1
+                self.streams -= streams
+                self._apply_locked()
+
+    def worker_threads(self, workers):
+        """Threads for each of ``workers`` single-job worker processes"""
+        return max(1, self.cores // max(1, workers)) if self.enabled else None
+
+    def stats(self):
+        with self._lock:
+            return {'cores': self.cores, 'jobs': self.jobs, 'streams': self.streams,
+                    'threads_per_stream': self.threads}
@@ -0,0 +1,101 @@
+# detection_cache.py - Per-frame person tracks persisted for re-scoring without YOLO
+import json
+import os
+import threading
+
+import numpy as np
+
+from result_cache import ResultCache
+
+
+class DetectionTrace:
+    """The tracked people of every analysed frame of one video, column-wise.
+
+    ``tracks`` is an ``(N, 7)`` float32 array of ``x1, y1, x2, y2, track_id,
+    confidence, class`` rows for all frames back to back, ``frame_numbers``
+    the analysed frames in order and ``offsets`` where each frame's rows
+    start (``offsets[i]:offsets[i + 1]``). Boxes are in the coordinates the
+    detector saw; ``meta`` holds the fps and the original and analysed frame
+    sizes. Built up with ``add`` during analysis and saved as one ``.npz``.
+    """
+
+    def __init__(self, meta=None, frame_numbers=None, offsets=None, tracks=None):
+        self.meta = dict(meta or {})
+        if tracks is None:
+            self._frames = []
+            self._chunks = []
+            self.frame_numbers = self.offsets = self.tracks = None
+        else:
+            self.frame_numbers = frame_numbers
+            self.offsets = offsets
+            self.tracks = tracks
+
+    def add(self, frame_number, tracks):
+        self._frames.append(frame_number)
+        self._chunks.append(np.asarray(tracks, dtype=np.float32).reshape(-1, 7))
+
+    def _pack(self):
+        if self.tracks is None:
+            self.frame_numbers = np.asarray(self._frames, dtype=np.int64)
+            self.offsets = np.zeros(len(self._chunks) + 1, dtype=np.int64)
+            np.cumsum([len(chunk) for chunk in self._chunks], out=self.offsets[1:])
+            self.tracks = np.concatenate(self._chunks) if self._chunks else np.empty((0, 7), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._frames) if self.tracks is None else len(self.frame_numbers)
+
+    def frames(self):
+        """``(frame_number, tracks)`` of every analysed frame, in order"""
+        self._pack()
+        for i, frame_number in enumerate(self.frame_numbers.tolist()):
+            yield frame_number, self.tracks[self.offsets[i]:self.offsets[i + 1]]
+
+    def save(self, path):
+        """Write atomically, so readers never see a half-written trace"""
+        self._pack()
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, frame_numbers=self.frame_numbers, offsets=self.offsets,
+                                tracks=self.tracks, meta=np.array(json.dumps(self.meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(json.loads(str(data['meta'])), data['frame_numbers'], data['offsets'], data['tracks'])
+
+
+class DetectionStore(ResultCache):
+    """``DetectionTrace`` files keyed like ``ResultCache`` entries, but by
+    the parameters that change detection and tracking only, so any set of
+    scoring parameters can be replayed from them. Least recently used traces
+    are deleted past ``max_bytes``.
+    """
+
+    EXTENSION = '.npz'
+
+    def path(self, key):
+        """Where the analysis should save the trace for ``key``"""
+        return self._path(key)
+
+    def get(self, key):
+        path = self._path(key)
+        with self.lock:
+            try:
+                trace = DetectionTrace.load(path)
+            except (OSError, ValueError, KeyError):
+                return None
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        return trace
+
+    def put(self, key, trace):
+        trace.save(self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Enforce ``max_bytes`` after traces were saved straight to ``path(key)``"""
+        with self.lock:
+            self._evict_locked()
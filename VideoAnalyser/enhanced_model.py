@@ -1,67 +1,85 @@
 # enhanced_model.py - Advanced detection with tracking
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from collections import defaultdict, deque
+import os
 import time
+from frame_source import FrameSource, EveryNth, AdaptiveRate
+from proximity import find_close_pairs
+from inference_backend import load_model
 
 class HarassmentDetector:
     def __init__(self):
-        self.model = YOLO("yolov8n.pt")
+        self.model = load_model("yolov8n.pt")
         self.tracker = defaultdict(lambda: deque(maxlen=10))  # Track last 10 positions
         self.harassment_threshold = 80
         self.min_harassment_frames = 5
+        self.frame_skip = 2  # Process every 2nd frame (fixed-rate mode)
+        # ADAPTIVE_SAMPLING=1, configured like app.py, replaces frame_skip:
+        # the rate rises with the proximity score
+        self.adaptive_sampling = os.environ.get('ADAPTIVE_SAMPLING', '0') != '0'
+        self.min_fps = float(os.environ.get('SAMPLING_MIN_FPS', 2))
+        self.max_fps = float(os.environ.get('SAMPLING_MAX_FPS', 0)) or None  # 0 = video frame rate
         
-    def detect_harassment_realtime(self, video_path):
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
+    def new_sampling_policy(self):
+        if self.adaptive_sampling:
+            return AdaptiveRate(self.min_fps, self.max_fps)
+        return EveryNth(self.frame_skip)
+        
+    def detect_harassment_realtime(self, video_path, return_segments=False):
+        """Detections of one video; with ``return_segments`` also the
+        effective sampling rate per segment (empty with fixed-rate sampling)"""
+        # Sample sparsely until people get close, then up to full rate (or
+        # every 2nd frame); the frames in between are only grabbed, never
+        # converted to BGR arrays
+        policy = self.new_sampling_policy()
+        adaptive = isinstance(policy, AdaptiveRate)
+        source = FrameSource(video_path, policy)
+        fps = source.fps
         detections = []
-        frame_count = 0
         harassment_buffer = deque(maxlen=30)  # Buffer for smoothing
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
+        for frame_count, frame in source:
             timestamp = frame_count / fps
             
-            # Process every 2nd frame for better speed/accuracy balance
-            if frame_count % 2 == 0:
-                # Resize for faster processing
-                h, w = frame.shape[:2]
-                scale = min(640/w, 480/h)
-                new_w, new_h = int(w*scale), int(h*scale)
-                frame_resized = cv2.resize(frame, (new_w, new_h))
+            # Resize for faster processing
+            h, w = frame.shape[:2]
+            scale = min(640/w, 480/h)
+            new_w, new_h = int(w*scale), int(h*scale)
+            frame_resized = cv2.resize(frame, (new_w, new_h))
+            
+            # YOLO detection
+            results = self.model.track(frame_resized, persist=True, verbose=False)
+            
+            if results[0].boxes is not None:
+                boxes = results[0].boxes.data.cpu().numpy()
+                person_boxes = boxes[boxes[:, 5] == 0]  # Class 0 = person
                 
-                # YOLO detection
-                results = self.model.track(frame_resized, persist=True, verbose=False)
+                harassment_score = self.analyze_interactions(person_boxes, timestamp)
+                harassment_buffer.append(harassment_score)
+                if adaptive:
+                    policy.update(harassment_score)
                 
-                if results[0].boxes is not None:
-                    boxes = results[0].boxes.data.cpu().numpy()
-                    person_boxes = boxes[boxes[:, 5] == 0]  # Class 0 = person
-                    
-                    harassment_score = self.analyze_interactions(person_boxes, timestamp)
-                    harassment_buffer.append(harassment_score)
-                    
-                    # Smooth detection using buffer average
-                    avg_score = np.mean(harassment_buffer)
-                    
-                    if avg_score > 0.6 and len(person_boxes) >= 2:  # Threshold for harassment
-                        detection_info = {
-                            'timestamp': timestamp,
-                            'frame_number': frame_count,
-                            'harassment_score': float(avg_score),
-                            'boxes': self.format_boxes(person_boxes, scale),
-                            'video_width': w,
-                            'video_height': h
-                        }
-                        detections.append(detection_info)
-            
-            frame_count += 1
+                # Smooth detection using buffer average
+                avg_score = np.mean(harassment_buffer)
+                
+                if avg_score > 0.6 and len(person_boxes) >= 2:  # Threshold for harassment
+                    detection_info = {
+                        'timestamp': timestamp,
+                        'frame_number': frame_count,
+                        'harassment_score': float(avg_score),
+                        'boxes': self.format_boxes(person_boxes, scale),
+                        'video_width': w,
+                        'video_height': h
+                    }
+                    detections.append(detection_info)
+            elif adaptive:
+                policy.update(0.0)
             
-        cap.release()
-        return self.post_process_detections(detections)
+        detections = self.post_process_detections(detections)
+        if return_segments:
+            return detections, policy.segment_rates() if adaptive else []
+        return detections
     
     def analyze_interactions(self, person_boxes, timestamp):
         if len(person_boxes) < 2:
@@ -75,15 +93,11 @@ class HarassmentDetector:
             cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
             centers.append((cx, cy))
         
-        # Analyze all pairs of people
-        for i in range(len(centers)):
-            for j in range(i + 1, len(centers)):
-                dist = np.linalg.norm(np.array(centers[i]) - np.array(centers[j]))
-                
-                # Score based on proximity and movement patterns
-                if dist < self.harassment_threshold:
-                    proximity_score = 1.0 - (dist / self.harassment_threshold)
-                    harassment_score = max(harassment_score, proximity_score)
+        # Analyze all pairs of people; the closest pair within the threshold
+        # gives the highest proximity score
+        _, _, distances = find_close_pairs(centers, self.harassment_threshold)
+        if len(distances) > 0:
+            harassment_score = 1.0 - (distances.min() / self.harassment_threshold)
         
         return harassment_score
     
@@ -0,0 +1,127 @@
+# evidence.py - Annotated evidence video written during the analysis pass
+import queue
+import threading
+import time
+
+import cv2
+
+BOX_COLOUR = (0, 0, 255)
+LABEL_COLOUR = (255, 255, 255)
+
+
+def annotate_frame(frame, detections):
+    """Copy of ``frame`` with every flagged person's box, track ID and pair score drawn on it"""
+    annotated = frame.copy()
+    thickness = max(2, frame.shape[1] // 640)
+    font_scale = max(0.5, frame.shape[1] / 1600)
+    for detection in detections:
+        score = detection['harassment_score']
+        for person in detection['persons']:
+            x1, y1, x2, y2 = (int(v) for v in person['bbox'])
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), BOX_COLOUR, thickness)
+            label = f"ID {person['track_id']}  {score:.2f}"
+            (text_w, text_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+            top = max(0, y1 - text_h - baseline - 4)
+            cv2.rectangle(annotated, (x1, top), (x1 + text_w + 4, top + text_h + baseline + 4), BOX_COLOUR, -1)
+            cv2.putText(annotated, label, (x1 + 2, top + text_h + 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        font_scale, LABEL_COLOUR, 1, cv2.LINE_AA)
+    return annotated
+
+
+class EvidenceWriter:
+    """Video writer that encodes on a background thread.
+
+    ``write(frame)`` only queues the frame, so the analysis loop carries on
+    while the previous frames are encoded. The queue holds at most
+    ``max_queue`` frames; when the encoder falls that far behind ``write``
+    blocks instead of buffering the whole video in memory. Queued frames are
+    encoded as they are, so callers must not modify a frame after writing it.
+    With a ``pool`` (a ``frame_pool.FramePool``) the writer takes over pooled
+    frames and releases them once they are encoded (or, for annotated
+    frames, as soon as the annotated copy is made).
+
+    With a ``timer`` (a ``metrics.StageTimer``) drawing is recorded as the
+    ``annotate`` stage, encoding as ``encode`` and time spent blocked on a
+    full queue as ``encode_wait``.
+    """
+
+    def __init__(self, path, fps, size, codec='mp4v', max_queue=32, timer=None, pool=None):
+        self.path = path
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps or 30.0, size)
+        if not self.writer.isOpened():
+            raise IOError(f"Cannot write evidence video {path}")
+        self.timer = timer if timer is not None and timer.enabled else None
+        self.pool = pool
+        self.frames_written = 0
+        self.frames_annotated = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._thread = threading.Thread(target=self._encode, name='evidence-encoder', daemon=True)
+        self._thread.start()
+
+    def _encode(self):
+        timer = self.timer
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            if self.error is None:
+                try:
+                    start = time.perf_counter()
+                    self.writer.write(frame)
+                    if timer:
+                        timer.observe('encode', time.perf_counter() - start)
+                except Exception as e:
+                    self.error = e
+            # After an error keep draining so write() never blocks forever
+            if self.pool is not None:
+                self.pool.release(frame)
+
+    def write(self, frame, detections=None):
+        """Queue a frame, annotated with ``detections`` when there are any"""
+        if self.error is not None:
+            raise IOError(f"Encoding {self.path} failed: {self.error}")
+        if detections:
+            original = frame
+            if self.timer:
+                with self.timer.stage('annotate'):
+                    frame = annotate_frame(original, detections)
+            else:
+                frame = annotate_frame(original, detections)
+            if self.pool is not None:
+                self.pool.release(original)
+            self.frames_annotated += 1
+        if self.timer and self._queue.full():
+            start = time.perf_counter()
+            self._queue.put(frame)
+            self.timer.observe('encode_wait', time.perf_counter() - start)
+        else:
+            self._queue.put(frame)
+        self.frames_written += 1
+
+    def passthrough(self, frame_number, frame):
+        """``FrameSource`` callback for the frames the sampling policy skipped"""
+        self.write(frame)
+
+    def close(self):
+        """Wait for the queued frames to be encoded and finish the file"""
+        self._queue.put(None)
+        self._thread.join()
+        self.writer.release()
+        if self.timer:
+            self.timer.count('frames_encoded', self.frames_written)
+            self.timer.count('frames_annotated', self.frames_annotated)
+        if self.error is not None:
+            raise IOError(f"Encoding {self.path} failed: {self.error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.close()
+        except IOError:
+            # Don't hide the error that stopped the analysis
+            if exc_type is None:
+                raise
+        return False
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import cv2
 import numpy as np
@@ -17,8 +17,16 @@ import tensorflow as tf
 from tensorflow.keras.models import Model
 from tensorflow.keras.layers import Input, Conv2D, MaxPooling2D, Flatten, Dense, Dropout
 from tensorflow.keras.layers import BatchNormalization, Activation
+from cpu_budget import budget_from_env, configure_tensorflow
+from admission import QueueFull, controller_from_env, estimate_cost
+from metrics import REGISTRY, WAIT_BUCKETS
+from quantization import calibration_videos, quantize_mesonet, sample_frames
 import urllib.request
 import pickle
+import threading
+import uuid
+from frame_source import FrameSource, EveryNth
+from result_cache import ResultCache, save_upload_hashed
 
 app = Flask(__name__)
 CORS(app)
@@ -27,6 +35,20 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keep TensorFlow and OpenCV within CPU_BUDGET cores (default: all); requests
+# share TensorFlow's single intra-op pool, so it is sized once here
+CPU_BUDGET = budget_from_env()
+if CPU_BUDGET:
+    configure_tensorflow(CPU_BUDGET)
+    cv2.setNumThreads(CPU_BUDGET)
+
+# MESONET_PRECISION=int8 runs MesoNet as a full-integer TFLite model,
+# calibrated on face crops from QUANT_CALIBRATION_VIDEOS at startup
+MESONET_PRECISION = os.environ.get('MESONET_PRECISION', 'float32')
+
+# Frames sampled from each uploaded video
+ANALYSIS_MAX_FRAMES = 30
+
 class MesoNet:
     """
     MesoNet implementation for deepfake detection
@@ -34,7 +56,12 @@ class MesoNet:
     """
     def __init__(self):
         self.model = None
+        self.model_type = 'meso4'
         self.input_size = 256
+        self.interpreter = None
+        self.interpreter_lock = threading.Lock()
+        # Which weights predictions come from, for result cache keys
+        self.weights_id = None
         
     def build_meso4(self):
         """Build MesoNet-4 architecture"""
@@ -119,9 +146,11 @@ class MesoNet:
     
     def load_model(self, model_path=None, model_type='meso4'):
         """Load pre-trained model or create new one"""
+        self.model_type = model_type
         try:
             if model_path and os.path.exists(model_path):
                 self.model = tf.keras.models.load_model(model_path)
+                self.weights_id = self.file_identity(model_path)
                 logger.info(f"Loaded pre-trained model from {model_path}")
             else:
                 # Build model architecture
@@ -129,6 +158,7 @@ class MesoNet:
                     self.model = self.build_meso4()
                 else:
                     self.model = self.build_mesoInception4()
+                self.weights_id = self.random_identity()
                 
                 # Try to download pre-trained weights
                 self.download_pretrained_weights(model_type)
@@ -138,6 +168,17 @@ class MesoNet:
             logger.error(f"Error loading model: {e}")
             # Fallback to basic architecture
             self.model = self.build_meso4()
+            self.weights_id = self.random_identity()
+    
+    @staticmethod
+    def file_identity(path):
+        return f"{path}@{os.path.getmtime(path):.0f}"
+    
+    @staticmethod
+    def random_identity():
+        # Random initialisation differs on every start, so its results are
+        # only reusable within this process
+        return f"random-{uuid.uuid4().hex}"
     
     def download_pretrained_weights(self, model_type):
         """Download pre-trained weights if available"""
@@ -160,11 +201,40 @@ class MesoNet:
                 logger.info("Pre-trained weights not available, using random initialization")
             else:
                 self.model.load_weights(weights_path)
+                self.weights_id = self.file_identity(weights_path)
                 logger.info(f"Loaded weights from {weights_path}")
                 
         except Exception as e:
             logger.warning(f"Could not download pre-trained weights: {e}")
     
+    def quantize(self, calibration_images):
+        """Switch to an INT8 TFLite copy of the loaded model.
+
+        With trained weights on disk the converted model is kept next to
+        them and reused while it is newer; randomly initialised weights
+        differ every start, so they are converted every time.
+        """
+        weights_path = f"models/{self.model_type}_weights.h5"
+        int8_path = f"models/{self.model_type}_int8.tflite"
+        if os.path.exists(weights_path) and os.path.exists(int8_path) and \
+                os.path.getmtime(int8_path) >= os.path.getmtime(weights_path):
+            with open(int8_path, 'rb') as f:
+                flatbuffer = f.read()
+        else:
+            logger.info(f"Quantising MesoNet to INT8 on {len(calibration_images)} calibration images...")
+            flatbuffer = quantize_mesonet(self.model, calibration_images,
+                                          int8_path if os.path.exists(weights_path) else None, self.input_size)
+        interpreter = tf.lite.Interpreter(model_content=flatbuffer, num_threads=CPU_BUDGET or None)
+        interpreter.allocate_tensors()
+        self.input_index = interpreter.get_input_details()[0]['index']
+        self.output_index = interpreter.get_output_details()[0]['index']
+        self.interpreter = interpreter
+    
+    @property
+    def precision(self):
+        """The precision predictions actually run at; int8 falls back to float32 if quantising failed"""
+        return 'int8' if self.interpreter is not None else 'float32'
+    
     def preprocess_image(self, image):
         """Preprocess image for MesoNet"""
         # Resize to model input size
@@ -185,7 +255,14 @@ class MesoNet:
         
         try:
             processed_image = self.preprocess_image(image)
-            prediction = self.model.predict(processed_image, verbose=0)[0][0]
+            if self.interpreter is not None:
+                # One interpreter shared by all requests; it isn't thread-safe
+                with self.interpreter_lock:
+                    self.interpreter.set_tensor(self.input_index, processed_image)
+                    self.interpreter.invoke()
+                    prediction = self.interpreter.get_tensor(self.output_index)[0][0]
+            else:
+                prediction = self.model.predict(processed_image, verbose=0)[0][0]
             
             confidence = abs(prediction - 0.5) * 2  # Convert to confidence score
             is_fake = prediction > 0.5
@@ -207,6 +284,11 @@ class AdvancedDeepfakeDetector:
             # Initialize MesoNet
             self.mesonet = MesoNet()
             self.mesonet.load_model(model_type='meso4')
+            if MESONET_PRECISION == 'int8':
+                try:
+                    self.mesonet.quantize(self.calibration_faces())
+                except Exception as e:
+                    logger.warning(f"INT8 MesoNet unavailable, using float32: {e}")
             
             # Try to load MTCNN for better face detection
             self.mtcnn_available = False
@@ -222,35 +304,38 @@ class AdvancedDeepfakeDetector:
         except Exception as e:
             logger.error(f"Error initializing detector: {e}")
     
+    def calibration_faces(self):
+        """The largest face of each sampled calibration frame, or the whole
+        frame where none is found, as MesoNet would see them"""
+        images = []
+        for frame in sample_frames(calibration_videos()):
+            faces = self.detect_faces_opencv(frame)
+            images.append(max(faces, key=lambda x: x['area'])['face_image'] if faces else frame)
+        return images
+    
     def extract_frames(self, video_path, max_frames=40):
         """Extract frames from video for analysis"""
-        cap = cv2.VideoCapture(video_path)
+        source = FrameSource(video_path)
         frames = []
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = source.total_frames
+        fps = source.fps
         duration = frame_count / fps if fps > 0 else 0
         
         if frame_count == 0:
-            cap.release()
+            source.release()
             return [], 0, 0, 0
         
-        # Calculate frame interval to get evenly distributed frames
+        # Calculate frame interval to get evenly distributed frames; frames
+        # between samples are only grabbed, never converted to BGR arrays
         interval = max(1, frame_count // max_frames)
+        source.set_policy(EveryNth(interval))
         
-        frame_idx = 0
-        extracted_count = 0
-        while cap.isOpened() and extracted_count < max_frames:
-            ret, frame = cap.read()
-            if not ret:
+        for frame_idx, frame in source:
+            frames.append((frame_idx, frame))
+            if len(frames) >= max_frames:
                 break
-                
-            if frame_idx % interval == 0:
-                frames.append((frame_idx, frame))
-                extracted_count += 1
-                
-            frame_idx += 1
             
-        cap.release()
+        source.release()
         return frames, fps, frame_count, duration
     
     def detect_faces_opencv(self, frame):
@@ -670,7 +755,7 @@ class AdvancedDeepfakeDetector:
         
         try:
             # Extract frames
-            frames, fps, total_frames, duration = self.extract_frames(video_path, max_frames=30)
+            frames, fps, total_frames, duration = self.extract_frames(video_path, max_frames=ANALYSIS_MAX_FRAMES)
             
             if not frames:
                 return {'error': 'Could not extract frames from video'}
@@ -798,6 +883,20 @@ class AdvancedDeepfakeDetector:
 # Initialize detector
 detector = AdvancedDeepfakeDetector()
 
+# Cached results for re-submitted videos, keyed by content hash
+result_cache = ResultCache(
+    os.environ.get('RESULT_CACHE_DIR', os.path.join('cache', 'results')),
+    max_bytes=int(os.environ.get('RESULT_CACHE_MAX_MB', 512)) * 1024 * 1024
+)
+
+# TensorFlow's thread pools are shared by all requests, so by default one
+# video is analysed at a time and MAX_QUEUED_ANALYSES more wait (cheapest
+# first); the rest are turned away with 429
+REGISTRY.register_histogram('queue_wait_seconds', WAIT_BUCKETS, 'Seconds analyses waited for a slot')
+admission = controller_from_env(on_wait=lambda seconds: REGISTRY.observe('queue_wait_seconds', seconds))
+REGISTRY.register_gauge('admission', admission.stats,
+                        'Analysis admission: running and queued jobs, limits, rejections, estimated wait')
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_video():
     """API endpoint for video analysis with enhanced MesoNet integration"""
@@ -810,16 +909,34 @@ def analyze_video():
         if video_file.filename == '':
             return jsonify({'error': 'No video file selected'}), 400
         
-        # Save uploaded file temporarily
+        # Save uploaded file temporarily, hashing it on the way
         with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
-            video_file.save(temp_file.name)
             temp_path = temp_file.name
+        content_hash = save_upload_hashed(video_file, temp_path)
+        cache_key = ResultCache.make_key(content_hash, 'MesoNet-4', {'max_frames': ANALYSIS_MAX_FRAMES, 'version': '3.0.0',
+                                                                     'mesonet_precision': detector.mesonet.precision,
+                                                                     'mesonet_weights': detector.mesonet.weights_id})
         
         try:
-            logger.info(f"Analyzing video: {video_file.filename}")
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Returning cached analysis for: {video_file.filename}")
+                cached['cached'] = True
+                return jsonify(cached)
             
-            # Analyze video
-            results = detector.analyze_video(temp_path)
+            try:
+                ticket = admission.admit(estimate_cost(temp_path, 'mesonet', max_frames=ANALYSIS_MAX_FRAMES))
+            except QueueFull as e:
+                response = jsonify({'error': 'Too many videos queued for analysis; try again later',
+                                    'estimated_wait_seconds': round(e.estimated_wait, 1)})
+                response.headers['Retry-After'] = str(max(1, math.ceil(e.estimated_wait)))
+                return response, 429
+            
+            with ticket:
+                logger.info(f"Analyzing video: {video_file.filename}")
+                
+                # Analyze video
+                results = detector.analyze_video(temp_path)
             
             if 'error' in results:
                 return jsonify(results), 500
@@ -895,6 +1012,8 @@ def analyze_video():
             }
             
             logger.info(f"Analysis complete. Deepfake: {response['isDeepfake']}, Confidence: {response['confidence']:.1f}%")
+            result_cache.put(cache_key, response)
+            response['cached'] = False
             return jsonify(response)
             
         finally:
@@ -915,9 +1034,15 @@ def health_check():
         'version': '3.0.0',
         'mtcnn_available': detector.mtcnn_available,
         'mesonet_loaded': detector.mesonet.model is not None,
+        'mesonet_precision': detector.mesonet.precision,
+        'admission': admission.stats(),
         'tensorflow_version': tf.__version__
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/info', methods=['GET'])
 def get_info():
     """Get system information"""
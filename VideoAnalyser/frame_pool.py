@@ -0,0 +1,70 @@
+# frame_pool.py - Reusable frame buffers for the decode and resize steps
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """Preallocated ``uint8`` image buffers, handed out by shape and reused.
+
+    Decoders ``cap.retrieve()`` into an ``acquire``d buffer and resizes write
+    into one with ``cv2.resize(..., dst=...)``; whoever consumes the frame
+    last ``release``s it. A pool normally settles at as many buffers per
+    shape as there are frames in flight, after which a video decodes without
+    allocating. It never owns more than ``max_buffers`` buffers: once all of
+    them are in use, ``acquire`` returns a plain array that ``release``
+    ignores, so a consumer that forgets to release only costs the reuse.
+    Arrays the pool did not hand out are ignored by ``release`` too.
+
+    Safe to share between the threads of one pipeline.
+    """
+
+    def __init__(self, max_buffers=64):
+        self.max_buffers = max_buffers
+        self._free = {}
+        # id -> buffer of every buffer the pool owns; the reference keeps the
+        # id from being reused by another array
+        self._owned = {}
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+        self.unpooled = 0
+
+    def acquire(self, shape):
+        """A buffer of ``shape``; its contents are whatever was last written to it"""
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                self.reuses += 1
+                return free.pop()
+            # np.empty doesn't touch the memory, so this is cheap under the lock
+            buffer = np.empty(shape, dtype=np.uint8)
+            if len(self._owned) < self.max_buffers:
+                self._owned[id(buffer)] = buffer
+                self.allocations += 1
+            else:
+                self.unpooled += 1
+            return buffer
+
+    def release(self, buffer):
+        """Return a buffer for reuse; callers must not touch it afterwards"""
+        if buffer is None:
+            return
+        with self._lock:
+            if self._owned.get(id(buffer)) is not buffer:
+                return
+            free = self._free.setdefault(buffer.shape, [])
+            # A double release must not hand the same buffer out twice
+            if not any(b is buffer for b in free):
+                free.append(buffer)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffers': len(self._owned),
+                'buffer_mb': round(sum(b.nbytes for b in self._owned.values()) / (1024 * 1024), 1),
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'unpooled': self.unpooled
+            }
@@ -0,0 +1,267 @@
+# frame_source.py - Decode-skipping frame sampler shared by the video pipelines
+import bisect
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class EveryNth:
+    """Sample every n-th frame (the old ``frame_number % FRAME_SKIP == 0``)"""
+
+    def __init__(self, n):
+        self.n = max(1, int(n))
+
+    def setup(self, fps, total_frames):
+        pass
+
+    def should_sample(self, frame_number):
+        return frame_number % self.n == 0
+
+
+class TargetFps:
+    """Sample frames so that roughly ``fps`` frames per second of video are kept"""
+
+    def __init__(self, fps):
+        self.target_fps = float(fps)
+        self.video_fps = None
+        self.next_time = 0.0
+
+    def setup(self, fps, total_frames):
+        self.video_fps = fps if fps and fps > 0 else 30.0
+        self.next_time = 0.0
+
+    def should_sample(self, frame_number):
+        timestamp = frame_number / self.video_fps
+        if timestamp + 1e-9 < self.next_time:
+            return False
+        self.next_time += 1.0 / self.target_fps
+        # Don't try to catch up if the target is above the video frame rate
+        self.next_time = max(self.next_time, timestamp)
+        return True
+
+
+class FixedCount:
+    """Sample ``count`` frames spread evenly over the whole video"""
+
+    def __init__(self, count):
+        self.count = max(1, int(count))
+        self.indices = []
+
+    def setup(self, fps, total_frames):
+        if total_frames <= 0:
+            self.indices = list(range(self.count))
+        else:
+            positions = np.linspace(0, total_frames - 1, min(self.count, total_frames))
+            self.indices = sorted(set(int(round(p)) for p in positions))
+        self._index_set = set(self.indices)
+
+    def should_sample(self, frame_number):
+        return frame_number in self._index_set
+
+    def next_sample(self, frame_number):
+        """First sampled frame at or after ``frame_number``, or None when done"""
+        i = bisect.bisect_left(self.indices, frame_number)
+        return self.indices[i] if i < len(self.indices) else None
+
+
+class AdaptiveRate:
+    """Sample sparsely in quiet scenes and up to full rate when activity rises.
+
+    The caller feeds back how busy the last sampled frame was with
+    ``update(activity)`` (0 = nobody interacting, 1 = likely incident). The
+    gap between samples jumps straight to the one for that activity when it
+    needs to shrink and relaxes by one frame per sample when it can grow, so a
+    brief lull doesn't drop the rate in the middle of an incident.
+    ``max_fps=None`` means the video's own frame rate.
+
+    ``update`` may be called from another thread than the one iterating
+    the source (app.py scores on its own thread); the lock keeps the gap
+    and the next sample position consistent.
+    """
+
+    def __init__(self, min_fps=2.0, max_fps=None, segment_seconds=5.0):
+        self.min_fps = float(min_fps)
+        self.max_fps = max_fps
+        self.segment_seconds = segment_seconds
+        self.lock = threading.Lock()
+
+    def setup(self, fps, total_frames):
+        self.video_fps = fps if fps and fps > 0 else 30.0
+        self.total_frames = total_frames
+        max_fps = min(self.max_fps or self.video_fps, self.video_fps)
+        self.min_interval = max(1, int(round(self.video_fps / max_fps)))
+        self.max_interval = max(self.min_interval, int(round(self.video_fps / self.min_fps)))
+        self.interval = self.max_interval
+        self.last_sample = None
+        self.next_frame = 0
+        self.segment_frames = max(1, int(round(self.segment_seconds * self.video_fps)))
+        self.segment_samples = {}
+
+    def should_sample(self, frame_number):
+        with self.lock:
+            if frame_number < self.next_frame:
+                return False
+            self.last_sample = frame_number
+            self.next_frame = frame_number + self.interval
+            segment = frame_number // self.segment_frames
+            self.segment_samples[segment] = self.segment_samples.get(segment, 0) + 1
+            return True
+
+    def update(self, activity):
+        """Adjust the sampling gap after scoring the last sampled frame"""
+        activity = min(1.0, max(0.0, float(activity)))
+        target = int(round(self.max_interval - activity * (self.max_interval - self.min_interval)))
+        with self.lock:
+            if target < self.interval:
+                self.interval = target
+            else:
+                self.interval = min(target, self.interval + 1)
+            if self.last_sample is not None:
+                self.next_frame = self.last_sample + self.interval
+
+    def segment_rates(self):
+        """Effective sampling rate of each ``segment_seconds`` stretch of video"""
+        with self.lock:
+            segment_samples = dict(self.segment_samples)
+        if not segment_samples:
+            return []
+        last_segment = max(segment_samples)
+        end_frame = self.total_frames if self.total_frames > 0 else (self.last_sample or 0) + 1
+        rates = []
+        for segment in range(last_segment + 1):
+            start = segment * self.segment_frames
+            end = min(start + self.segment_frames, max(end_frame, start + 1))
+            samples = segment_samples.get(segment, 0)
+            rates.append({
+                'start_time': round(start / self.video_fps, 2),
+                'end_time': round(end / self.video_fps, 2),
+                'frames_sampled': samples,
+                'effective_fps': round(samples * self.video_fps / (end - start), 2)
+            })
+        return rates
+
+
+class FrameSource:
+    """Iterate over the sampled frames of a video without decoding the rest.
+
+    Skipped frames are only advanced with ``cap.grab()``, which demuxes and
+    decodes them but skips the BGR conversion and the copy into a numpy array.
+    Only sampled frames are ``retrieve()``d. When ``seek_min_gap`` is set and
+    the next sampled frame is further away than that, the source seeks instead
+    (OpenCV seeks to the preceding keyframe and decodes forward from there).
+
+    ``start_frame``/``end_frame`` restrict iteration to one stretch of the
+    video (the source seeks to ``start_frame`` first); frame numbers stay
+    relative to the start of the whole video.
+
+    With a ``timer`` (a ``metrics.StageTimer``) the grab/retrieve time up to
+    each sampled frame is recorded as its ``decode`` stage.
+
+    ``on_skipped(frame_number, frame)``, when given, receives every frame the
+    policy skips, in order, before the next sampled frame is yielded (used to
+    write every frame of an annotated copy of the video). Those frames then
+    have to be retrieved too, and the source never seeks or stops early.
+
+    With a ``pool`` (a ``frame_pool.FramePool``) frames are decoded into its
+    buffers instead of fresh arrays; the consumer releases each yielded (or
+    ``on_skipped``) frame back to the pool once it is done with it.
+
+    Yields ``(frame_number, frame)`` tuples.
+    """
+
+    def __init__(self, video_path, policy=None, seek_min_gap=None, start_frame=0, end_frame=None, timer=None,
+                 on_skipped=None, pool=None):
+        self.cap = cv2.VideoCapture(video_path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.set_policy(policy or EveryNth(1))
+        self.seek_min_gap = seek_min_gap
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.timer = timer if timer is not None and timer.enabled else None
+        self.on_skipped = on_skipped
+        self.pool = pool
+
+        self.frames_grabbed = 0
+        self.frames_retrieved = 0
+
+    def set_policy(self, policy):
+        """Switch the sampling policy (before iterating)"""
+        self.policy = policy
+        self.policy.setup(self.fps, self.total_frames)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def __iter__(self):
+        # Policies that know their sample positions up front let us stop early
+        # and jump over long gaps
+        on_skipped = self.on_skipped
+        next_sample = getattr(self.policy, 'next_sample', None) if on_skipped is None else None
+        frame_number = self.start_frame
+        if frame_number:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        timer = self.timer
+        decode_start = time.perf_counter() if timer else None
+        try:
+            while self.end_frame is None or frame_number < self.end_frame:
+                if next_sample is not None:
+                    target = next_sample(frame_number)
+                    if target is None:
+                        break
+                    if self.seek_min_gap is not None and target - frame_number > self.seek_min_gap:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                        frame_number = target
+
+                if not self.cap.grab():
+                    break
+                self.frames_grabbed += 1
+
+                if self.policy.should_sample(frame_number):
+                    ret, frame = self._retrieve()
+                    if not ret:
+                        break
+                    self.frames_retrieved += 1
+                    if timer:
+                        timer.observe('decode', time.perf_counter() - decode_start)
+                    yield frame_number, frame
+                    if timer:
+                        decode_start = time.perf_counter()
+                elif on_skipped is not None:
+                    ret, frame = self._retrieve()
+                    if not ret:
+                        break
+                    on_skipped(frame_number, frame)
+
+                frame_number += 1
+        finally:
+            if timer:
+                timer.count('frames_decoded', self.frames_retrieved)
+                timer.count('frames_skipped_sampling', self.frames_grabbed - self.frames_retrieved)
+            self.release()
+
+    def _retrieve(self):
+        """``cap.retrieve()``, into a pooled buffer when there is a pool"""
+        if self.pool is None:
+            return self.cap.retrieve()
+        buffer = self.pool.acquire((self.height, self.width, 3))
+        ret, frame = self.cap.retrieve(buffer)
+        if frame is not buffer:
+            # Wrong size (e.g. a rotated stream) or a failed read; OpenCV
+            # allocated its own array
+            self.pool.release(buffer)
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
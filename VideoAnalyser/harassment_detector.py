@@ -0,0 +1,661 @@
+# harassment_detector.py - Multi-factor harassment detection with per-job tracking
+import contextlib
+import copy
+import os
+from types import SimpleNamespace
+import cv2
+import numpy as np
+from scipy.spatial.distance import euclidean
+from frame_source import FrameSource, EveryNth, AdaptiveRate
+from tracking import TrackingContext
+from track_history import TrackHistoryStore
+from motion_gate import MotionGate
+from roi import RoiPlanner
+from incidents import IncidentMerger, SegmentGroups
+from interaction import history_depth, score_all_pairs
+from evidence import EvidenceWriter
+from frame_pool import FramePool
+from detection_cache import DetectionTrace
+
+class AnalysisCancelled(Exception):
+    """Raised from a progress or incident callback to abandon an analysis,
+    e.g. when the client it streams to has gone away"""
+
+class AdvancedHarassmentDetector:
+    def __init__(self, model):
+        # A YOLO model or a ModelPool; only stateless predict() calls are made
+        # on it, tracker state lives in a TrackingContext per job
+        self.model = model
+        self._default_context = None
+        self.harassment_incidents = []
+        self.frame_cache = {}
+        
+        # Harassment detection parameters
+        self.PROXIMITY_THRESHOLD = 80  # pixels
+        self.AGGRESSIVE_MOVEMENT_THRESHOLD = 50  # pixels per frame
+        self.SUSTAINED_INTERACTION_FRAMES = 8  # frames
+        # Video frames between history positions the movement and sustained
+        # factors were tuned for; other spacings are normalised to it
+        self.HISTORY_FRAME_STEP = 2
+        self.CONFIDENCE_THRESHOLD = 0.6
+        self.HARASSMENT_SCORE_THRESHOLD = 0.4
+        self.FRAME_SKIP = 2  # Process every 2nd frame (fixed-rate mode)
+        self.TRACK_EVICT_FRAMES = int(os.environ.get('TRACK_EVICT_FRAMES', 300))  # Forget unseen people
+        self.TRACK_HISTORY_LEN = 30  # Positions kept per person
+        
+        # Adaptive sampling (opt-in): sparse while nobody interacts, full rate when a pair scores high
+        self.ADAPTIVE_SAMPLING = os.environ.get('ADAPTIVE_SAMPLING', '0') != '0'
+        self.SAMPLING_MIN_FPS = float(os.environ.get('SAMPLING_MIN_FPS', 2))
+        self.SAMPLING_MAX_FPS = float(os.environ.get('SAMPLING_MAX_FPS', 0)) or None  # 0 = video frame rate
+        
+        # Motion gate (opt-in): reuse the previous tracks when the scene is static
+        self.MOTION_GATE = os.environ.get('MOTION_GATE', '0') == '1'
+        self.MOTION_MIN_CHANGED_FRACTION = float(os.environ.get('MOTION_MIN_CHANGED_FRACTION', 0.002))
+        self.MOTION_REFRESH_FRAMES = int(os.environ.get('MOTION_REFRESH_FRAMES', 15))  # Forced detector run
+        
+        # ROI mode: between full scans, only detect in crops around known people
+        self.ROI_INFERENCE = os.environ.get('ROI_INFERENCE', '0') == '1'
+        self.ROI_FULL_SCAN_INTERVAL = int(os.environ.get('ROI_FULL_SCAN_INTERVAL', 10))  # Detector runs
+        self.ROI_PADDING = float(os.environ.get('ROI_PADDING', 0.5))  # Fraction of the box size
+        
+        # Recycle decoded and resized frames through a per-job buffer pool
+        self.FRAME_POOL = os.environ.get('FRAME_POOL', '1') != '0'
+        
+        # FourCC of annotated evidence videos (process_video's render_path)
+        self.EVIDENCE_CODEC = os.environ.get('EVIDENCE_CODEC', 'mp4v')
+        
+        # Weights of the interaction score factors
+        self.INTERACTION_WEIGHTS = {
+            'proximity': 0.3,
+            'size': 0.15,
+            'movement': 0.25,
+            'sustained': 0.2,
+            'posture': 0.1
+        }
+        
+        # Pose analysis for aggressive behavior
+        self.AGGRESSIVE_POSES = ['raised_arms', 'pointing', 'close_approach']
+        
+    def calculate_interaction_score(self, person1_box, person2_box, person1_history, person2_history,
+                                    person1_frames=None, person2_frames=None):
+        """Calculate harassment probability based on multiple factors
+
+        ``person*_frames`` are the frame numbers of the history positions;
+        without them the positions are taken to be HISTORY_FRAME_STEP apart.
+        """
+        step = self.HISTORY_FRAME_STEP
+        if person1_frames is None:
+            person1_frames = np.arange(len(person1_history)) * step
+        if person2_frames is None:
+            person2_frames = np.arange(len(person2_history)) * step
+        x1, y1, x2, y2 = person1_box[:4]
+        x3, y3, x4, y4 = person2_box[:4]
+        
+        # Calculate centers
+        center1 = ((x1 + x2) / 2, (y1 + y2) / 2)
+        center2 = ((x3 + x4) / 2, (y3 + y4) / 2)
+        
+        # Factor 1: Proximity (closer = higher score)
+        distance = euclidean(center1, center2)
+        proximity_score = max(0, 1 - (distance / self.PROXIMITY_THRESHOLD))
+        
+        # Factor 2: Size difference (larger person approaching smaller = higher score)
+        area1 = (x2 - x1) * (y2 - y1)
+        area2 = (x4 - x3) * (y4 - y3)
+        size_ratio = max(area1, area2) / (min(area1, area2) + 1e-6)
+        size_score = min(1.0, (size_ratio - 1) / 2)  # Score increases with size difference
+        
+        # Factor 3: Movement patterns (rapid approach = higher score)
+        movement_score = 0
+        if len(person1_history) >= 3 and len(person2_history) >= 3:
+            # Calculate movement towards each other
+            prev_dist = euclidean(person1_history[-3], person2_history[-3])
+            curr_dist = distance
+            if prev_dist > curr_dist:  # Moving closer
+                # Per video frame, scaled so positions HISTORY_FRAME_STEP apart score as before
+                elapsed = max(1, person1_frames[-1] - person1_frames[-3], person2_frames[-1] - person2_frames[-3])
+                approach_speed = (prev_dist - curr_dist) / elapsed * (2 * step / 3)
+                movement_score = min(1.0, approach_speed / 20)
+        
+        # Factor 4: Sustained interaction (staying close = higher score) over
+        # the last SUSTAINED_INTERACTION_FRAMES * HISTORY_FRAME_STEP video
+        # frames; each position stands for the frames since the one before it
+        sustained_score = 0
+        window = self.SUSTAINED_INTERACTION_FRAMES * step
+        newest_first = np.asarray(person1_frames)[::-1]
+        gaps = np.append(newest_first[:-1] - newest_first[1:], step)[:len(newest_first)]
+        covered = np.minimum(gaps, np.maximum(0, window - (np.cumsum(gaps) - gaps)))
+        if gaps.sum() >= window:
+            close_frames = sum(covered[k] for k in range(len(covered))
+                               if covered[k] > 0 and len(person2_history) > k + 1 and
+                               euclidean(person1_history[-1 - k], person2_history[-1 - k]) < self.PROXIMITY_THRESHOLD)
+            sustained_score = close_frames / window
+        
+        # Factor 5: Body language analysis (placeholder for future pose estimation)
+        posture_score = self.analyze_body_language(person1_box, person2_box)
+        
+        # Weighted combination of all factors
+        weights = self.INTERACTION_WEIGHTS
+        
+        total_score = (
+            proximity_score * weights['proximity'] +
+            size_score * weights['size'] +
+            movement_score * weights['movement'] +
+            sustained_score * weights['sustained'] +
+            posture_score * weights['posture']
+        )
+        
+        return min(1.0, total_score), {
+            'proximity': proximity_score,
+            'size_difference': size_score,
+            'movement': movement_score,
+            'sustained': sustained_score,
+            'posture': posture_score,
+            'distance': distance
+        }
+    
+    def score_all_pairs(self, boxes, track_ids, person_tracks):
+        """``calculate_interaction_score`` for every pair of people in one call
+
+        Returns ``(scores, factors)`` as ``(N, N)`` matrices, row = person1,
+        column = person2; see ``interaction.score_all_pairs``.
+        """
+        depth = history_depth(self.SUSTAINED_INTERACTION_FRAMES, self.HISTORY_FRAME_STEP)
+        history, lengths = person_tracks.recent(track_ids, depth)
+        return score_all_pairs(boxes, history, lengths, self.INTERACTION_WEIGHTS,
+                               self.PROXIMITY_THRESHOLD, self.SUSTAINED_INTERACTION_FRAMES,
+                               frames=person_tracks.recent_frames(track_ids, depth),
+                               frame_step=self.HISTORY_FRAME_STEP)
+    
+    def analyze_body_language(self, person1_box, person2_box):
+        """Analyze body language for aggressive behavior"""
+        # Placeholder for pose estimation analysis
+        # In a real implementation, you'd use pose estimation models
+        
+        x1, y1, x2, y2 = person1_box[:4]
+        x3, y3, x4, y4 = person2_box[:4]
+        
+        # Simple heuristic: if one person is significantly taller and close, increase score
+        height1 = y2 - y1
+        height2 = y4 - y3
+        height_ratio = max(height1, height2) / (min(height1, height2) + 1e-6)
+        
+        if height_ratio > 1.3:  # Significant height difference
+            return 0.3
+        
+        return 0.1
+    
+    def new_context(self):
+        """Fresh tracker state and history for one video"""
+        motion_gate = None
+        if self.MOTION_GATE:
+            motion_gate = MotionGate(min_changed_fraction=self.MOTION_MIN_CHANGED_FRACTION,
+                                     refresh_interval=self.MOTION_REFRESH_FRAMES)
+        roi_planner = None
+        if self.ROI_INFERENCE:
+            roi_planner = RoiPlanner(full_scan_interval=self.ROI_FULL_SCAN_INTERVAL, padding=self.ROI_PADDING)
+        return TrackingContext(history_len=self.TRACK_HISTORY_LEN, motion_gate=motion_gate, roi_planner=roi_planner,
+                               evict_after=self.TRACK_EVICT_FRAMES,
+                               frame_pool=FramePool() if self.FRAME_POOL else None)
+    
+    def track_frame(self, frame, context):
+        """Run the detector (full frame or ROI crops) and update the context's tracks"""
+        crops = None
+        if context.roi_planner is not None:
+            crops = context.roi_planner.plan(frame, context.last_tracks)
+        
+        timer = context.timer
+        if crops is None:
+            with timer.stage('inference'):
+                results = self.model.predict(frame, verbose=False, conf=self.CONFIDENCE_THRESHOLD)
+            if not results:
+                return None
+            with timer.stage('tracking'):
+                return context.update(results[0])
+        
+        # Detect in each crop at full-scan scale and shift the boxes back into the frame
+        boxes = [np.empty((0, 6), dtype=np.float32)]
+        with timer.stage('inference'):
+            for x1, y1, x2, y2 in crops:
+                imgsz = context.roi_planner.imgsz_for((x1, y1, x2, y2), frame.shape)
+                results = self.model.predict(frame[y1:y2, x1:x2], verbose=False,
+                                             conf=self.CONFIDENCE_THRESHOLD, imgsz=imgsz)
+                if results:
+                    crop_boxes = results[0].boxes.data.cpu().numpy().copy()
+                    crop_boxes[:, [0, 2]] += x1
+                    crop_boxes[:, [1, 3]] += y1
+                    boxes.append(crop_boxes)
+        with timer.stage('tracking'):
+            return context.update_boxes(np.concatenate(boxes), frame)
+    
+    def detect_harassment_in_frame(self, frame, frame_number, fps, context=None):
+        """Detect harassment in a single frame with advanced analysis"""
+        if context is None:
+            if self._default_context is None:
+                self._default_context = self.new_context()
+            context = self._default_context
+        
+        context.timer.count('frames_processed')
+        if context.motion_gate is None or context.motion_gate.should_infer(frame):
+            tracks = self.track_frame(frame, context)
+            if tracks is None:
+                return []
+        else:
+            # Nothing moved: the people are where they were on the last frame
+            context.timer.count('frames_skipped_static')
+            tracks = context.last_tracks
+        
+        if context.trace is not None:
+            context.trace.add(frame_number, tracks)
+        
+        with context.timer.stage('scoring'):
+            return self.score_tracks(tracks, frame.shape, frame_number, fps, context)
+    
+    def score_tracks(self, tracks, frame_shape, frame_number, fps, context):
+        """Update track history with a frame's people and flag the pairs scoring above the threshold
+
+        Only ``context.person_tracks`` is read and ``context.activity`` set,
+        so the tracks of a recorded ``DetectionTrace`` can be replayed here.
+        """
+        detections = []
+        current_persons = {}
+        context.activity = 0.0
+        
+        # Extract person detections
+        for x1, y1, x2, y2, track_id, confidence, cls in tracks:
+            if int(cls) == 0:  # Person class
+                track_id = int(track_id)
+                bbox = np.array([x1, y1, x2, y2], dtype=np.float32)
+                center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+                
+                current_persons[track_id] = {
+                    'bbox': bbox,
+                    'confidence': float(confidence),
+                    'center': center
+                }
+                
+                # Update tracking history
+                context.person_tracks.append(track_id, center, frame_number)
+        context.person_tracks.evict(frame_number)
+        
+        # Analyze interactions between all pairs of people at once
+        person_ids = list(current_persons.keys())
+        if len(person_ids) < 2:
+            return detections
+        scores, factors = self.score_all_pairs(
+            np.stack([current_persons[track_id]['bbox'] for track_id in person_ids]),
+            person_ids, context.person_tracks
+        )
+        first, second = np.triu_indices(len(person_ids), k=1)
+        
+        # Scene activity for the adaptive sampler: an approaching pair or
+        # a score nearing the threshold means sample densely
+        context.activity = max(float(factors['movement'][first, second].max()),
+                               float(scores[first, second].max()) / self.HARASSMENT_SCORE_THRESHOLD)
+        
+        # If harassment is detected (score > threshold)
+        flagged = scores[first, second] > self.HARASSMENT_SCORE_THRESHOLD  # Adjustable threshold
+        for i, j in zip(first[flagged].tolist(), second[flagged].tolist()):
+            id1, id2 = person_ids[i], person_ids[j]
+            person1 = current_persons[id1]
+            person2 = current_persons[id2]
+            harassment_score = float(scores[i, j])
+            details = {name: float(matrix[i, j]) for name, matrix in factors.items()}
+            detection = {
+                'timestamp': frame_number / fps,
+                'frame_number': frame_number,
+                'harassment_score': harassment_score,
+                'persons': [
+                    {
+                        'track_id': id1,
+                        'bbox': person1['bbox'].tolist(),
+                        'confidence': person1['confidence']
+                    },
+                    {
+                        'track_id': id2,
+                        'bbox': person2['bbox'].tolist(),
+                        'confidence': person2['confidence']
+                    }
+                ],
+                'details': details,
+                'video_width': frame_shape[1],
+                'video_height': frame_shape[0]
+            }
+            detections.append(detection)
+        
+        return detections
+    
+    def analyse_frame(self, frame, frame_number, fps, context):
+        """Detect harassment in a full-size frame, downscaling very large ones
+
+        ``frame`` itself is left alone; a downscaled copy goes through the
+        context's frame pool and is released again before returning.
+        """
+        # Resize for faster processing but maintain quality
+        height, width = frame.shape[:2]
+        pool = context.frame_pool
+        if width > 1280:  # Only resize if very large
+            scale = 1280 / width
+            new_width = int(width * scale)
+            new_height = int(height * scale)
+            dst = pool.acquire((new_height, new_width, 3)) if pool is not None else None
+            with context.timer.stage('resize'):
+                frame_resized = cv2.resize(frame, (new_width, new_height), dst=dst)
+        else:
+            frame_resized = frame
+        
+        if context.trace is not None and 'frame_size' not in context.trace.meta:
+            context.trace.meta.update(frame_size=frame_resized.shape[1::-1], video_size=[width, height])
+        
+        # Detect harassment in this frame
+        try:
+            frame_detections = self.detect_harassment_in_frame(frame_resized, frame_number, fps, context)
+        finally:
+            if pool is not None and frame_resized is not frame:
+                pool.release(frame_resized)
+        
+        # Scale coordinates back if we resized
+        if width > 1280:
+            self.scale_detections(frame_detections, width, height, width / frame_resized.shape[1])
+        return frame_detections
+    
+    def scale_detections(self, detections, width, height, scale_back):
+        """Map boxes found on a downscaled frame back onto the ``width`` x ``height`` video"""
+        for detection in detections:
+            for person in detection['persons']:
+                bbox = person['bbox']
+                person['bbox'] = [coord * scale_back for coord in bbox]
+            detection['video_width'] = width
+            detection['video_height'] = height
+    
+    def new_sampling_policy(self):
+        """Either adapt the rate to the scene or process every 2nd frame;
+        skipped frames are only grabbed, never converted to BGR arrays"""
+        if self.ADAPTIVE_SAMPLING:
+            return AdaptiveRate(self.SAMPLING_MIN_FPS, self.SAMPLING_MAX_FPS)
+        return EveryNth(self.FRAME_SKIP)
+    
+    def process_video(self, video_path, progress_callback=None, context=None, on_incident=None,
+                      render_path=None, trace_path=None, keep_incidents=True):
+        """Process entire video for harassment detection
+
+        ``progress_callback(frame_number, total_frames, partial_detections)`` is
+        called every 30 processed frames with the incidents found so far, and
+        ``on_incident(incident)`` as soon as an incident is closed. Detections
+        are merged into incidents as frames go by, so memory use doesn't grow
+        with the length of the video; with ``keep_incidents=False`` the
+        incidents only go to ``on_incident`` and an empty list is returned,
+        so nothing is held per incident either. Each
+        call tracks people in its own ``context`` (a fresh one by default), so
+        concurrent videos never share track IDs or history; pass one in to read
+        its ``inference_stats()`` afterwards.
+
+        With ``render_path`` an annotated copy of the video is written there in
+        the same pass: frames with flagged pairs get their boxes, track IDs
+        and scores drawn on, every other frame is copied through unchanged.
+        With ``trace_path`` the tracks of every analysed frame are saved there
+        as a ``DetectionTrace`` once the video is done, for ``rescore``.
+        Either callback may raise ``AnalysisCancelled`` to stop early; it
+        propagates and no trace is saved.
+        """
+        if context is None:
+            context = self.new_context()
+        policy = self.new_sampling_policy()
+        source = FrameSource(video_path, policy, timer=context.timer, pool=context.frame_pool)
+        context.sampling_policy = policy
+        fps = source.fps
+        total_frames = source.total_frames
+        
+        evidence = None
+        if render_path:
+            evidence = EvidenceWriter(render_path, fps, (source.width, source.height),
+                                      codec=self.EVIDENCE_CODEC, timer=context.timer, pool=context.frame_pool)
+            source.on_skipped = evidence.passthrough
+        if trace_path:
+            context.trace = DetectionTrace({'fps': fps, 'total_frames': total_frames})
+        
+        print(f"Processing video: {total_frames} frames at {fps} FPS")
+        
+        # The evidence file is finished (all queued frames encoded) before returning
+        with evidence if evidence is not None else contextlib.nullcontext():
+            merger = self._analyse_source(source, policy, context, on_incident, progress_callback, evidence,
+                                          keep_incidents)
+        if trace_path:
+            context.trace.save(trace_path)
+        
+        print(f"Detection complete: {merger.closed} harassment incidents found")
+        return merger.incidents
+    
+    def _analyse_source(self, source, policy, context, on_incident, progress_callback, evidence,
+                        keep_incidents=True):
+        """The frame loop of ``process_video``; returns the flushed merger"""
+        fps = source.fps
+        total_frames = source.total_frames
+        merger = self.new_incident_merger(on_incident, keep=keep_incidents)
+        frames_processed = 0
+        
+        for frame_number, frame in source:
+            frame_detections = self.analyse_frame(frame, frame_number, fps, context)
+            if evidence is not None:
+                evidence.write(frame, frame_detections)
+            elif context.frame_pool is not None:
+                context.frame_pool.release(frame)
+            frames_processed += 1
+            if self.ADAPTIVE_SAMPLING:
+                policy.update(context.activity)
+            
+            with context.timer.stage('postprocess'):
+                merger.advance(frame_number / fps)
+                for detection in frame_detections:
+                    merger.add(detection)
+            
+            # Progress update
+            if frames_processed % 30 == 0:  # Every 30 processed frames
+                progress = (frame_number / total_frames) * 100
+                print(f"Progress: {progress:.1f}%")
+                if progress_callback:
+                    progress_callback(frame_number, total_frames, merger.snapshot())
+        
+        # Close the last open group of nearby detections
+        merger.flush()
+        return merger
+    
+    def process_segment(self, video_path, start_frame, end_frame, warmup_frames=0, progress_callback=None,
+                        context=None):
+        """Process frames ``start_frame`` to ``end_frame`` (None = the end) of a split video
+
+        Tracking starts ``warmup_frames`` earlier so track history is primed
+        by the time the segment proper begins; detections from the warm-up
+        are discarded. Returns a dict with the segment's detection groups
+        (see ``SegmentGroups``), the person boxes seen in the warm-up
+        (``head_tracks``) and in the last ``warmup_frames`` of the segment
+        (``tail_tracks``) as ``{track_id: {frame_number: box}}`` for stitching
+        track IDs to the neighbouring segments, and the highest track ID used.
+        ``progress_callback(frames_done, segment_frames)`` is called every 30
+        processed frames.
+        """
+        if context is None:
+            context = self.new_context()
+        policy = self.new_sampling_policy()
+        warmup_start = max(0, start_frame - warmup_frames)
+        source = FrameSource(video_path, policy, start_frame=warmup_start, end_frame=end_frame,
+                             timer=context.timer, pool=context.frame_pool)
+        context.sampling_policy = policy
+        fps = source.fps
+        
+        groups = SegmentGroups(gap=1.0, min_detections=3)
+        head_tracks, tail_tracks = {}, {}
+        max_track_id = -1
+        frames_processed = 0
+        
+        for frame_number, frame in source:
+            frame_detections = self.analyse_frame(frame, frame_number, fps, context)
+            if context.frame_pool is not None:
+                context.frame_pool.release(frame)
+            frames_processed += 1
+            if self.ADAPTIVE_SAMPLING:
+                policy.update(context.activity)
+            
+            if frame_number < start_frame:
+                boundary = head_tracks
+            elif end_frame is not None and frame_number >= end_frame - warmup_frames:
+                boundary = tail_tracks
+            else:
+                boundary = None
+            for x1, y1, x2, y2, track_id, confidence, cls in context.last_tracks:
+                if int(cls) == 0:
+                    max_track_id = max(max_track_id, int(track_id))
+                    if boundary is not None:
+                        boundary.setdefault(int(track_id), {})[frame_number] = [
+                            float(x1), float(y1), float(x2), float(y2)]
+            
+            if frame_number >= start_frame:
+                with context.timer.stage('postprocess'):
+                    groups.advance(frame_number / fps)
+                    for detection in frame_detections:
+                        groups.add(detection)
+            
+            if progress_callback and frames_processed % 30 == 0:
+                segment_frames = (end_frame if end_frame is not None else source.total_frames) - warmup_start
+                progress_callback(frame_number - warmup_start, segment_frames)
+        
+        return {
+            'start_frame': start_frame,
+            'end_frame': end_frame,
+            'fps': fps,
+            'groups': groups.flush(),
+            'head_tracks': head_tracks,
+            'tail_tracks': tail_tracks,
+            'max_track_id': max_track_id,
+            'inference_stats': context.inference_stats(),
+            'timer': context.timer
+        }
+    
+    def process_live(self, source, context=None, on_incident=None, on_frame=None):
+        """Analyse a ``LiveFrameSource`` until it ends or is stopped
+
+        Frames arrive as fast as the source captures them, minus any the
+        source dropped because analysis fell behind, so there is no sampling
+        policy here. ``on_frame(frame_number, captured_at)`` is called after
+        each frame is scored and ``on_incident(incident)`` as soon as an
+        incident closes, including the one open when the stream ends.
+        Incidents aren't collected, so memory doesn't grow with stream
+        length; returns how many were emitted.
+        """
+        if context is None:
+            context = self.new_context()
+        fps = source.fps
+        # Closed incidents only go out through on_incident; keeping them
+        # would grow without bound on a long-running stream
+        merger = self.new_incident_merger(on_incident, keep=False)
+        
+        for frame_number, captured_at, frame in source:
+            frame_detections = self.analyse_frame(frame, frame_number, fps, context)
+            with context.timer.stage('postprocess'):
+                merger.advance(frame_number / fps)
+                for detection in frame_detections:
+                    merger.add(detection)
+            if on_frame:
+                on_frame(frame_number, captured_at)
+        
+        merger.flush()
+        return merger.closed
+    
+    def rescore(self, trace, proximity_threshold=None, sustained_interaction_frames=None,
+                harassment_score_threshold=None, weights=None):
+        """Replay scoring and incident merging over a ``DetectionTrace`` with other parameters
+
+        Only the given parameters change; ``weights`` may name a subset of
+        ``INTERACTION_WEIGHTS``. No frame is decoded and the detector isn't
+        run, so a sweep over thresholds costs a few milliseconds per
+        thousand analysed frames. With adaptive sampling the replay sees the
+        frames the original run sampled, which that run picked partly from
+        its own scores. Raises ``ValueError`` for out-of-range parameters.
+        """
+        scorer = copy.copy(self)
+        if proximity_threshold is not None:
+            scorer.PROXIMITY_THRESHOLD = float(proximity_threshold)
+            if scorer.PROXIMITY_THRESHOLD <= 0:
+                raise ValueError('proximity_threshold must be positive')
+        if sustained_interaction_frames is not None:
+            scorer.SUSTAINED_INTERACTION_FRAMES = int(sustained_interaction_frames)
+            if not 1 <= scorer.SUSTAINED_INTERACTION_FRAMES <= self.TRACK_HISTORY_LEN:
+                raise ValueError(f'sustained_interaction_frames must be between 1 and {self.TRACK_HISTORY_LEN}')
+        if harassment_score_threshold is not None:
+            scorer.HARASSMENT_SCORE_THRESHOLD = float(harassment_score_threshold)
+            if not 0 < scorer.HARASSMENT_SCORE_THRESHOLD <= 1:
+                raise ValueError('harassment_score_threshold must be in (0, 1]')
+        if weights:
+            unknown = set(weights) - set(self.INTERACTION_WEIGHTS)
+            if unknown:
+                raise ValueError(f"Unknown weights: {', '.join(sorted(unknown))}")
+            scorer.INTERACTION_WEIGHTS = dict(self.INTERACTION_WEIGHTS,
+                                              **{name: float(value) for name, value in weights.items()})
+        
+        # score_tracks only needs the track history and somewhere to put the activity
+        state = SimpleNamespace(
+            person_tracks=TrackHistoryStore(self.TRACK_HISTORY_LEN, evict_after=self.TRACK_EVICT_FRAMES),
+            activity=0.0
+        )
+        fps = trace.meta['fps']
+        frame_width, frame_height = trace.meta.get('frame_size', (0, 0))
+        video_width, video_height = trace.meta.get('video_size', (frame_width, frame_height))
+        frame_shape = (frame_height, frame_width)
+        merger = scorer.new_incident_merger()
+        for frame_number, tracks in trace.frames():
+            frame_detections = scorer.score_tracks(tracks, frame_shape, frame_number, fps, state)
+            if video_width != frame_width:
+                scorer.scale_detections(frame_detections, video_width, video_height, video_width / frame_width)
+            merger.advance(frame_number / fps)
+            for detection in frame_detections:
+                merger.add(detection)
+        return merger.flush()
+    
+    def scoring_params(self):
+        """Parameters ``rescore`` can change without running the detector again"""
+        return {
+            'proximity_threshold': self.PROXIMITY_THRESHOLD,
+            'sustained_interaction_frames': self.SUSTAINED_INTERACTION_FRAMES,
+            'history_frame_step': self.HISTORY_FRAME_STEP,
+            'harassment_score_threshold': self.HARASSMENT_SCORE_THRESHOLD,
+            'weights': dict(self.INTERACTION_WEIGHTS)
+        }
+    
+    def cache_params(self):
+        """Parameters that change the output, used in result cache keys"""
+        return dict(self.detection_params(), **self.scoring_params())
+    
+    def detection_params(self):
+        """Parameters that change which frames are analysed and the tracks
+        found in them, used in detection trace keys"""
+        return {
+            'confidence_threshold': self.CONFIDENCE_THRESHOLD,
+            'frame_skip': self.FRAME_SKIP,
+            'track_evict_frames': self.TRACK_EVICT_FRAMES,
+            'adaptive_sampling': self.ADAPTIVE_SAMPLING,
+            'sampling_min_fps': self.SAMPLING_MIN_FPS,
+            'sampling_max_fps': self.SAMPLING_MAX_FPS,
+            'motion_gate': self.MOTION_GATE,
+            'motion_min_changed_fraction': self.MOTION_MIN_CHANGED_FRACTION,
+            'motion_refresh_frames': self.MOTION_REFRESH_FRAMES,
+            'roi_inference': self.ROI_INFERENCE,
+            'roi_full_scan_interval': self.ROI_FULL_SCAN_INTERVAL,
+            'roi_padding': self.ROI_PADDING
+        }
+    
+    def new_incident_merger(self, on_incident=None, keep=True):
+        """Online merger applying the post_process_detections rules"""
+        return IncidentMerger(gap=1.0, min_detections=3, on_incident=on_incident, keep=keep)
+    
+    def post_process_detections(self, detections):
+        """Clean up and consolidate detections"""
+        if not detections:
+            return []
+        
+        # Sort by timestamp, then merge nearby detections (within 1 second),
+        # keeping the highest-scoring one of each sustained group
+        detections.sort(key=lambda x: x['timestamp'])
+        merger = self.new_incident_merger()
+        for detection in detections:
+            merger.add(detection)
+        return merger.flush()
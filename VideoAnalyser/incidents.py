@@ -0,0 +1,100 @@
+# incidents.py - Online merging of per-frame detections into incidents
+class IncidentMerger:
+    """Merges detections into incidents as they arrive, in constant memory.
+
+    Same rules as the old sort-then-merge pass: detections no more than
+    ``gap`` seconds after the previous one join its group, groups with fewer
+    than ``min_detections`` are dropped, and each kept group is reported by
+    its highest-scoring detection (the earliest one on ties). Only the open
+    group's count, last timestamp and best detection are held, so memory
+    doesn't grow with video length. Detections must be added in timestamp
+    order; ``on_incident(incident)`` is called as soon as a group closes.
+    With ``keep=False`` closed incidents are only passed to ``on_incident``
+    and counted in ``closed``, not collected, for callers that stream them.
+    """
+
+    def __init__(self, gap=1.0, min_detections=3, on_incident=None, keep=True):
+        self.gap = gap
+        self.min_detections = min_detections
+        self.on_incident = on_incident
+        self.keep = keep
+        self.incidents = []
+        self.closed = 0
+        self._count = 0
+        self._first_timestamp = None
+        self._last_timestamp = None
+        self._best = None
+
+    def add(self, detection):
+        timestamp = detection['timestamp']
+        self.add_group(timestamp, timestamp, 1, detection)
+
+    def add_group(self, start, end, count, best):
+        """Add a group of ``count`` detections from ``start`` to ``end`` seconds
+        already merged elsewhere, e.g. by one segment of a split video"""
+        if self._count and start - self._last_timestamp > self.gap:
+            self._close()
+        if not self._count:
+            self._first_timestamp = start
+        if self._best is None or best['harassment_score'] > self._best['harassment_score']:
+            self._best = best
+        self._count += count
+        self._last_timestamp = end
+
+    def advance(self, timestamp):
+        """Close the open group once ``timestamp`` is more than ``gap`` past it"""
+        if self._count and timestamp - self._last_timestamp > self.gap:
+            self._close()
+
+    def _close(self):
+        if self._count >= self.min_detections:
+            self.closed += 1
+            if self.keep:
+                self.incidents.append(self._best)
+            if self.on_incident:
+                self.on_incident(self._best)
+        self._count = 0
+        self._first_timestamp = None
+        self._last_timestamp = None
+        self._best = None
+
+    def flush(self):
+        """Close the open group at the end of the video and return all kept incidents"""
+        if self._count:
+            self._close()
+        return self.incidents
+
+    def snapshot(self):
+        """Incidents so far, including the open group if it already qualifies"""
+        if self._count >= self.min_detections:
+            return self.incidents + [self._best]
+        return list(self.incidents)
+
+
+class SegmentGroups(IncidentMerger):
+    """Detection groups of one segment of a video split for parallel processing.
+
+    Interior groups follow the usual rules, but the first group and the one
+    still open at the end are kept whatever their size: they may continue in
+    the neighbouring segments, where ``IncidentMerger.add_group`` joins them
+    up again. ``flush`` returns ``(start, end, count, best)`` tuples.
+    """
+
+    def __init__(self, gap=1.0, min_detections=3):
+        super().__init__(gap=gap, min_detections=min_detections)
+        self.groups = []
+
+    def _close(self):
+        self.groups.append((self._first_timestamp, self._last_timestamp, self._count, self._best))
+        # The previous group is interior now that it is neither first nor last
+        if len(self.groups) >= 3 and self.groups[-2][2] < self.min_detections:
+            del self.groups[-2]
+        self._count = 0
+        self._first_timestamp = None
+        self._last_timestamp = None
+        self._best = None
+
+    def flush(self):
+        if self._count:
+            self._close()
+        return self.groups
@@ -0,0 +1,89 @@
+# inference_backend.py - Pluggable YOLO inference backends (PyTorch, ONNX Runtime, OpenVINO, INT8 ONNX)
+import os
+
+from ultralytics import YOLO
+
+# Backend used when a caller doesn't ask for one
+DEFAULT_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch')
+
+# Export format and artifact suffix for each optimised CPU runtime; ultralytics
+# writes exports next to the .pt file under these names
+EXPORT_FORMATS = {
+    'onnx': ('onnx', '.onnx'),
+    'openvino': ('openvino', '_openvino_model'),
+}
+
+
+def exported_path(weights, backend):
+    """Where the exported artifact for ``weights`` lives"""
+    _, suffix = EXPORT_FORMATS[backend]
+    return os.path.splitext(weights)[0] + suffix
+
+
+def export_model(weights, backend, imgsz=640):
+    """Export ``weights`` to ``backend`` once and return the cached artifact path.
+
+    The export is redone only when the .pt file is newer than the artifact.
+    """
+    path = exported_path(weights, backend)
+    if os.path.exists(path) and (not os.path.exists(weights)
+                                 or os.path.getmtime(path) >= os.path.getmtime(weights)):
+        return path
+
+    export_format, _ = EXPORT_FORMATS[backend]
+    print(f"Exporting {weights} to {backend} (one-time)...")
+    # Dynamic axes so batched and non-square inputs keep working
+    exported = YOLO(weights).export(format=export_format, imgsz=imgsz, dynamic=True)
+    return str(exported) if exported else path
+
+
+def _load_torch(weights):
+    return YOLO(weights)
+
+
+def _load_exported(backend):
+    def load(weights):
+        return YOLO(export_model(weights, backend), task='detect')
+    return load
+
+
+def _load_int8(weights):
+    # Statically quantised ONNX, calibrated on QUANT_CALIBRATION_VIDEOS unless
+    # already built (see quantization.py)
+    from quantization import quantize_detector
+    return YOLO(quantize_detector(weights), task='detect')
+
+
+BACKENDS = {
+    'torch': _load_torch,
+    'onnx': _load_exported('onnx'),
+    'openvino': _load_exported('openvino'),
+    'onnx-int8': _load_int8,
+}
+
+
+def register_backend(name, loader):
+    """Add a backend; ``loader(weights)`` must return an object with the YOLO call/predict/track API"""
+    BACKENDS[name] = loader
+
+
+def prepare_backend(weights, backend=None):
+    """Export ahead of time so parallel loaders only read the cached artifact"""
+    backend = backend or DEFAULT_BACKEND
+    if backend in EXPORT_FORMATS:
+        export_model(weights, backend)
+    elif backend == 'onnx-int8':
+        from quantization import quantize_detector
+        quantize_detector(weights)
+
+
+def load_model(weights, backend=None):
+    """Load ``weights`` with the requested backend (``INFERENCE_BACKEND`` by default).
+
+    Every backend returns an ultralytics model, so results expose the same
+    ``boxes`` (xyxy, conf, cls) contract as the PyTorch model.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](weights)
@@ -0,0 +1,102 @@
+# interaction.py - Multi-factor interaction scores for every pair of people at once
+import numpy as np
+
+
+def _pairwise_distance(points):
+    """(N, N) distances between (N, 2) points, in float64 like scipy's euclidean"""
+    diff = points[:, None, :].astype(np.float64) - points[None, :, :].astype(np.float64)
+    return np.sqrt((diff ** 2).sum(axis=-1))
+
+
+def history_depth(sustained_frames, frame_step):
+    """How many recent positions per person ``score_all_pairs`` needs"""
+    return max(3, sustained_frames * frame_step + 1)
+
+
+def score_all_pairs(boxes, history, lengths, weights, proximity_threshold, sustained_frames, frames=None,
+                    frame_step=1):
+    """Score every ordered pair of people in one vectorised pass.
+
+    ``boxes`` is an ``(N, 4)`` array of ``x1, y1, x2, y2`` rows, ``history``
+    an ``(N, K, 2)`` array of each person's recent centers with ``k`` = how
+    many positions ago (0 = the current one, already recorded) and
+    ``lengths`` how many positions each person actually has;
+    ``K >= history_depth(sustained_frames, frame_step)``. ``frames`` holds
+    the ``(N, K)`` frame numbers of those positions; without it they are
+    taken to be ``frame_step`` frames apart, the spacing the movement and
+    sustained factors are tuned for. Entry ``[i, j]`` of every matrix is
+    what ``calculate_interaction_score`` returns with person ``i`` as
+    ``person1`` and ``j`` as ``person2`` (the sustained factor is not
+    symmetric). Returns ``(scores, factors)`` where ``factors`` holds the
+    ``proximity``, ``size_difference``, ``movement``, ``sustained``,
+    ``posture`` and ``distance`` matrices.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    lengths = np.asarray(lengths)
+    x1, y1, x2, y2 = boxes.T
+
+    # Factor 1: Proximity (closer = higher score)
+    centers = np.stack(((x1 + x2) / 2, (y1 + y2) / 2), axis=1)
+    distance = _pairwise_distance(centers)
+    proximity = np.maximum(0.0, 1 - distance / proximity_threshold)
+
+    # Factor 2: Size difference (larger person approaching smaller = higher score)
+    area = (x2 - x1) * (y2 - y1)
+    size_ratio = (np.maximum(area[:, None], area[None, :])
+                  / (np.minimum(area[:, None], area[None, :]) + np.float32(1e-6)))
+    size = np.minimum(1.0, (size_ratio - 1) / 2)
+
+    # Distances between every pair's positions k ago, for all k at once
+    steps = history_depth(sustained_frames, frame_step)
+    ago = np.arange(steps)
+    past = np.nan_to_num(history[:, :steps]).astype(np.float64)
+    past_distance = np.sqrt(((past[:, None] - past[None, :]) ** 2).sum(axis=-1))
+    if frames is None:
+        frames = np.broadcast_to(-ago * frame_step, (len(boxes), steps))
+    frames = np.asarray(frames)[:, :steps]
+
+    # Factor 3: Movement patterns (rapid approach = higher score); the speed
+    # is per video frame, scaled so positions frame_step apart score as before
+    has_three = lengths >= 3
+    prev_dist = past_distance[:, :, 2]
+    elapsed = np.maximum(1, frames[:, 0] - frames[:, 2])
+    elapsed = np.maximum(elapsed[:, None], elapsed[None, :])
+    approach = np.where(prev_dist > distance, (prev_dist - distance) / elapsed * (2 * frame_step / 3), 0.0)
+    movement = np.where(has_three[:, None] & has_three[None, :], np.minimum(1.0, approach / 20), 0.0)
+
+    # Factor 4: Sustained interaction over the last sustained_frames *
+    # frame_step video frames. Each of person1's positions stands for the
+    # frames since the one before it (frame_step for the oldest) and counts
+    # when close and person2's history is longer than k + 1
+    window = sustained_frames * frame_step
+    has_previous = ago[None, :] + 1 < lengths[:, None]
+    gaps = np.where(has_previous[:, :-1], frames[:, :-1] - frames[:, 1:], frame_step)
+    gaps = np.concatenate((gaps, np.full((len(boxes), 1), frame_step)), axis=1)
+    gaps = np.where(ago[None, :] < lengths[:, None], gaps, 0)
+    covered = np.minimum(gaps, np.maximum(0, window - (np.cumsum(gaps, axis=1) - gaps)))
+    counted = lengths[:, None] > ago[None, :] + 1
+    close = (past_distance < proximity_threshold) & counted[None, :, :]
+    close_frames = (close * covered[:, None, :]).sum(axis=-1)
+    sustained = np.where((gaps.sum(axis=1) >= window)[:, None], close_frames / window, 0.0)
+
+    # Factor 5: Body language, the same height heuristic as analyze_body_language
+    height = y2 - y1
+    height_ratio = (np.maximum(height[:, None], height[None, :])
+                    / (np.minimum(height[:, None], height[None, :]) + np.float32(1e-6)))
+    posture = np.where(height_ratio > 1.3, 0.3, 0.1)
+
+    scores = np.minimum(1.0, (
+        proximity * weights['proximity'] +
+        size * weights['size'] +
+        movement * weights['movement'] +
+        sustained * weights['sustained'] +
+        posture * weights['posture']
+    ))
+    return scores, {
+        'proximity': proximity,
+        'size_difference': size,
+        'movement': movement,
+        'sustained': sustained,
+        'posture': posture,
+        'distance': distance
+    }
@@ -0,0 +1,185 @@
+# jobs.py - Background analysis jobs with progress polling and SSE streaming
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from result_cache import json_default
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """State of one background video analysis"""
+
+    def __init__(self, filename):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.state = QUEUED
+        self.progress = 0.0
+        self.frames_processed = 0
+        self.total_frames = 0
+        self.fps = 0.0
+        self.partial_detections = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Files the job wrote (e.g. an evidence video), deleted when it expires
+        self.files = []
+
+        # Bumped on every change so SSE listeners know when to push an update
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def _notify(self):
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def start(self):
+        self.state = RUNNING
+        self.started_at = time.time()
+        self._notify()
+
+    def update_progress(self, frame_number, total_frames, partial_detections=None):
+        """Called by the worker as frames are processed"""
+        self.frames_processed = frame_number
+        self.total_frames = total_frames
+        self.progress = min(100.0, frame_number / total_frames * 100) if total_frames else 0.0
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        self.fps = frame_number / elapsed if elapsed > 0 else 0.0
+        if partial_detections is not None:
+            self.partial_detections = partial_detections
+        self._notify()
+
+    def complete(self, result):
+        self.result = result
+        self.progress = 100.0
+        self.state = DONE
+        self.finished_at = time.time()
+        self._notify()
+
+    def fail(self, error):
+        self.error = str(error)
+        self.state = FAILED
+        self.finished_at = time.time()
+        self._notify()
+
+    def wait_for_change(self, version, timeout):
+        """Block until the job changes past ``version`` or ``timeout`` passes"""
+        with self._changed:
+            if self.version == version:
+                self._changed.wait(timeout)
+            return self.version
+
+    def to_dict(self, include_detections=True):
+        data = {
+            'job_id': self.id,
+            'filename': self.filename,
+            'state': self.state,
+            'progress': round(self.progress, 1),
+            'frames_processed': self.frames_processed,
+            'total_frames': self.total_frames,
+            'frames_per_second': round(self.fps, 2),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+        if include_detections:
+            data['partial_detections'] = self.partial_detections
+        if self.state == DONE:
+            data['result'] = self.result
+        if self.state == FAILED:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """Runs jobs on a bounded worker pool and evicts finished jobs after a TTL"""
+
+    def __init__(self, max_workers=1, ttl=3600, max_jobs=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, fn, filename, *args, ticket=None, **kwargs):
+        """Queue ``fn(job, *args, **kwargs)`` and return the new job immediately
+
+        With an admission ``ticket`` the job stays queued until the ticket
+        gets an analysis slot, and holds the slot while it runs.
+        """
+        job = Job(filename)
+        with self.lock:
+            self._evict_locked()
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, fn, args, kwargs, ticket)
+        return job
+
+    def _run(self, job, fn, args, kwargs, ticket=None):
+        try:
+            with ticket or nullcontext():
+                job.start()
+                job.complete(fn(job, *args, **kwargs))
+        except Exception as e:
+            job.fail(e)
+
+    def get(self, job_id):
+        with self.lock:
+            self._evict_locked()
+            return self.jobs.get(job_id)
+
+    def state_counts(self):
+        """Number of known jobs in each state, for the metrics endpoint"""
+        with self.lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self.jobs.values():
+                counts[job.state] += 1
+            return counts
+
+    def _evict_locked(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            self._drop_locked(job_id)
+
+        # Over capacity: drop the oldest finished results first
+        if len(self.jobs) >= self.max_jobs:
+            for job_id in [job_id for job_id, job in self.jobs.items() if job.finished]:
+                if len(self.jobs) < self.max_jobs:
+                    break
+                self._drop_locked(job_id)
+
+    def _drop_locked(self, job_id):
+        """Forget a finished job and delete the files it produced"""
+        for path in self.jobs.pop(job_id).files:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def events(self, job, keepalive=15.0):
+        """Server-sent event stream of a job's progress until it finishes"""
+        version = -1
+        while True:
+            current = job.wait_for_change(version, keepalive)
+            if current == version:
+                yield ': keepalive\n\n'
+                continue
+            version = current
+            event = 'done' if job.finished else 'progress'
+            yield f"event: {event}\ndata: {json.dumps(job.to_dict(include_detections=False), default=json_default)}\n\n"
+            if job.finished:
+                return
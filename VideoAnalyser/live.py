@@ -0,0 +1,314 @@
+# live.py - Live stream ingestion with bounded latency and incident streaming
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+from result_cache import json_default
+
+RUNNING = 'running'
+STOPPED = 'stopped'
+FAILED = 'failed'
+
+
+def open_capture(source):
+    """Open a device index ("0"), a path (file or named pipe) or a stream URL"""
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    return cv2.VideoCapture(source)
+
+
+class LiveFrameSource:
+    """Frames from a live OpenCV source, read on a background thread.
+
+    The reader keeps at most ``max_queue`` frames waiting for analysis and
+    drops the oldest one when a new frame arrives on a full queue, so the
+    detector always works on recent frames and latency stays bounded however
+    far inference falls behind. Dropped frames keep their frame numbers, so
+    timestamps still follow the capture clock.
+
+    A capture that stops returning frames is reopened every
+    ``reopen_interval`` seconds (for ``follow=True`` sources such as a file
+    a recorder is still writing, resuming after the last frame read) until
+    nothing new has arrived for ``idle_timeout`` seconds. Named pipes and
+    devices simply end when the writer closes them.
+
+    Yields ``(frame_number, captured_at, frame)`` tuples, where
+    ``captured_at`` is a ``time.monotonic()`` reading.
+    """
+
+    def __init__(self, source, max_queue=4, fps=None, follow=False, reopen_interval=0.5, idle_timeout=10.0):
+        self.source = source
+        self.follow = follow
+        self.reopen_interval = reopen_interval
+        self.idle_timeout = idle_timeout
+        self.cap = open_capture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open live source {source!r}")
+        # Devices and pipes often report 0 FPS
+        capture_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps or (capture_fps if capture_fps and 0 < capture_fps < 1000 else 30.0)
+
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self._queue = deque(maxlen=max(1, max_queue))
+        self._available = threading.Condition()
+        self._stop = threading.Event()
+        self._reader_done = False
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        last_frame_at = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.cap.read()
+                now = time.monotonic()
+                if ret:
+                    last_frame_at = now
+                    with self._available:
+                        if len(self._queue) == self._queue.maxlen:
+                            self.frames_dropped += 1
+                        self._queue.append((self.frames_captured, now, frame))
+                        self.frames_captured += 1
+                        self._available.notify()
+                    continue
+
+                if not self.follow or now - last_frame_at > self.idle_timeout:
+                    return
+                # The recorder hasn't written more yet; reopen past what we read
+                if self._stop.wait(self.reopen_interval):
+                    return
+                self.cap.release()
+                self.cap = open_capture(self.source)
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.frames_captured)
+        finally:
+            self.cap.release()
+            with self._available:
+                self._reader_done = True
+                self._available.notify_all()
+
+    def __iter__(self):
+        while True:
+            with self._available:
+                while not self._queue and not self._reader_done and not self._stop.is_set():
+                    self._available.wait(0.5)
+                if self._stop.is_set() or not self._queue:
+                    return
+                entry = self._queue.popleft()
+            yield entry
+
+    def stop(self):
+        """Stop reading; iteration ends after the current frame"""
+        self._stop.set()
+        with self._available:
+            self._available.notify_all()
+        self._reader.join(timeout=2.0)
+
+    def stats(self):
+        with self._available:
+            return {
+                'frames_captured': self.frames_captured,
+                'frames_dropped': self.frames_dropped,
+                'queue_depth': len(self._queue),
+                'fps': self.fps
+            }
+
+
+class LiveSession:
+    """One live source being analysed, with latency counters and incident events.
+
+    End-to-end latency is measured per frame from capture to the end of its
+    scoring, and kept for the last ``latency_window`` frames. Incidents are
+    numbered as they are emitted so SSE listeners can resume from the last
+    one they saw; at most ``max_events`` are kept.
+    """
+
+    def __init__(self, source, frame_source, latency_window=300, max_events=200):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.frame_source = frame_source
+        self.state = RUNNING
+        self.error = None
+        self.frames_processed = 0
+        self.incidents = deque(maxlen=max_events)
+        self.incidents_total = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._latencies = deque(maxlen=latency_window)
+        self.max_latency = 0.0
+
+        # Bumped on every incident or state change so SSE listeners wake up
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.state != RUNNING
+
+    def _notify(self):
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def frame_done(self, frame_number, captured_at):
+        """Called by the detector after each frame is scored"""
+        latency = time.monotonic() - captured_at
+        with self._changed:
+            self.frames_processed += 1
+            self._latencies.append(latency)
+            self.max_latency = max(self.max_latency, latency)
+
+    def add_incident(self, incident):
+        with self._changed:
+            self.incidents_total += 1
+            self.incidents.append((self.incidents_total, incident))
+        self._notify()
+
+    def finish(self, error=None):
+        if error is not None:
+            self.error = str(error)
+            self.state = FAILED
+        else:
+            self.state = STOPPED
+        self.finished_at = time.time()
+        self._notify()
+
+    def wait_for_change(self, version, timeout):
+        """Block until the session changes past ``version`` or ``timeout`` passes"""
+        with self._changed:
+            if self.version == version:
+                self._changed.wait(timeout)
+            return self.version
+
+    def incidents_after(self, seq):
+        with self._changed:
+            return [(n, incident) for n, incident in self.incidents if n > seq]
+
+    def latency_stats(self):
+        with self._changed:
+            latencies = np.array(self._latencies, dtype=np.float64)
+        if latencies.size == 0:
+            return {'last_ms': None, 'mean_ms': None, 'p95_ms': None, 'max_ms': None}
+        return {
+            'last_ms': round(float(latencies[-1]) * 1000, 1),
+            'mean_ms': round(float(latencies.mean()) * 1000, 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 1),
+            'max_ms': round(self.max_latency * 1000, 1)
+        }
+
+    def to_dict(self, include_incidents=True):
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at
+        data = {
+            'session_id': self.id,
+            'source': self.source,
+            'state': self.state,
+            'frames_processed': self.frames_processed,
+            'frames_per_second': round(self.frames_processed / elapsed, 2) if elapsed > 0 else 0.0,
+            'incidents_total': self.incidents_total,
+            'latency': self.latency_stats(),
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        data.update(self.frame_source.stats())
+        if include_incidents:
+            data['incidents'] = [incident for _, incident in self.incidents]
+        if self.state == FAILED:
+            data['error'] = self.error
+        return data
+
+
+class LiveManager:
+    """Runs live sessions on their own threads, up to ``max_sessions`` at once"""
+
+    def __init__(self, max_sessions=2, max_queue=4, ttl=3600):
+        self.max_sessions = max_sessions
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def start(self, source, analyse, follow=False, fps=None):
+        """Open ``source`` and run ``analyse(session)`` on a new thread.
+
+        Returns the session, or None when ``max_sessions`` are already running.
+        Raises ``IOError`` if the source can't be opened. Opening can block
+        (a pipe without a writer, a slow URL), so it happens outside the lock
+        and capacity is checked again afterwards.
+        """
+        with self.lock:
+            self._evict_locked()
+            if self._running_locked() >= self.max_sessions:
+                return None
+        frame_source = LiveFrameSource(source, max_queue=self.max_queue, fps=fps, follow=follow)
+        with self.lock:
+            if self._running_locked() >= self.max_sessions:
+                session = None
+            else:
+                session = LiveSession(source, frame_source)
+                self.sessions[session.id] = session
+        if session is None:
+            frame_source.stop()
+            return None
+
+        def run():
+            try:
+                analyse(session)
+            except Exception as e:
+                session.frame_source.stop()
+                session.finish(e)
+            else:
+                session.finish()
+
+        threading.Thread(target=run, name=f'live-{session.id[:8]}', daemon=True).start()
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            self._evict_locked()
+            return self.sessions.get(session_id)
+
+    def stop(self, session_id):
+        session = self.get(session_id)
+        if session is not None:
+            session.frame_source.stop()
+        return session
+
+    def gauges(self):
+        """Running sessions and frames waiting in their queues, for the metrics endpoint"""
+        with self.lock:
+            running = [session for session in self.sessions.values() if not session.finished]
+        return {
+            'running': len(running),
+            'queued_frames': sum(session.frame_source.stats()['queue_depth'] for session in running),
+            'dropped_frames': sum(session.frame_source.frames_dropped for session in running)
+        }
+
+    def _running_locked(self):
+        return sum(1 for session in self.sessions.values() if not session.finished)
+
+    def _evict_locked(self):
+        now = time.time()
+        expired = [session_id for session_id, session in self.sessions.items()
+                   if session.finished and now - session.finished_at > self.ttl]
+        for session_id in expired:
+            del self.sessions[session_id]
+
+    def events(self, session, after=0, stats_interval=2.0):
+        """Server-sent events: each incident as it is emitted, periodic stats, then done"""
+        version = -1
+        seq = after
+        while True:
+            current = session.wait_for_change(version, stats_interval)
+            for seq, incident in session.incidents_after(seq):
+                yield f"id: {seq}\nevent: incident\ndata: {json.dumps(incident, default=json_default)}\n\n"
+            version = current
+            event = 'done' if session.finished else 'stats'
+            yield f"event: {event}\ndata: {json.dumps(session.to_dict(include_incidents=False), default=json_default)}\n\n"
+            if session.finished:
+                return
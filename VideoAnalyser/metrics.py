@@ -0,0 +1,246 @@
+# metrics.py - Per-stage latency histograms, counters and a Prometheus text exporter
+import bisect
+import os
+import threading
+import time
+
+# METRICS=0 turns every timer into a no-op
+METRICS_ENABLED = os.environ.get('METRICS', '1') != '0'
+
+# Upper bounds in seconds; covers sub-millisecond scoring up to multi-second
+# batched YOLO calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds a job waits for an analysis slot; up to several queued videos
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+class Histogram:
+    """Cumulative-on-export bucket counts, a sum and a count"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageTimer:
+    """Stage latencies and frame counters of one request.
+
+    ``with timer.stage('inference'): ...`` records one observation in that
+    stage's histogram; ``timer.count('frames_processed')`` bumps a counter.
+    Safe to share between the threads of one pipeline, and picklable so
+    worker processes can send theirs back. A disabled timer does nothing.
+    """
+
+    def __init__(self, enabled=None):
+        self.enabled = METRICS_ENABLED if enabled is None else enabled
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        """Add another timer's observations, e.g. one per video segment"""
+        with self._lock:
+            for name, histogram in other.histograms.items():
+                self.histograms.setdefault(name, Histogram()).merge(histogram)
+            for name, value in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def breakdown(self):
+        """Per-stage totals for a JSON response"""
+        with self._lock:
+            stages = {
+                name: {
+                    'seconds': round(histogram.sum, 4),
+                    'calls': histogram.count,
+                    'mean_ms': round(histogram.sum / histogram.count * 1000, 3) if histogram.count else 0.0,
+                    'max_ms': round(histogram.max * 1000, 3)
+                }
+                for name, histogram in self.histograms.items()
+            }
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class MetricsRegistry:
+    """Process-wide totals of every finished request's ``StageTimer`` plus
+    live gauges, rendered in the Prometheus text exposition format"""
+
+    def __init__(self, namespace='harassment'):
+        self.namespace = namespace
+        self.totals = StageTimer(enabled=True)
+        self.gauges = {}
+        self.gauge_callbacks = {}
+        self.histograms = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def record(self, timer):
+        if not timer.enabled:
+            return
+        self.totals.merge(timer)
+        with self._lock:
+            self.requests += 1
+
+    def set_gauge(self, name, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def register_gauge(self, name, callback, help_text=''):
+        """``callback()`` returns a number or ``{label_value: number}`` keyed by the ``kind`` label"""
+        self.gauge_callbacks[name] = (callback, help_text)
+
+    def register_histogram(self, name, buckets, help_text=''):
+        """A histogram outside the per-stage ones, fed with ``observe(name, value)``"""
+        self.histograms[name] = (Histogram(buckets), help_text)
+
+    def observe(self, name, value):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.histograms[name][0].observe(value)
+
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+    def render(self):
+        ns = self.namespace
+        lines = []
+        with self.totals._lock:
+            histograms = {name: (h.buckets, list(h.counts), h.sum, h.count)
+                          for name, h in self.totals.histograms.items()}
+            counters = dict(self.totals.counters)
+
+        lines += [f'# HELP {ns}_stage_seconds Latency of each pipeline stage per call',
+                  f'# TYPE {ns}_stage_seconds histogram']
+        for stage, (buckets, counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{ns}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{ns}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{ns}_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{ns}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        lines += [f'# HELP {ns}_frames_total Frames by outcome',
+                  f'# TYPE {ns}_frames_total counter']
+        for name, value in sorted(counters.items()):
+            lines.append(f'{ns}_frames_total{{kind="{name}"}} {value}')
+
+        lines += [f'# HELP {ns}_requests_total Finished analyses',
+                  f'# TYPE {ns}_requests_total counter',
+                  f'{ns}_requests_total {self.requests}']
+
+        with self._lock:
+            gauges = dict(self.gauges)
+            named = {name: (h.buckets, list(h.counts), h.sum, h.count, help_text)
+                     for name, (h, help_text) in self.histograms.items()}
+        for name, (buckets, counts, total, count, help_text) in sorted(named.items()):
+            if help_text:
+                lines.append(f'# HELP {ns}_{name} {help_text}')
+            lines.append(f'# TYPE {ns}_{name} histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{ns}_{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{ns}_{name}_bucket{{le="+Inf"}} {count}')
+            lines.append(f'{ns}_{name}_sum {total:.6f}')
+            lines.append(f'{ns}_{name}_count {count}')
+
+        by_name = {}
+        help_texts = {}
+        for (name, labels), value in gauges.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name, (callback, help_text) in self.gauge_callbacks.items():
+            values = callback()
+            if isinstance(values, dict):
+                by_name[name] = [((('kind', kind),), value) for kind, value in values.items()]
+            else:
+                by_name[name] = [((), values)]
+            help_texts[name] = help_text
+        for name, samples in sorted(by_name.items()):
+            if help_texts.get(name):
+                lines.append(f'# HELP {ns}_{name} {help_texts[name]}')
+            lines.append(f'# TYPE {ns}_{name} gauge')
+            for labels, value in sorted(samples):
+                lines.append(f'{ns}_{name}{self._labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
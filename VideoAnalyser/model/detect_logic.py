@@ -1,12 +1,15 @@
+import os
+import sys
+
 import cv2
 import numpy as np
-from ultralytics import YOLO
 
-model = YOLO("yolov8n.pt")  # Downloads if not present
+# proximity and inference_backend live in VideoAnalyser/, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from proximity import find_close_pairs
+from inference_backend import load_model
 
-# Distance tracking helper
-def compute_distance(p1, p2):
-    return np.linalg.norm(np.array(p1) - np.array(p2))
+model = load_model("yolov8n.pt")  # Downloads if not present
 
 def detect_harassment(video_path):
     cap = cv2.VideoCapture(video_path)
@@ -34,13 +37,10 @@ def detect_harassment(video_path):
             centers.append((cx, cy))
 
         if len(centers) >= 2:
-            # Check pairwise distances
-            for i in range(len(centers)):
-                for j in range(i + 1, len(centers)):
-                    dist = compute_distance(centers[i], centers[j])
-                    if dist < HARASSMENT_THRESHOLD:
-                        SUSPICIOUS_FRAMES += 1
-                        break
+            # Check pairwise distances: one count per person with a close
+            # neighbour after it in the detection order
+            first, _, _ = find_close_pairs(centers, HARASSMENT_THRESHOLD)
+            SUSPICIOUS_FRAMES += len(np.unique(first))
 
     cap.release()
 
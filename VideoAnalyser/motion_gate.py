@@ -0,0 +1,63 @@
+# motion_gate.py - Cheap frame differencing to skip the detector on static frames
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Decides per sampled frame whether the detector needs to run.
+
+    Frames are shrunk to ``width`` pixels wide, greyscaled and blurred, then
+    compared with the last frame the detector actually saw. If fewer than
+    ``min_changed_fraction`` of the pixels moved by more than
+    ``pixel_threshold`` grey levels the frame counts as static. Comparing
+    against the last inferred frame, not the previous sampled one, stops slow
+    drift from slipping through a frame at a time. At most
+    ``refresh_interval`` static frames are skipped in a row before the
+    detector is forced to run again.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, min_changed_fraction=0.002, refresh_interval=15):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.refresh_interval = refresh_interval
+        self.reference = None
+        self.since_refresh = 0
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+
+    def _small_gray(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(height * self.width / width))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed_fraction(self, small):
+        """Fraction of pixels that moved since the reference frame"""
+        if self.reference is None or self.reference.shape != small.shape:
+            return 1.0
+        diff = cv2.absdiff(small, self.reference)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def should_infer(self, frame):
+        """True if the detector must run on ``frame``; False to reuse the last result"""
+        small = self._small_gray(frame)
+        if (self.since_refresh < self.refresh_interval
+                and self.changed_fraction(small) < self.min_changed_fraction):
+            self.since_refresh += 1
+            self.frames_skipped += 1
+            return False
+
+        self.reference = small
+        self.since_refresh = 0
+        self.frames_inferred += 1
+        return True
+
+    def stats(self):
+        total = self.frames_inferred + self.frames_skipped
+        return {
+            'frames_inferred': self.frames_inferred,
+            'frames_skipped_static': self.frames_skipped,
+            'skip_ratio': round(self.frames_skipped / total, 3) if total else 0.0
+        }
@@ -0,0 +1,112 @@
+# pipeline.py - Overlapped decode / inference / scoring stages for video analysis
+import heapq
+import queue
+import threading
+
+from metrics import REGISTRY
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class FramePipeline:
+    """Producer/consumer pipeline connected by bounded queues.
+
+    One thread runs ``decode`` (a generator of work items, e.g. frame batches),
+    ``num_workers`` threads run ``infer`` on those items and the calling thread
+    runs ``score`` on the results strictly in decode order. Bounded queues give
+    backpressure so the decoder never runs more than ``queue_size`` items ahead.
+    """
+
+    def __init__(self, decode, infer, score, num_workers=2, queue_size=4):
+        self.decode = decode
+        self.infer = infer
+        self.score = score
+        self.num_workers = max(1, num_workers)
+        self.queue_size = max(1, queue_size)
+
+    def _put(self, q, item, stop):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode_stage(self, decode_q, stop):
+        items = self.decode()
+        try:
+            for seq, item in enumerate(items):
+                if not self._put(decode_q, (seq, item), stop):
+                    return
+        except Exception as e:
+            self._put(decode_q, _StageError(e), stop)
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+            for _ in range(self.num_workers):
+                self._put(decode_q, _DONE, stop)
+
+    def _infer_stage(self, decode_q, infer_q, stop):
+        while not stop.is_set():
+            try:
+                entry = decode_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if entry is _DONE or isinstance(entry, _StageError):
+                self._put(infer_q, entry, stop)
+                if entry is _DONE:
+                    return
+                continue
+            seq, item = entry
+            try:
+                output = self.infer(item)
+            except Exception as e:
+                self._put(infer_q, _StageError(e), stop)
+                return
+            if not self._put(infer_q, (seq, item, output), stop):
+                return
+
+    def run(self):
+        """Run the pipeline, yielding ``score(item, output)`` results in decode order"""
+        decode_q = queue.Queue(maxsize=self.queue_size)
+        infer_q = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        threads = [threading.Thread(target=self._decode_stage, args=(decode_q, stop), daemon=True)]
+        threads += [
+            threading.Thread(target=self._infer_stage, args=(decode_q, infer_q, stop), daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        for t in threads:
+            t.start()
+
+        pending = []  # min-heap of (seq, item, output) that arrived out of order
+        next_seq = 0
+        finished_workers = 0
+        try:
+            while finished_workers < self.num_workers:
+                entry = infer_q.get()
+                # Most recent depths of the pipeline being drained
+                REGISTRY.set_gauge('pipeline_queue_depth', decode_q.qsize(), queue='decode')
+                REGISTRY.set_gauge('pipeline_queue_depth', infer_q.qsize(), queue='inference')
+                if entry is _DONE:
+                    finished_workers += 1
+                    continue
+                if isinstance(entry, _StageError):
+                    raise entry.exc
+
+                heapq.heappush(pending, entry)
+                while pending and pending[0][0] == next_seq:
+                    _, item, output = heapq.heappop(pending)
+                    yield self.score(item, output)
+                    next_seq += 1
+        finally:
+            stop.set()
+            for t in threads:
+                t.join(timeout=1.0)
@@ -0,0 +1,78 @@
+# proximity.py - All-pairs neighbour search for the proximity checks
+import numpy as np
+
+# Up to this many people a full distance matrix is cheapest; above it the
+# O(n^2) matrix gets replaced by a uniform grid with threshold-sized cells
+DENSE_MAX_POINTS = 48
+
+_FORWARD_NEIGHBOURS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def _empty_pairs():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+
+def _dense_pairs(points, threshold):
+    diff = points[:, None, :] - points[None, :, :]
+    dist = np.sqrt((diff ** 2).sum(axis=-1))
+    first, second = np.triu_indices(len(points), k=1)
+    pair_dist = dist[first, second]
+    close = pair_dist < threshold
+    return first[close], second[close], pair_dist[close]
+
+
+def _grid_pairs(points, threshold):
+    # Any pair closer than the threshold lies in the same or an adjacent
+    # threshold-sized cell. Each cell is matched against itself and its
+    # "forward" neighbours so every pair of cells is visited once; candidate
+    # pairs come from searchsorted ranges over the cell-sorted points.
+    cells = np.floor(points / threshold).astype(np.int64)
+    cells -= cells.min(axis=0)
+    rows = int(cells[:, 1].max()) + 3
+    keys = cells[:, 0] * rows + cells[:, 1] + 1
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    index = np.arange(len(points))
+
+    firsts, seconds = [], []
+    for dx, dy in _FORWARD_NEIGHBOURS:
+        target = keys + dx * rows + dy
+        lo = np.searchsorted(sorted_keys, target, side='left')
+        hi = np.searchsorted(sorted_keys, target, side='right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        i = np.repeat(index, counts)
+        run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + (np.arange(total) - run_starts)]
+        if dx == 0 and dy == 0:
+            keep = i < j
+            i, j = i[keep], j[keep]
+        firsts.append(np.minimum(i, j))
+        seconds.append(np.maximum(i, j))
+
+    if not firsts:
+        return _empty_pairs()
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    dist = np.sqrt(((points[first] - points[second]) ** 2).sum(axis=-1))
+    close = dist < threshold
+    first, second, dist = first[close], second[close], dist[close]
+    # Same (i, j) order as the nested pairwise loops
+    order = np.lexsort((second, first))
+    return first[order], second[order], dist[order]
+
+
+def find_close_pairs(centers, threshold):
+    """Find every pair of centres closer than ``threshold`` in one call.
+
+    Returns three arrays ``(first, second, distance)`` with ``first < second``,
+    ordered like the ``for i ... for j in range(i + 1, n)`` loops they replace.
+    """
+    points = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 2 or threshold <= 0:
+        return _empty_pairs()
+    if len(points) <= DENSE_MAX_POINTS:
+        return _dense_pairs(points, threshold)
+    return _grid_pairs(points, threshold)
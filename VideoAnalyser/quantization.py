@@ -0,0 +1,177 @@
+# quantization.py - INT8 variants of the YOLO detector and MesoNet, calibrated on local clips
+#
+# Usage (from VideoAnalyser/):
+#   QUANT_CALIBRATION_VIDEOS="calibration/*.mp4" python quantization.py --weights yolov8n.pt yolov8x.pt
+#   python quantization.py --weights yolov8x.pt --videos "calibration/*.mp4" --frames 128
+#
+# The detector variant is served with INFERENCE_BACKEND=onnx-int8 (and made on
+# first use if it doesn't exist yet); fake.py quantises MesoNet itself when
+# started with MESONET_PRECISION=int8. Building either needs a calibration
+# set: there is deliberately no default, as calibrating on whatever happens
+# to be in uploads/ would give every deployment a different model.
+import argparse
+import glob
+import os
+import re
+
+import cv2
+import numpy as np
+
+from frame_source import EveryNth, FrameSource
+
+# Clips whose frames calibrate the activation ranges (required to build an
+# INT8 model), and how many frames
+CALIBRATION_VIDEOS = os.environ.get('QUANT_CALIBRATION_VIDEOS')
+CALIBRATION_FRAMES = int(os.environ.get('QUANT_CALIBRATION_FRAMES', 64))
+
+
+def calibration_videos(pattern=None):
+    """The clips matching ``pattern`` (QUANT_CALIBRATION_VIDEOS by default)"""
+    pattern = pattern or CALIBRATION_VIDEOS
+    if not pattern:
+        raise ValueError("Building an INT8 model needs a calibration set: set QUANT_CALIBRATION_VIDEOS to a glob "
+                         "of representative clips kept for the purpose (not uploads/). The INT8 detector can "
+                         "also be built ahead of time with quantization.py --videos")
+    videos = sorted(glob.glob(pattern))
+    if not videos:
+        raise ValueError(f"No calibration clips match QUANT_CALIBRATION_VIDEOS='{pattern}'")
+    return videos
+
+
+def sample_frames(videos, count=CALIBRATION_FRAMES):
+    """Up to ``count`` BGR frames spread evenly over ``videos``"""
+    per_video = max(1, -(-count // len(videos)))
+    frames = []
+    for video in videos:
+        source = FrameSource(video)
+        total = source.total_frames
+        source.set_policy(EveryNth(max(1, total // per_video)))
+        taken = 0
+        for _, frame in source:
+            frames.append(frame)
+            taken += 1
+            if taken >= per_video:
+                break
+        source.release()
+    return frames[:count]
+
+
+def letterbox(frame, size=640):
+    """The detector's input: ``frame`` scaled into a grey ``size`` square, RGB, NCHW in [0, 1]"""
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    resized = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def int8_path(weights):
+    """Where the INT8 ONNX variant of ``weights`` lives"""
+    return os.path.splitext(weights)[0] + '_int8.onnx'
+
+
+def _float_head_nodes(model):
+    """Nodes of the last module (the Detect head) to keep in float: the
+    output convs of its box and class branches and the box decoding. Its
+    feature convs hold much of the compute at the finest scale, so they are
+    quantised like the rest of the network."""
+    prefixes = {node.name.split('/')[1] for node in model.graph.node if node.name.startswith('/model.')}
+    if not prefixes:
+        return []
+    head = max(prefixes, key=lambda prefix: int(prefix.split('.')[1]))
+    feature = re.compile(rf'^/{re.escape(head)}/cv[23]\.\d+/cv[23]\.\d+\.[01]/')
+    return [node.name for node in model.graph.node
+            if node.name.startswith(f'/{head}/') and not feature.match(node.name)]
+
+
+def quantize_detector(weights, videos=None, frames=CALIBRATION_FRAMES, imgsz=640):
+    """Statically quantise ``weights`` to INT8 with ONNX Runtime and return the artifact path.
+
+    Weights are per-channel int8, activations uint8 with ranges calibrated on
+    ``frames`` frames of ``videos`` (CALIBRATION_VIDEOS by default). The
+    Detect head's outputs stay float. Like ``export_model`` the work is only
+    redone when the .pt file is newer than the artifact.
+    """
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    from inference_backend import export_model
+
+    path = int8_path(weights)
+    if os.path.exists(path) and (not os.path.exists(weights)
+                                 or os.path.getmtime(path) >= os.path.getmtime(weights)):
+        return path
+
+    samples = [letterbox(frame, imgsz) for frame in sample_frames(calibration_videos(videos), frames)]
+    float_path = export_model(weights, 'onnx', imgsz=imgsz)
+    print(f"Quantising {float_path} to INT8 on {len(samples)} calibration frames (one-time)...")
+    # Shape inference and graph optimisation first, as ONNX Runtime
+    # recommends; symbolic inference can't follow the dynamic input axes
+    prepared_path = os.path.splitext(path)[0] + '_prep.onnx'
+    quant_pre_process(float_path, prepared_path, skip_symbolic_shape=True)
+    float_model = onnx.load(prepared_path)
+    input_name = float_model.graph.input[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(samples)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    try:
+        quantize_static(prepared_path, path, Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        nodes_to_exclude=_float_head_nodes(float_model))
+    finally:
+        os.remove(prepared_path)
+    return path
+
+
+def mesonet_input(frame, size=256):
+    """MesoNet's input for one frame or face crop, as ``MesoNet.preprocess_image`` makes it"""
+    return (cv2.resize(frame, (size, size)).astype(np.float32) / 255.0)[None]
+
+
+def quantize_mesonet(keras_model, frames, path=None, size=256):
+    """Full-integer TFLite conversion of a Keras MesoNet, calibrated on
+    ``frames`` (BGR frames or face crops). Input and output stay float32, so
+    the interpreter is a drop-in for ``model.predict``. Returns the
+    flatbuffer, also written to ``path`` if given."""
+    import tensorflow as tf
+
+    def representative_dataset():
+        for frame in frames:
+            yield [mesonet_input(frame, size)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    flatbuffer = converter.convert()
+    if path:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(flatbuffer)
+    return flatbuffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build INT8 variants of the YOLO detector weights')
+    parser.add_argument('--weights', nargs='+', default=['yolov8n.pt', 'yolov8x.pt'])
+    parser.add_argument('--videos', default=None, help='Calibration clip glob (default QUANT_CALIBRATION_VIDEOS)')
+    parser.add_argument('--frames', type=int, default=CALIBRATION_FRAMES)
+    parser.add_argument('--imgsz', type=int, default=640)
+    args = parser.parse_args()
+
+    for weights in args.weights:
+        print(f"{weights}: {quantize_detector(weights, args.videos, args.frames, args.imgsz)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# result_cache.py - Content-addressed on-disk cache of analysis results
+import hashlib
+import json
+import os
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def json_default(obj):
+    """Serialise numpy scalars and arrays that end up in result dicts"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def save_upload_hashed(file, path, chunk_size=CHUNK_SIZE):
+    """Stream an uploaded file to ``path`` and return the SHA-256 of its bytes.
+
+    The hash is computed while the upload is written, so identical evidence
+    re-submitted under another name is recognised without a second read.
+    """
+    digest = hashlib.sha256()
+    stream = getattr(file, 'stream', file)
+    with open(path, 'wb') as out:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """JSON results keyed by (content hash, model, detector parameters).
+
+    Entries are plain files; reading an entry bumps its mtime, and once the
+    directory grows past ``max_bytes`` the least recently used entries are
+    deleted.
+    """
+
+    EXTENSION = '.json'
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash, model, params):
+        key_data = json.dumps({'content': content_hash, 'model': model, 'params': params},
+                              sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.EXTENSION}")
+
+    def get(self, key):
+        path = self._path(key)
+        with self.lock:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                return None
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self.lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, default=json_default)
+            os.replace(tmp_path, path)
+            self._evict_locked()
+
+    def _evict_locked(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.EXTENSION):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
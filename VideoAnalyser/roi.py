@@ -0,0 +1,122 @@
+# roi.py - Region-of-interest planning: detect around known tracks between full scans
+import math
+
+import cv2
+import numpy as np
+
+
+def merge_regions(regions):
+    """Union overlapping ``(x1, y1, x2, y2)`` rectangles until none overlap"""
+    regions = [list(r) for r in regions]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(r) for r in regions]
+
+
+class RoiPlanner:
+    """Chooses between a full-frame scan and crops around the last tracks.
+
+    Each track box is padded by ``padding`` times its size (at least
+    ``min_padding`` pixels), and overlapping crops are merged. A full scan is
+    forced every ``full_scan_interval`` detector runs, when there are no
+    tracks, when the crops would cover more than ``max_area_fraction`` of the
+    frame anyway, or when something moves in the edge-of-frame watch region
+    (a ``edge_margin`` border, minus the parts already inside a crop) where
+    new people walk in.
+    """
+
+    def __init__(self, full_scan_interval=10, padding=0.5, min_padding=32, max_area_fraction=0.5,
+                 edge_margin=0.08, edge_pixel_threshold=25, edge_min_changed_fraction=0.01,
+                 full_imgsz=640, watch_width=160):
+        self.full_scan_interval = full_scan_interval
+        self.padding = padding
+        self.min_padding = min_padding
+        self.max_area_fraction = max_area_fraction
+        self.edge_margin = edge_margin
+        self.edge_pixel_threshold = edge_pixel_threshold
+        self.edge_min_changed_fraction = edge_min_changed_fraction
+        self.full_imgsz = full_imgsz
+        self.watch_width = watch_width
+
+        self.since_full_scan = 0
+        self.previous_small = None
+        self.full_scans = 0
+        self.roi_scans = 0
+        self.roi_area = 0.0
+
+    def _crop_regions(self, tracks, width, height):
+        regions = []
+        for x1, y1, x2, y2 in tracks[:, :4]:
+            pad_x = max(self.min_padding, (x2 - x1) * self.padding)
+            pad_y = max(self.min_padding, (y2 - y1) * self.padding)
+            regions.append((max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y)),
+                            min(width, int(math.ceil(x2 + pad_x))), min(height, int(math.ceil(y2 + pad_y)))))
+        return merge_regions(regions)
+
+    def _edge_changed(self, frame, regions):
+        """Did anything move in the border strips outside the crops since the last frame?"""
+        height, width = frame.shape[:2]
+        scale = self.watch_width / width
+        small = cv2.resize(frame, (self.watch_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        previous, self.previous_small = self.previous_small, small
+        if previous is None or previous.shape != small.shape:
+            return True
+
+        rows, cols = small.shape
+        margin_r = max(1, int(rows * self.edge_margin))
+        margin_c = max(1, int(cols * self.edge_margin))
+        watch = np.zeros(small.shape, dtype=bool)
+        watch[:margin_r, :] = watch[-margin_r:, :] = True
+        watch[:, :margin_c] = watch[:, -margin_c:] = True
+        for x1, y1, x2, y2 in regions:
+            watch[int(y1 * scale):int(math.ceil(y2 * scale)), int(x1 * scale):int(math.ceil(x2 * scale))] = False
+        if not watch.any():
+            return False
+
+        moved = cv2.absdiff(small, previous)[watch] > self.edge_pixel_threshold
+        return moved.mean() >= self.edge_min_changed_fraction
+
+    def plan(self, frame, tracks):
+        """Crops ``[(x1, y1, x2, y2), ...]`` to run the detector on, or None for a full scan"""
+        height, width = frame.shape[:2]
+        regions = self._crop_regions(tracks, width, height) if len(tracks) else []
+        edge_changed = self._edge_changed(frame, regions)
+
+        area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) / float(width * height)
+        if (not regions or edge_changed or area > self.max_area_fraction
+                or self.since_full_scan >= self.full_scan_interval):
+            self.since_full_scan = 0
+            self.full_scans += 1
+            return None
+
+        self.since_full_scan += 1
+        self.roi_scans += 1
+        self.roi_area += area
+        return regions
+
+    def imgsz_for(self, region, frame_shape):
+        """Inference size for a crop at the same scale a full scan would use"""
+        x1, y1, x2, y2 = region
+        scale = min(1.0, self.full_imgsz / max(frame_shape[:2]))
+        return max(64, int(math.ceil(max(x2 - x1, y2 - y1) * scale / 32)) * 32)
+
+    def stats(self):
+        return {
+            'full_scans': self.full_scans,
+            'roi_scans': self.roi_scans,
+            'mean_roi_area_fraction': round(self.roi_area / self.roi_scans, 3) if self.roi_scans else 0.0
+        }
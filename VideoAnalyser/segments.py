@@ -0,0 +1,115 @@
+# segments.py - Splitting a video into overlapping segments and stitching the results
+import numpy as np
+
+from incidents import IncidentMerger
+
+
+def plan_segments(total_frames, fps, workers, min_segment_seconds=20.0):
+    """Split ``total_frames`` into at most ``workers`` equal ``(start, end)`` ranges.
+
+    Short videos get fewer segments so each one is at least
+    ``min_segment_seconds`` long; below that the warm-up overhead eats the
+    gain.
+    """
+    if total_frames <= 0:
+        return [(0, None)]
+    fps = fps if fps and fps > 0 else 30.0
+    count = max(1, min(workers, int(total_frames / (min_segment_seconds * fps))))
+    bounds = np.linspace(0, total_frames, count + 1).round().astype(int)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_tracks(tail_tracks, head_tracks, min_iou=0.3, max_frame_gap=15):
+    """Match the next segment's warm-up tracks to the previous segment's tail.
+
+    Both segments tracked the same frames of the overlap window, each with
+    its own IDs. A pair of tracks scores the mean IoU of their boxes, taking
+    for every warm-up box the previous segment's box on the nearest frame
+    within ``max_frame_gap`` (the two segments may have sampled different
+    frames). Pairs are matched greedily, best first, down to ``min_iou``.
+    Returns ``{head_track_id: tail_track_id}``.
+    """
+    candidates = []
+    for head_id, head_boxes in head_tracks.items():
+        for tail_id, tail_boxes in tail_tracks.items():
+            tail_frames = np.array(sorted(tail_boxes))
+            ious = []
+            for frame_number, box in head_boxes.items():
+                nearest = tail_frames[np.abs(tail_frames - frame_number).argmin()]
+                if abs(nearest - frame_number) <= max_frame_gap:
+                    ious.append(box_iou(box, tail_boxes[int(nearest)]))
+            if ious and np.mean(ious) >= min_iou:
+                candidates.append((float(np.mean(ious)), head_id, tail_id))
+
+    mapping = {}
+    used = set()
+    for _, head_id, tail_id in sorted(candidates, reverse=True):
+        if head_id not in mapping and tail_id not in used:
+            mapping[head_id] = tail_id
+            used.add(tail_id)
+    return mapping
+
+
+def _remap_detection(detection, mapping):
+    detection = dict(detection)
+    detection['persons'] = [dict(person, track_id=mapping.get(person['track_id'], person['track_id']))
+                            for person in detection['persons']]
+    return detection
+
+
+def stitch_segments(results, gap=1.0, min_detections=3, min_iou=0.3):
+    """Join per-segment results (in video order) into one list of incidents.
+
+    Track IDs of each segment are rewritten into one global numbering:
+    tracks matched across the overlap window keep the previous segment's ID,
+    the rest get fresh IDs. The segments' detection groups then go through
+    one ``IncidentMerger``, which joins groups that continue across a
+    boundary and drops those that end up too small.
+    """
+    merger = IncidentMerger(gap=gap, min_detections=min_detections)
+    previous_tail = {}
+    next_id = 0
+    for result in results:
+        max_frame_gap = max(1, int(round(result['fps'] / 2)))
+        mapping = match_tracks(previous_tail, result['head_tracks'], min_iou, max_frame_gap)
+        for track_id in range(result['max_track_id'] + 1):
+            if track_id not in mapping:
+                mapping[track_id] = next_id + track_id
+        next_id = max([next_id] + [global_id + 1 for global_id in mapping.values()])
+
+        for start, end, count, best in result['groups']:
+            merger.add_group(start, end, count, _remap_detection(best, mapping))
+        previous_tail = {mapping.get(track_id, track_id): boxes
+                         for track_id, boxes in result['tail_tracks'].items()}
+    return merger.flush()
+
+
+def merge_inference_stats(results):
+    """Sum the per-segment inference counters and keep each segment's own
+    stretch of the sampling rate report"""
+    stats = {'frames_inferred': 0, 'frames_skipped_static': 0, 'segments': len(results)}
+    sampling_segments = []
+    for result in results:
+        segment_stats = result['inference_stats']
+        stats['frames_inferred'] += segment_stats.get('frames_inferred', 0)
+        stats['frames_skipped_static'] += segment_stats.get('frames_skipped_static', 0)
+        for key in ('full_scans', 'roi_scans'):
+            if key in segment_stats:
+                stats[key] = stats.get(key, 0) + segment_stats[key]
+        start_time = result['start_frame'] / result['fps']
+        end_time = result['end_frame'] / result['fps'] if result['end_frame'] is not None else float('inf')
+        sampling_segments += [entry for entry in segment_stats.get('sampling_segments', [])
+                              if start_time <= entry['start_time'] < end_time]
+    total = stats['frames_inferred'] + stats['frames_skipped_static']
+    stats['skip_ratio'] = round(stats['frames_skipped_static'] / total, 3) if total else 0.0
+    if sampling_segments:
+        stats['sampling_segments'] = sampling_segments
+    return stats
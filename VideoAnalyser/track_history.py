@@ -0,0 +1,162 @@
+# track_history.py - Ring-buffer store of recent person positions per track
+import numpy as np
+
+
+class TrackHistoryStore:
+    """Last ``history_len`` centers of every live track in preallocated arrays.
+
+    Replaces a ``defaultdict`` of deques keyed by tracker ID. Each track owns
+    a slot in a ``(capacity, history_len, 2)`` float32 ring buffer; slots of
+    tracks not seen for more than ``evict_after`` frames are freed and reused,
+    and capacity doubles only when every slot is live. ``store[track_id]``
+    returns a track's positions oldest first, which supports ``len`` and
+    negative indexing like the deque did; ``positions_ago`` reads many tracks
+    at once. The frame number of every position is kept alongside it, since
+    sampled frames need not be evenly spaced.
+    """
+
+    def __init__(self, history_len=30, evict_after=300, capacity=16):
+        self.history_len = history_len
+        self.evict_after = evict_after
+        self._alloc(capacity)
+        self._slots = {}
+        self.evicted = 0
+
+    def _alloc(self, capacity):
+        self.positions = np.zeros((capacity, self.history_len, 2), dtype=np.float32)
+        self.frames = np.full((capacity, self.history_len), -1, dtype=np.int64)
+        self.heads = np.zeros(capacity, dtype=np.int32)
+        self.lengths = np.zeros(capacity, dtype=np.int32)
+        self.last_seen = np.full(capacity, -1, dtype=np.int64)
+        self.track_ids = np.full(capacity, -1, dtype=np.int64)
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        old = (self.positions, self.frames, self.heads, self.lengths, self.last_seen, self.track_ids)
+        capacity = len(old[0])
+        self._alloc(capacity * 2)
+        new = (self.positions, self.frames, self.heads, self.lengths, self.last_seen, self.track_ids)
+        for array, old_array in zip(new, old):
+            array[:capacity] = old_array
+        self._free = list(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def _slot(self, track_id):
+        slot = self._slots.get(track_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slots[track_id] = slot
+            self.track_ids[slot] = track_id
+            self.heads[slot] = 0
+            self.lengths[slot] = 0
+        return slot
+
+    def append(self, track_id, center, frame_number):
+        """Record ``track_id`` at ``center`` on ``frame_number``"""
+        slot = self._slot(track_id)
+        head = self.heads[slot]
+        self.positions[slot, head] = center
+        self.frames[slot, head] = frame_number
+        self.heads[slot] = (head + 1) % self.history_len
+        self.lengths[slot] = min(self.lengths[slot] + 1, self.history_len)
+        self.last_seen[slot] = frame_number
+
+    def evict(self, frame_number):
+        """Free the slots of tracks not seen for more than ``evict_after`` frames"""
+        stale = np.flatnonzero((self.track_ids >= 0) & (frame_number - self.last_seen > self.evict_after))
+        for slot in stale:
+            del self._slots[int(self.track_ids[slot])]
+            self.track_ids[slot] = -1
+            self.last_seen[slot] = -1
+            self.lengths[slot] = 0
+            self._free.append(int(slot))
+        self.evicted += len(stale)
+        return len(stale)
+
+    def __contains__(self, track_id):
+        return track_id in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __getitem__(self, track_id):
+        """Positions of ``track_id``, oldest first (empty if unknown)"""
+        slot = self._slots.get(track_id)
+        if slot is None:
+            return np.empty((0, 2), dtype=np.float32)
+        length = self.lengths[slot]
+        if length < self.history_len:
+            return self.positions[slot, :length]
+        head = self.heads[slot]
+        return np.concatenate((self.positions[slot, head:], self.positions[slot, :head]))
+
+    def frames_of(self, track_id):
+        """Frame numbers of ``track_id``'s positions, oldest first"""
+        slot = self._slots.get(track_id)
+        if slot is None:
+            return np.empty(0, dtype=np.int64)
+        length = self.lengths[slot]
+        if length < self.history_len:
+            return self.frames[slot, :length]
+        head = self.heads[slot]
+        return np.concatenate((self.frames[slot, head:], self.frames[slot, :head]))
+
+    def slots(self, track_ids):
+        """Slot index of each track ID (-1 for unknown tracks)"""
+        return np.array([self._slots.get(int(t), -1) for t in track_ids], dtype=np.int64)
+
+    def history_lengths(self, track_ids):
+        slots = self.slots(track_ids)
+        return np.where(slots >= 0, self.lengths[slots], 0)
+
+    def positions_ago(self, track_ids, k):
+        """Position of each track ``k`` appends ago (0 = latest).
+
+        Returns ``(positions, valid)``: an ``(N, 2)`` array and a mask of the
+        tracks whose history reaches back that far.
+        """
+        slots = self.slots(track_ids)
+        valid = (slots >= 0) & (self.lengths[slots] > k)
+        index = (self.heads[slots] - 1 - k) % self.history_len
+        positions = self.positions[slots, index]
+        positions[~valid] = np.nan
+        return positions, valid
+
+    def recent(self, track_ids, count):
+        """The last ``count`` positions of each track, newest first.
+
+        Returns ``(positions, lengths)``: an ``(N, count, 2)`` array whose
+        ``[:, k]`` column is each track's position ``k`` appends ago (NaN
+        where its history is shorter) and the tracks' history lengths.
+        """
+        slots = self.slots(track_ids)
+        lengths = np.where(slots >= 0, self.lengths[slots], 0)
+        ago = np.arange(count)
+        index = (self.heads[slots][:, None] - 1 - ago[None, :]) % self.history_len
+        positions = self.positions[slots[:, None], index]
+        positions[ago[None, :] >= lengths[:, None]] = np.nan
+        return positions, lengths
+
+    def recent_frames(self, track_ids, count):
+        """Frame numbers of the positions ``recent`` returns, ``(N, count)``
+        newest first, -1 where a track's history is shorter"""
+        slots = self.slots(track_ids)
+        lengths = np.where(slots >= 0, self.lengths[slots], 0)
+        ago = np.arange(count)
+        index = (self.heads[slots][:, None] - 1 - ago[None, :]) % self.history_len
+        frames = self.frames[slots[:, None], index]
+        frames[ago[None, :] >= lengths[:, None]] = -1
+        return frames
+
+    def memory_bytes(self):
+        arrays = (self.positions, self.frames, self.heads, self.lengths, self.last_seen, self.track_ids)
+        return int(sum(a.nbytes for a in arrays))
+
+    def stats(self):
+        return {
+            'live_tracks': len(self._slots),
+            'capacity': len(self.track_ids),
+            'evicted_tracks': self.evicted,
+            'memory_bytes': self.memory_bytes()
+        }
@@ -0,0 +1,98 @@
+# tracking.py - Per-job tracker state for the harassment detectors
+import numpy as np
+
+from metrics import StageTimer
+from track_history import TrackHistoryStore
+
+
+def create_tracker(tracker_config='botsort.yaml', frame_rate=30):
+    """Build a standalone ultralytics tracker (BoT-SORT by default, as model.track uses)"""
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    try:
+        from ultralytics.utils import YAML
+        cfg = IterableSimpleNamespace(**YAML.load(check_yaml(tracker_config)))
+    except ImportError:  # older ultralytics releases
+        from ultralytics.utils import yaml_load
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_config)))
+
+    tracker_cls = TRACKER_MAP[cfg.tracker_type]
+    try:
+        return tracker_cls(args=cfg, frame_rate=frame_rate)
+    except TypeError:  # newer releases dropped the frame_rate argument
+        return tracker_cls(args=cfg)
+
+
+class TrackingContext:
+    """Tracker and track history belonging to a single analysis job.
+
+    ``model.track(..., persist=True)`` keeps its tracker on the model's
+    predictor, so every request sharing a model also shared track IDs. Jobs
+    now run plain ``predict`` on a shared model and feed the boxes through
+    their own context instead.
+    """
+
+    def __init__(self, history_len=30, tracker_config='botsort.yaml', frame_rate=30, motion_gate=None,
+                 roi_planner=None, evict_after=300, frame_pool=None):
+        self.tracker = create_tracker(tracker_config, frame_rate)
+        # Track person positions; tracks unseen for evict_after frames are dropped
+        self.person_tracks = TrackHistoryStore(history_len, evict_after=evict_after)
+        self.frames_tracked = 0
+        # Optional MotionGate; when it says a frame is static the last tracks are reused
+        self.motion_gate = motion_gate
+        # Optional RoiPlanner; between full scans the detector only sees crops
+        self.roi_planner = roi_planner
+        self.last_tracks = np.empty((0, 7), dtype=np.float32)
+        # Set by the detector: how busy the last frame was (0-1) and the
+        # frame sampling policy driving this job
+        self.activity = 0.0
+        self.sampling_policy = None
+        # Stage latencies and frame counters of this job
+        self.timer = StageTimer()
+        # Optional FramePool the job's decoded and resized frames are recycled through
+        self.frame_pool = frame_pool
+        # Optional DetectionTrace recording every analysed frame's tracks for re-scoring
+        self.trace = None
+
+    def update(self, result):
+        """Track one frame's detections.
+
+        Takes an ultralytics ``Results`` object and returns an ``(N, 7)`` array
+        of ``x1, y1, x2, y2, track_id, confidence, class`` rows for the
+        confirmed tracks, like ``results[0].boxes.data`` after ``model.track``.
+        """
+        return self.update_boxes(result.boxes.data.cpu().numpy(), result.orig_img)
+
+    def update_boxes(self, data, frame):
+        """Track an ``(N, 6)`` array of ``x1, y1, x2, y2, confidence, class``
+        detections in ``frame`` coordinates, e.g. boxes gathered from crops"""
+        from ultralytics.engine.results import Boxes
+
+        self.frames_tracked += 1
+        det = Boxes(np.asarray(data, dtype=np.float32).reshape(-1, 6), frame.shape[:2])
+        tracks = self.tracker.update(det, frame)
+        if len(tracks) == 0:
+            self.last_tracks = np.empty((0, 7), dtype=np.float32)
+        else:
+            self.last_tracks = np.asarray(tracks[:, :7], dtype=np.float32)
+        return self.last_tracks
+
+    def inference_stats(self):
+        """How many sampled frames ran the detector vs reused the previous
+        tracks, plus the effective sampling rate per segment when adaptive"""
+        if self.motion_gate is None:
+            stats = {'frames_inferred': self.frames_tracked, 'frames_skipped_static': 0, 'skip_ratio': 0.0}
+        else:
+            stats = self.motion_gate.stats()
+        if self.roi_planner is not None:
+            stats.update(self.roi_planner.stats())
+        stats['track_history'] = self.person_tracks.stats()
+        if self.frame_pool is not None:
+            stats['frame_pool'] = self.frame_pool.stats()
+        if hasattr(self.sampling_policy, 'segment_rates'):
+            stats['sampling_segments'] = self.sampling_policy.segment_rates()
+        if self.timer.enabled:
+            stats['timings'] = self.timer.breakdown()
+        return stats
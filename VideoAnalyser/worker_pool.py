@@ -0,0 +1,271 @@
+# worker_pool.py - Shared model pool (threads) and preloaded worker processes
+import multiprocessing
+import queue
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from cpu_budget import cpu_sets, pin_current_process, set_library_threads
+from frame_source import FrameSource
+from metrics import REGISTRY, StageTimer
+from segments import plan_segments, stitch_segments, merge_inference_stats
+
+
+class ModelPool:
+    """A fixed set of preloaded models, checked out for one call at a time.
+
+    An ultralytics predictor is not safe to use from two threads at once, so
+    concurrent jobs in the same process borrow a model per inference call.
+    Exposes ``predict`` so it can stand in for a single model.
+    ``before_predict()``, when given, runs on the calling thread before each
+    call (e.g. ``CpuBudget.apply_to_thread``).
+    """
+
+    def __init__(self, loader, size=1, before_predict=None):
+        self.size = max(1, size)
+        self.before_predict = before_predict
+        self._models = queue.Queue()
+        for _ in range(self.size):
+            self._models.put(loader())
+
+    @contextmanager
+    def checkout(self):
+        model = self._models.get()
+        try:
+            yield model
+        finally:
+            self._models.put(model)
+
+    def predict(self, *args, **kwargs):
+        if self.before_predict is not None:
+            self.before_predict()
+        with self.checkout() as model:
+            return model.predict(*args, **kwargs)
+
+
+# Per-process state of a ProcessWorkerPool worker
+_worker_detector = None
+_worker_progress = None
+_worker_cancelled = None
+
+
+def _init_worker(weights, backend, progress_queue, threads=None, cpu_queue=None, cancelled=None):
+    global _worker_detector, _worker_progress, _worker_cancelled
+    from harassment_detector import AdvancedHarassmentDetector
+    from inference_backend import load_model
+
+    if cpu_queue is not None:
+        try:
+            pin_current_process(cpu_queue.get_nowait())
+        except queue.Empty:
+            pass  # a replacement worker; every CPU set is taken
+    if threads:
+        set_library_threads(threads)
+
+    _worker_detector = AdvancedHarassmentDetector(load_model(weights, backend))
+    _worker_progress = progress_queue
+    _worker_cancelled = cancelled
+
+
+# Messages on the progress queue are (task_id, kind, payload): 'progress'
+# carries (frame_number, total_frames, partial_detections), 'incident' one
+# closed incident of a streaming task and 'done' follows a task's last message.
+# A task whose ID shows up in _worker_cancelled stops at its next progress update
+def _process_in_worker(task_id, video_path, render_path=None, trace_path=None, stream_incidents=False):
+    from harassment_detector import AnalysisCancelled
+
+    def on_progress(frame_number, total_frames, partial_detections):
+        if _worker_cancelled is not None and task_id in _worker_cancelled:
+            raise AnalysisCancelled(f'Task {task_id} was cancelled by its caller')
+        _worker_progress.put((task_id, 'progress', (frame_number, total_frames, partial_detections)))
+
+    def on_incident(incident):
+        _worker_progress.put((task_id, 'incident', incident))
+
+    context = _worker_detector.new_context()
+    detections = _worker_detector.process_video(video_path, progress_callback=on_progress, context=context,
+                                                on_incident=on_incident if stream_incidents else None,
+                                                render_path=render_path, trace_path=trace_path,
+                                                keep_incidents=not stream_incidents)
+    _worker_progress.put((task_id, 'done', None))
+    return detections, context.inference_stats(), context.timer
+
+
+def _process_segment_in_worker(task_id, video_path, start_frame, end_frame, warmup_frames):
+    def on_progress(frames_done, segment_frames):
+        _worker_progress.put((task_id, 'progress', (frames_done, segment_frames, None)))
+
+    return _worker_detector.process_segment(video_path, start_frame, end_frame, warmup_frames,
+                                            progress_callback=on_progress)
+
+
+class ProcessWorkerPool:
+    """Worker processes that each hold a preloaded model.
+
+    A whole video is one task, so a job stays pinned to the worker that picked
+    it up and keeps its tracker state there; different jobs run on different
+    cores without sharing the GIL. Progress, and closed incidents when they
+    are streamed, are relayed back to the caller's callbacks through a queue.
+
+    ``process_video`` runs a task's callbacks on the calling thread, so a
+    slow one only holds up its own task; raising ``AnalysisCancelled`` from
+    one stops the task on its worker too.
+
+    Each worker runs one job at a time with ``threads`` torch/OpenCV threads
+    (normally its share of the CPU budget); with ``pin`` every worker is
+    also restricted to its own slice of the cores.
+    """
+
+    def __init__(self, weights, workers=2, backend=None, threads=None, pin=False):
+        context = multiprocessing.get_context('spawn')
+        self._manager = context.Manager()
+        self._progress_queue = self._manager.Queue()
+        self._cancelled = self._manager.dict()
+        cpu_queue = None
+        if pin:
+            cpu_queue = self._manager.Queue()
+            for cpus in cpu_sets(workers):
+                cpu_queue.put(cpus)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(weights, backend, self._progress_queue, threads, cpu_queue, self._cancelled)
+        )
+        self.workers = workers
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self._relay = threading.Thread(target=self._relay_progress, daemon=True)
+        self._relay.start()
+
+    def _relay_progress(self):
+        while True:
+            try:
+                task_id, kind, payload = self._progress_queue.get()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                callbacks = self._callbacks.get(task_id)
+            if not callbacks:
+                continue
+            on_progress, on_incident, done = callbacks
+            if kind == 'incident':
+                on_incident(payload)
+            elif kind == 'done':
+                done.set()
+            elif on_progress:
+                on_progress(*payload)
+
+    def process_video(self, video_path, progress_callback=None, render_path=None, trace_path=None,
+                      on_incident=None):
+        """Run ``process_video`` on a worker process and wait for ``(detections, inference_stats)``
+
+        With ``on_incident`` each incident is passed to it as soon as the
+        worker closes it and the returned detections are empty. Both
+        callbacks run on the calling thread; if one raises
+        ``AnalysisCancelled`` the worker abandons the task and the exception
+        propagates. The worker's stage timings are added to this process's
+        metrics.
+        """
+        task_id = uuid.uuid4().hex
+        done = threading.Event()
+        events = queue.Queue()
+        if progress_callback or on_incident:
+            with self._lock:
+                self._callbacks[task_id] = (lambda *payload: events.put(('progress', payload)),
+                                            lambda incident: events.put(('incident', incident)), done)
+        future = self.executor.submit(_process_in_worker, task_id, video_path, render_path, trace_path,
+                                      on_incident is not None)
+        future.add_done_callback(lambda _: self._cancelled.pop(task_id, None))
+        try:
+            if progress_callback or on_incident:
+                self._deliver(events, done, future, progress_callback, on_incident)
+            detections, stats, timer = future.result()
+        except BaseException:
+            # Flag before checking, so the done callback can't miss the entry
+            self._cancelled[task_id] = True
+            if future.done():
+                self._cancelled.pop(task_id, None)
+            raise
+        finally:
+            with self._lock:
+                self._callbacks.pop(task_id, None)
+        REGISTRY.record(timer)
+        return detections, stats
+
+    @staticmethod
+    def _deliver(events, done, future, progress_callback, on_incident):
+        """Run a task's relayed callbacks until its last message (the result
+        can overtake them) or until it fails"""
+        while True:
+            try:
+                kind, payload = events.get(timeout=0.1)
+            except queue.Empty:
+                # Everything is queued before 'done' is relayed
+                if done.is_set() and events.empty():
+                    return
+                if future.done() and future.exception() is not None:
+                    return
+                continue
+            if kind == 'incident':
+                on_incident(payload)
+            elif progress_callback:
+                progress_callback(*payload)
+
+    def process_video_segmented(self, video_path, progress_callback=None, overlap_seconds=3.0,
+                                min_segment_seconds=20.0):
+        """Split a video into one segment per worker and process them in parallel.
+
+        Each segment starts tracking ``overlap_seconds`` early so its track
+        history is warm at the boundary, and that overlap is where track IDs
+        are reconciled (see ``segments.stitch_segments``). Returns
+        ``(detections, inference_stats)`` like ``process_video``; progress
+        counts frames done across all segments and carries no partial
+        detections.
+        """
+        source = FrameSource(video_path)
+        fps = source.fps if source.fps and source.fps > 0 else 30.0
+        total_frames = source.total_frames
+        source.release()
+
+        plan = plan_segments(total_frames, fps, self.workers, min_segment_seconds)
+        warmup_frames = int(round(overlap_seconds * fps))
+        done = [0] * len(plan)
+        done_lock = threading.Lock()
+        task_ids = []
+        for index in range(len(plan)):
+            task_id = uuid.uuid4().hex
+            task_ids.append(task_id)
+            if progress_callback:
+                def on_progress(frames_done, segment_frames, partial, index=index):
+                    with done_lock:
+                        done[index] = frames_done
+                        frames = sum(done)
+                    progress_callback(frames, total_frames, [])
+                with self._lock:
+                    self._callbacks[task_id] = (on_progress, None, None)
+        try:
+            futures = [
+                self.executor.submit(_process_segment_in_worker, task_id, video_path, start, end, warmup_frames)
+                for task_id, (start, end) in zip(task_ids, plan)
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            with self._lock:
+                for task_id in task_ids:
+                    self._callbacks.pop(task_id, None)
+
+        print(f"Stitching {len(results)} segments of {video_path}")
+        timer = StageTimer()
+        for result in results:
+            timer.merge(result.pop('timer'))
+        stats = merge_inference_stats(results)
+        if timer.enabled:
+            stats['timings'] = timer.breakdown()
+        REGISTRY.record(timer)
+        return stitch_segments(results), stats
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self._manager.shutdown()